@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+Throughput of labelme2voc.py / labelme2coco.py / labelme2classmask.py on a
+generated LabelMe corpus, and a byte-for-byte check that every run writes the
+same dataset.
+
+    python benchmark_converters.py --copies 2 --jobs 1 2 4
+    python benchmark_converters.py --converter voc coco --baseline HEAD~1 --jobs 1
+    python benchmark_converters.py --converter classmask --jobs 1 2
+
+The corpus is built from the photos and masks of
+8_final_proj/Team_TKH/dataset/cat_and_dog_dataset: every mask class becomes
+polygons (OpenCV contours) in a LabelMe JSON with the photo embedded as
+imageData, ``--copies`` times over. The first --jobs value is the reference
+the other runs are compared with. ``--baseline REV`` also runs the converters
+as they were at git revision REV, as the "before" of a change, with the first
+--jobs value only.
+
+For classmask the reference is the two-step pipeline it replaces, run
+unmodified from 8_final_proj/Mysterious_Eggs/Mysterious_Eggs1:
+labelme2segmentationclass.py writes palette PNGs, then image_encoding.py reads
+them back and numbers the colors it finds. labelme2classmask.py is given the
+same label ids (``two_step_label_ids``) and its masks must be pixel-equal.
+"""
+
+import argparse
+import base64
+import collections
+import filecmp
+import json
+import os
+import os.path as osp
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import imgviz
+import numpy as np
+import PIL.Image
+
+from labelme_manifest import MANIFEST_NAME
+
+HERE = osp.dirname(osp.abspath(__file__))
+DATASET = osp.join(
+    HERE, "..", "..", "8_final_proj", "Team_TKH", "dataset", "cat_and_dog_dataset"
+)
+LABELS = ["__ignore__", "_background_", "cat", "dog"]  # encoded_masks: cat=1, dog=2
+TWO_STEP = osp.join(HERE, "..", "..", "8_final_proj", "Mysterious_Eggs", "Mysterious_Eggs1")
+
+
+def make_corpus(out_dir, copies=1, dataset=DATASET):
+    """Write LabelMe JSON files for the photos that have an encoded mask; returns their count."""
+    os.makedirs(out_dir, exist_ok=True)
+    with open(osp.join(out_dir, "labels.txt"), "w") as f:
+        f.write("\n".join(LABELS) + "\n")
+    count = 0
+    for name in sorted(os.listdir(osp.join(dataset, "encoded_masks"))):
+        stem = osp.splitext(name)[0]
+        photo = osp.join(dataset, "JPEGImages", stem + ".jpg")
+        if not osp.exists(photo):
+            continue
+        mask = cv2.imread(osp.join(dataset, "encoded_masks", name), cv2.IMREAD_GRAYSCALE)
+        shapes = []
+        for class_id, label in ((1, "cat"), (2, "dog")):
+            contours, _ = cv2.findContours(
+                (mask == class_id).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+            )
+            for contour in contours:
+                if len(contour) < 3 or cv2.contourArea(contour) < 16:
+                    continue
+                shapes.append(
+                    dict(
+                        label=label,
+                        points=contour[:, 0, :].astype(float).tolist(),
+                        group_id=None,
+                        shape_type="polygon",
+                        flags={},
+                    )
+                )
+        with open(photo, "rb") as f:
+            image_data = f.read()
+        for copy in range(copies):
+            base = stem if copy == 0 else "%s_%d" % (stem, copy)
+            document = dict(
+                version="5.5.0",
+                flags={},
+                shapes=shapes,
+                imagePath=stem + ".jpg",
+                imageData=base64.b64encode(image_data).decode(),
+                imageHeight=mask.shape[0],
+                imageWidth=mask.shape[1],
+            )
+            with open(osp.join(out_dir, base + ".json"), "w") as f:
+                json.dump(document, f)
+            count += 1
+    return count
+
+
+def _same_file(path_a, path_b):
+    if osp.basename(path_a) == "annotations.json":
+        # COCO: everything but the creation time in "info"
+        with open(path_a) as f:
+            data_a = json.load(f)
+        with open(path_b) as f:
+            data_b = json.load(f)
+        data_a.pop("info", None)
+        data_b.pop("info", None)
+        return data_a == data_b
+    return filecmp.cmp(path_a, path_b, shallow=False)
+
+
+def same_tree(a, b):
+    """Relative paths whose contents differ between two directory trees (missing files included)."""
+    differences = []
+    for root, _, files in os.walk(a):
+        for name in files:
+            path_a = osp.join(root, name)
+            path_b = osp.join(b, osp.relpath(path_a, a))
+            if name == MANIFEST_NAME:
+                continue  # records the input hashes only
+            if not osp.exists(path_b) or not _same_file(path_a, path_b):
+                differences.append(osp.relpath(path_a, a))
+    for root, _, files in os.walk(b):
+        for name in files:
+            if not osp.exists(osp.join(a, osp.relpath(osp.join(root, name), b))):
+                differences.append(osp.relpath(osp.join(root, name), b))
+    return sorted(differences)
+
+
+def same_masks(a, b):
+    """Names of the masks in ``a`` whose pixels differ from (or are missing in) ``b``."""
+    differences = []
+    for name in sorted(os.listdir(a)):
+        if not name.endswith(".png"):
+            continue
+        path_b = osp.join(b, name)
+        mask_a = cv2.imread(osp.join(a, name), cv2.IMREAD_UNCHANGED)
+        mask_b = cv2.imread(path_b, cv2.IMREAD_UNCHANGED) if osp.exists(path_b) else None
+        if mask_b is None or mask_a.shape != mask_b.shape or (mask_a != mask_b).any():
+            differences.append(name)
+    return differences
+
+
+def two_step_label_ids(segmentation_dir, labels):
+    """The label ids image_encoding.py assigns to the masks of ``segmentation_dir``.
+
+    It numbers the distinct RGB colors of all masks in sorted order. Labels that
+    no mask uses get the ids after those.
+    """
+    colormap = imgviz.label_colormap()
+    indices = set()
+    for name in os.listdir(segmentation_dir):
+        if name.endswith(".png"):
+            indices.update(np.unique(np.asarray(PIL.Image.open(osp.join(segmentation_dir, name)))).tolist())
+    ranked = sorted(indices, key=lambda index: tuple(colormap[index]))
+    label_ids = {}
+    for i, label in enumerate(labels):
+        index = (i - 1) % 256  # labelme2segmentationclass: __ignore__ is -1, saved as 255
+        label_ids[label] = ranked.index(index) if index in indices else len(ranked) + i
+    return label_ids
+
+
+def run_two_step(corpus, labels, work):
+    """Run the two-step pipeline; returns seconds, peak MB and the encoded_masks directory."""
+    dataset = osp.join(work, "dataset", "cat_and_dog_dataset")  # image_encoding.py's fixed paths
+    shutil.rmtree(osp.join(work, "dataset"), ignore_errors=True)
+    os.makedirs(dataset)
+    seconds, peak = run(
+        [sys.executable, osp.join(TWO_STEP, "labelme2segmentationclass.py"), corpus,
+         osp.join(dataset, "SegmentationClass"), "--labels", labels]
+    )
+    env = dict(os.environ, TQDM_DISABLE="1", MPLBACKEND="Agg")
+    more_seconds, more_peak = run([sys.executable, osp.join(TWO_STEP, "image_encoding.py")], cwd=work, env=env)
+    return seconds + more_seconds, max(peak, more_peak), osp.join(dataset, "encoded_masks")
+
+
+def summarize(differences):
+    """``"yes"``, or the differing files counted per top-level directory."""
+    if not differences:
+        return "yes"
+    counts = collections.Counter(path.split(os.sep)[0] for path in differences)
+    return "NO: " + ", ".join("%s (%d)" % item for item in sorted(counts.items()))
+
+
+def tree_size(path):
+    return sum(
+        osp.getsize(osp.join(root, name)) for root, _, files in os.walk(path) for name in files
+    )
+
+
+def checkout_scripts(rev, out_dir):
+    """Write the img_lab scripts as they were at git revision ``rev`` into ``out_dir``."""
+    os.makedirs(out_dir, exist_ok=True)
+    names = subprocess.run(
+        ["git", "ls-tree", "--name-only", "--full-name", rev, "."], cwd=HERE, check=True,
+        stdout=subprocess.PIPE, universal_newlines=True,
+    ).stdout.split()
+    for path in names:
+        if path.endswith(".py"):
+            source = subprocess.run(
+                ["git", "show", "%s:%s" % (rev, path)], cwd=HERE, check=True,
+                stdout=subprocess.PIPE,
+            ).stdout
+            with open(osp.join(out_dir, osp.basename(path)), "wb") as f:
+                f.write(source)
+    return out_dir
+
+
+def run(command, cwd=None, env=None):
+    """Seconds and peak resident memory (MB, largest process of the run) of ``command``."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, cwd=cwd, env=env)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return seconds, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--copies", type=int, default=1, help="corpus size = 160 x copies")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--converter", nargs="+", choices=["voc", "coco", "classmask"], default=["voc"])
+    parser.add_argument("--noviz", action="store_true", help="pass --noviz to the converters")
+    parser.add_argument("--rle", action="store_true", help="pass --rle to the current labelme2coco")
+    parser.add_argument("--baseline", metavar="REV", help="also time the scripts of this git revision")
+    parser.add_argument("--work-dir", help="keep the corpus and outputs here")
+    args = parser.parse_args()
+
+    work = args.work_dir or tempfile.mkdtemp(prefix="labelme_bench_")
+    corpus = osp.join(work, "corpus")
+    if not osp.exists(corpus):
+        print("corpus: %d files" % make_corpus(corpus, args.copies))
+    files = len([name for name in os.listdir(corpus) if name.endswith(".json")])
+    labels = osp.join(corpus, "labels.txt")
+
+    versions = [("", HERE)]
+    if args.baseline:
+        versions.insert(0, (args.baseline, checkout_scripts(args.baseline, osp.join(work, "baseline"))))
+
+    print(
+        "%-36s %8s %10s %8s %8s  %s"
+        % ("run", "seconds", "files/s", "peak MB", "MB out", "same as reference")
+    )
+    for converter in args.converter:
+        reference = None
+        if converter == "classmask":
+            seconds, peak, reference = run_two_step(corpus, labels, work)
+            label_ids = two_step_label_ids(osp.join(osp.dirname(reference), "SegmentationClass"), LABELS)
+            print(
+                "%-36s %8.1f %10.1f %8.0f %8.1f  %s"
+                % ("two-step (segmentationclass+encoding)", seconds, files / seconds, peak,
+                   tree_size(osp.dirname(reference)) / 1e6, "(reference)")
+            )
+        for rev, script_dir in versions:
+            for jobs in args.jobs[:1] if rev else args.jobs:
+                name = "labelme2%s" % converter
+                out = osp.join(work, "%s%s_j%d" % (converter, "_" + rev.replace("~", "-") if rev else "", jobs))
+                shutil.rmtree(out, ignore_errors=True)
+                command = [sys.executable, osp.join(script_dir, name + ".py"), corpus, out, "--labels", labels]
+                command += ["--jobs", str(jobs)] if jobs != 1 else []  # older scripts lack --jobs
+                name += " --jobs %d" % jobs
+                if args.noviz and converter != "classmask":
+                    command.append("--noviz")
+                if args.rle and converter == "coco" and not rev:
+                    command.append("--rle")
+                    name += " --rle"
+                if converter == "classmask":
+                    command += ["--label-ids", ",".join("%s=%d" % item for item in label_ids.items())]
+                    command += ["--ignore-id", str(label_ids["__ignore__"])]
+                seconds, peak = run(command)
+                if reference is None:
+                    reference, same = out, "(reference)"
+                elif converter == "classmask":
+                    differences = same_masks(reference, out)
+                    same = "pixel-equal" if not differences else "NO: %d masks" % len(differences)
+                else:
+                    same = summarize(same_tree(reference, out))
+                print(
+                    "%-36s %8.1f %10.1f %8.0f %8.1f  %s"
+                    % (
+                        name + (" @" + rev if rev else ""),
+                        seconds,
+                        files / seconds,
+                        peak,
+                        tree_size(out) / 1e6,
+                        same,
+                    )
+                )
+
+    if not args.work_dir:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
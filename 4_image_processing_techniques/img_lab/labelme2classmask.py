@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import os.path as osp
+import sys
+
+import numpy as np
+import PIL.Image
+
+import labelme
+from labelme_image import read_label_file
+from labelme_jobs import convert_files
+from labelme_manifest import Manifest
+
+
+def convert_file(filename, output_dir, label_ids, size):
+    """Write the uint8 class-index mask of one LabelMe JSON file.
+
+    The shapes are rasterized in file order (a later shape paints over an
+    earlier one, as in labelme's ``shapes_to_label``) straight into the mask;
+    the image itself is never decoded, only its size is read. With ``size``
+    ``(width, height)`` the points are scaled and rasterized at that size.
+
+    Returns:
+        list: The written file, relative to ``output_dir``.
+    """
+    shapes, image = read_label_file(filename)
+
+    if size is None:
+        width, height = image.width, image.height
+        scale = None
+    else:
+        width, height = size
+        scale = (width / float(image.width), height / float(image.height))
+
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for shape in shapes:
+        class_id = label_ids[shape["label"]]
+        points = shape["points"]
+        if scale is not None:
+            points = [[x * scale[0], y * scale[1]] for x, y in points]
+        shape_mask = labelme.utils.shape_to_mask(
+            (height, width), points, shape["shape_type"]
+        )
+        mask[shape_mask] = class_id
+
+    base = osp.splitext(osp.basename(filename))[0]
+    out_file = osp.join(output_dir, base + ".png")
+    PIL.Image.fromarray(mask).save(out_file)
+    return [osp.relpath(out_file, output_dir)]
+
+
+def parse_label_ids(text):
+    """``name=id`` pairs, comma separated or one per line, as a dict."""
+    label_ids = {}
+    for item in text.replace(",", "\n").splitlines():
+        if not item.strip():
+            continue
+        name, _, value = item.rpartition("=")
+        label_ids[name.strip()] = int(value)
+    return label_ids
+
+
+def parse_size(text):
+    """``WIDTHxHEIGHT`` or ``N`` (square) as ``(width, height)``."""
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height or width)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("input_dir", help="Input annotated directory")
+    parser.add_argument("output_dir", help="Output directory of <name>.png masks")
+    parser.add_argument(
+        "--labels", help="Labels file or comma separated text", required=True
+    )
+    parser.add_argument(
+        "--label-ids",
+        help="Class id of every label, as a file or comma separated text of "
+        "name=id (default: the position in --labels, _background_ = 0)",
+    )
+    parser.add_argument(
+        "--ignore-id", help="Mask value of __ignore__ shapes", type=int, default=255
+    )
+    parser.add_argument(
+        "--size",
+        help="Output resolution, WIDTHxHEIGHT or N for NxN (default: the image size)",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        help="Number of worker processes (0 = one per CPU core)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Update an existing output directory: convert only new or changed "
+        "files, delete the masks of removed ones, resume an interrupted run",
+        action="store_true",
+    )
+    args = parser.parse_args()
+
+    if osp.exists(args.labels):
+        with open(args.labels) as f:
+            labels_text = f.read()
+        labels = [label.strip() for label in labels_text.splitlines(True) if label]
+    else:
+        labels_text = args.labels
+        labels = [label.strip() for label in args.labels.split(",")]
+    assert labels[0] == "__ignore__" and labels[1] == "_background_"
+
+    if args.label_ids is None:
+        label_ids = {label: i - 1 for i, label in enumerate(labels) if i > 0}
+    elif osp.exists(args.label_ids):
+        with open(args.label_ids) as f:
+            label_ids = parse_label_ids(f.read())
+    else:
+        label_ids = parse_label_ids(args.label_ids)
+    label_ids["__ignore__"] = args.ignore_id
+    missing = [label for label in labels if label not in label_ids]
+    if missing:
+        parser.error("--label-ids has no id for: %s" % ", ".join(missing))
+    for label, class_id in label_ids.items():
+        if not 0 <= class_id <= 255:
+            parser.error("id of %s is not in 0..255: %d" % (label, class_id))
+    size = parse_size(args.size) if args.size else None
+
+    if osp.exists(args.output_dir):
+        if not args.incremental:
+            print("Output directory already exists:", args.output_dir)
+            sys.exit(1)
+        if os.listdir(args.output_dir) and not Manifest.exists(args.output_dir):
+            print("Output directory has no manifest to update:", args.output_dir)
+            sys.exit(1)
+        print("Updating masks:", args.output_dir)
+    else:
+        print("Creating masks:", args.output_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    out_label_ids_file = osp.join(args.output_dir, "label_ids.txt")
+    with open(out_label_ids_file, "w") as f:
+        for label in labels:
+            f.write("%s=%d\n" % (label, label_ids[label]))
+    print("Saved label ids:", out_label_ids_file)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    filenames = sorted(glob.glob(osp.join(args.input_dir, "*.json")))
+
+    # every run keeps the manifest, so an interrupted run can be resumed with --incremental
+    options = dict(label_ids=label_ids, size=list(size) if size else None)
+    manifest = Manifest(args.output_dir, "labelme2classmask", options, labels_text).load()
+    if manifest.stale and manifest.entries:
+        print("Options or labels changed, rebuilding every file")
+    todo, removed = manifest.plan(filenames)
+    for name in removed:
+        print("Removing outputs of:", name)
+        manifest.remove(name)
+    digests = dict(todo)
+    todo = [filename for filename, _ in todo]
+
+    def on_converted(i, filename, outputs):
+        manifest.record(filename, digests[filename], outputs)
+
+    try:
+        failures = convert_files(
+            convert_file,
+            todo,
+            jobs,
+            (args.output_dir, label_ids, size),
+            on_converted,
+        )
+    finally:
+        manifest.close()
+
+    print(
+        "Converted %d of %d files with %d job(s), %d up to date, %d removed"
+        % (
+            len(todo) - len(failures),
+            len(todo),
+            jobs,
+            len(filenames) - len(todo),
+            len(removed),
+        )
+    )
+    if failures:
+        print("%d file(s) failed:" % len(failures))
+        for filename, error in failures:
+            print("  %s: %s" % (filename, error))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,9 @@ import imgviz
 import numpy as np
 
 import labelme
+from labelme_image import read_label_file
+from labelme_jobs import convert_files
+from labelme_manifest import Manifest
 
 try:
     import pycocotools.mask
@@ -22,6 +25,179 @@ except ImportError:
     sys.exit(1)
 
 
+def convert_file(filename, output_dir, class_name_to_id, noviz, rle):
+    """Write the image (and visualization) of one LabelMe JSON file.
+
+    Runs in the main process with --jobs 1 and in a worker process otherwise.
+    The segmentations are polygons, or with ``rle`` the compressed RLE of each
+    instance mask.
+
+    Returns:
+        dict: ``image`` and ``annotations`` COCO entries without their ids (these
+        are assigned when annotations.json is written) and ``outputs``, the
+        written files relative to ``output_dir``.
+    """
+    shapes, img = read_label_file(filename)
+
+    base = osp.splitext(osp.basename(filename))[0]
+    out_img_file = osp.join(output_dir, "JPEGImages", base + ".jpg")
+
+    # the original JPEG bytes when possible; decoded only for the visualization
+    img.save(out_img_file)
+    image = dict(
+        license=0,
+        url=None,
+        file_name=osp.relpath(out_img_file, output_dir),
+        height=img.height,
+        width=img.width,
+        date_captured=None,
+    )
+
+    masks = {}  # for area
+    segmentations = collections.defaultdict(list)  # for segmentation
+    for shape in shapes:
+        points = shape["points"]
+        label = shape["label"]
+        group_id = shape.get("group_id")
+        shape_type = shape.get("shape_type", "polygon")
+        mask = labelme.utils.shape_to_mask(img.shape[:2], points, shape_type)
+
+        if group_id is None:
+            group_id = uuid.uuid1()
+
+        instance = (label, group_id)
+
+        if instance in masks:
+            masks[instance] = masks[instance] | mask
+        else:
+            masks[instance] = mask
+
+        if rle:
+            continue  # the segmentation is the RLE of the instance mask
+
+        if shape_type == "rectangle":
+            (x1, y1), (x2, y2) = points
+            x1, x2 = sorted([x1, x2])
+            y1, y2 = sorted([y1, y2])
+            points = [x1, y1, x2, y1, x2, y2, x1, y2]
+        if shape_type == "circle":
+            (x1, y1), (x2, y2) = points
+            r = np.linalg.norm([x2 - x1, y2 - y1])
+            # r(1-cos(a/2))<x, a=2*pi/N => N>pi/arccos(1-x/r)
+            # x: tolerance of the gap between the arc and the line segment
+            n_points_circle = max(int(np.pi / np.arccos(1 - 1 / r)), 12)
+            i = np.arange(n_points_circle)
+            x = x1 + r * np.sin(2 * np.pi / n_points_circle * i)
+            y = y1 + r * np.cos(2 * np.pi / n_points_circle * i)
+            points = np.stack((x, y), axis=1).flatten().tolist()
+        else:
+            points = np.asarray(points).flatten().tolist()
+
+        segmentations[instance].append(points)
+    segmentations = dict(segmentations)
+
+    annotations = []
+    for instance, mask in masks.items():
+        cls_name, group_id = instance
+        if cls_name not in class_name_to_id:
+            continue
+        cls_id = class_name_to_id[cls_name]
+
+        mask = np.asfortranarray(mask.astype(np.uint8))
+        mask = pycocotools.mask.encode(mask)
+        area = float(pycocotools.mask.area(mask))
+        bbox = pycocotools.mask.toBbox(mask).flatten().tolist()
+        if rle:
+            segmentation = dict(size=mask["size"], counts=mask["counts"].decode())
+        else:
+            segmentation = segmentations[instance]
+
+        annotations.append(
+            dict(
+                category_id=cls_id,
+                segmentation=segmentation,
+                area=area,
+                bbox=bbox,
+                iscrowd=0,
+            )
+        )
+
+    outputs = [out_img_file]
+    if not noviz:
+        viz = img.array()
+        if masks:
+            labels, captions, masks = zip(
+                *[
+                    (class_name_to_id[cnm], cnm, msk)
+                    for (cnm, gid), msk in masks.items()
+                    if cnm in class_name_to_id
+                ]
+            )
+            viz = imgviz.instances2rgb(
+                image=viz,
+                labels=labels,
+                masks=masks,
+                captions=captions,
+                font_size=15,
+                line_width=2,
+            )
+        out_viz_file = osp.join(output_dir, "Visualization", base + ".jpg")
+        imgviz.io.imsave(out_viz_file, viz)
+        outputs.append(out_viz_file)
+
+    return dict(
+        image=image,
+        annotations=annotations,
+        outputs=[osp.relpath(output, output_dir) for output in outputs],
+    )
+
+
+def _write_array(f, items):
+    f.write("[")
+    for i, item in enumerate(items):
+        if i:
+            f.write(", ")
+        json.dump(item, f)
+    f.write("]")
+
+
+def _images(records):
+    for image_id, record in enumerate(records):
+        yield dict(record["image"], id=image_id)
+
+
+def _annotations(records):
+    annotation_id = 0
+    for image_id, record in enumerate(records):
+        for annotation in record["annotations"]:
+            yield dict(id=annotation_id, image_id=image_id, **annotation)
+            annotation_id += 1
+
+
+def write_annotations(filename, data, records):
+    """Write annotations.json, streaming the ``images`` and ``annotations`` arrays.
+
+    ``data`` holds the other keys. ``records()`` yields the manifest records in
+    image id order and is called once per array, so one file's entries are in
+    memory at a time. The bytes are the same as ``json.dump`` of the whole
+    dataset; the file is replaced atomically.
+    """
+    with open(filename + ".tmp", "w") as f:
+        f.write("{")
+        for i, (key, value) in enumerate(data.items()):
+            if i:
+                f.write(", ")
+            f.write(json.dumps(key) + ": ")
+            if key == "images":
+                _write_array(f, _images(records()))
+            elif key == "annotations":
+                _write_array(f, _annotations(records()))
+            else:
+                json.dump(value, f)
+        f.write("}")
+    os.replace(filename + ".tmp", filename)
+
+
 def main():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -30,16 +206,40 @@ def main():
     parser.add_argument("output_dir", help="output dataset directory")
     parser.add_argument("--labels", help="labels file", required=True)
     parser.add_argument("--noviz", help="no visualization", action="store_true")
+    parser.add_argument(
+        "--rle",
+        help="store each instance mask as compressed RLE instead of polygons",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        help="number of worker processes (0 = one per CPU core)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="update an existing output directory: convert only new or changed "
+        "files, drop removed ones, resume an interrupted run",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     if osp.exists(args.output_dir):
-        print("Output directory already exists:", args.output_dir)
-        sys.exit(1)
-    os.makedirs(args.output_dir)
-    os.makedirs(osp.join(args.output_dir, "JPEGImages"))
+        if not args.incremental:
+            print("Output directory already exists:", args.output_dir)
+            sys.exit(1)
+        if os.listdir(args.output_dir) and not Manifest.exists(args.output_dir):
+            print("Output directory has no manifest to update:", args.output_dir)
+            sys.exit(1)
+        print("Updating dataset:", args.output_dir)
+    else:
+        print("Creating dataset:", args.output_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(osp.join(args.output_dir, "JPEGImages"), exist_ok=True)
     if not args.noviz:
-        os.makedirs(osp.join(args.output_dir, "Visualization"))
-    print("Creating dataset:", args.output_dir)
+        os.makedirs(osp.join(args.output_dir, "Visualization"), exist_ok=True)
 
     now = datetime.datetime.now()
 
@@ -61,18 +261,22 @@ def main():
         ],
         images=[
             # license, url, file_name, height, width, date_captured, id
+            # (streamed from the manifest by write_annotations)
         ],
         type="instances",
         annotations=[
             # segmentation, area, iscrowd, image_id, bbox, category_id, id
+            # (streamed from the manifest by write_annotations)
         ],
         categories=[
             # supercategory, id, name
         ],
     )
 
+    with open(args.labels) as f:
+        labels_text = f.read()
     class_name_to_id = {}
-    for i, line in enumerate(open(args.labels).readlines()):
+    for i, line in enumerate(labels_text.splitlines(True)):
         class_id = i - 1  # starts with -1
         class_name = line.strip()
         if class_id == -1:
@@ -88,119 +292,65 @@ def main():
         )
 
     out_ann_file = osp.join(args.output_dir, "annotations.json")
-    label_files = glob.glob(osp.join(args.input_dir, "*.json"))
-    for image_id, filename in enumerate(label_files):
-        print("Generating dataset from:", filename)
-
-        label_file = labelme.LabelFile(filename=filename)
+    label_files = sorted(glob.glob(osp.join(args.input_dir, "*.json")))
 
-        base = osp.splitext(osp.basename(filename))[0]
-        out_img_file = osp.join(args.output_dir, "JPEGImages", base + ".jpg")
+    # the manifest keeps every file's image and annotation entries, so an update
+    # rewrites annotations.json without touching the images of unchanged files
+    manifest = Manifest(
+        args.output_dir,
+        "labelme2coco",
+        dict(noviz=args.noviz, rle=args.rle),
+        labels_text,
+    ).load()
+    if manifest.stale and manifest.entries:
+        print("Options or labels changed, rebuilding every file")
+    todo, removed = manifest.plan(label_files)
+    for name in removed:
+        print("Removing outputs of:", name)
+        manifest.remove(name)
+    digests = dict(todo)
+    todo = [filename for filename, _ in todo]
+    jobs = args.jobs or os.cpu_count() or 1
 
-        img = labelme.utils.img_data_to_arr(label_file.imageData)
-        if img.shape[2] == 4:
-            img = img[:, :, :3]
-
-    
-        imgviz.io.imsave(out_img_file, img)
-        data["images"].append(
-            dict(
-                license=0,
-                url=None,
-                file_name=osp.relpath(out_img_file, osp.dirname(out_ann_file)),
-                height=img.shape[0],
-                width=img.shape[1],
-                date_captured=None,
-                id=image_id,
-            )
+    def on_converted(i, filename, result):
+        manifest.record(
+            filename,
+            digests[filename],
+            result["outputs"],
+            image=result["image"],
+            annotations=result["annotations"],
         )
 
-        masks = {}  # for area
-        segmentations = collections.defaultdict(list)  # for segmentation
-        for shape in label_file.shapes:
-            points = shape["points"]
-            label = shape["label"]
-            group_id = shape.get("group_id")
-            shape_type = shape.get("shape_type", "polygon")
-            mask = labelme.utils.shape_to_mask(img.shape[:2], points, shape_type)
-
-            if group_id is None:
-                group_id = uuid.uuid1()
+    try:
+        failures = convert_files(
+            convert_file,
+            todo,
+            jobs,
+            (args.output_dir, class_name_to_id, args.noviz, args.rle),
+            on_converted,
+        )
+    finally:
+        manifest.close()
 
-            instance = (label, group_id)
+    # ids follow the sorted input names, whatever the number of jobs, so an
+    # update gives the same ids as a full build
+    write_annotations(out_ann_file, data, manifest.records)
 
-            if instance in masks:
-                masks[instance] = masks[instance] | mask
-            else:
-                masks[instance] = mask
-
-            if shape_type == "rectangle":
-                (x1, y1), (x2, y2) = points
-                x1, x2 = sorted([x1, x2])
-                y1, y2 = sorted([y1, y2])
-                points = [x1, y1, x2, y1, x2, y2, x1, y2]
-            if shape_type == "circle":
-                (x1, y1), (x2, y2) = points
-                r = np.linalg.norm([x2 - x1, y2 - y1])
-                # r(1-cos(a/2))<x, a=2*pi/N => N>pi/arccos(1-x/r)
-                # x: tolerance of the gap between the arc and the line segment
-                n_points_circle = max(int(np.pi / np.arccos(1 - 1 / r)), 12)
-                i = np.arange(n_points_circle)
-                x = x1 + r * np.sin(2 * np.pi / n_points_circle * i)
-                y = y1 + r * np.cos(2 * np.pi / n_points_circle * i)
-                points = np.stack((x, y), axis=1).flatten().tolist()
-            else:
-                points = np.asarray(points).flatten().tolist()
-
-            segmentations[instance].append(points)
-        segmentations = dict(segmentations)
-
-        for instance, mask in masks.items():
-            cls_name, group_id = instance
-            if cls_name not in class_name_to_id:
-                continue
-            cls_id = class_name_to_id[cls_name]
-
-            mask = np.asfortranarray(mask.astype(np.uint8))
-            mask = pycocotools.mask.encode(mask)
-            area = float(pycocotools.mask.area(mask))
-            bbox = pycocotools.mask.toBbox(mask).flatten().tolist()
-
-            data["annotations"].append(
-                dict(
-                    id=len(data["annotations"]),
-                    image_id=image_id,
-                    category_id=cls_id,
-                    segmentation=segmentations[instance],
-                    area=area,
-                    bbox=bbox,
-                    iscrowd=0,
-                )
-            )
-
-        if not args.noviz:
-            viz = img
-            if masks:
-                labels, captions, masks = zip(
-                    *[
-                        (class_name_to_id[cnm], cnm, msk)
-                        for (cnm, gid), msk in masks.items()
-                        if cnm in class_name_to_id
-                    ]
-                )
-                viz = imgviz.instances2rgb(
-                    image=img,
-                    labels=labels,
-                    masks=masks,
-                    captions=captions,
-                    font_size=15,
-                    line_width=2,
-                )
-            out_viz_file = osp.join(args.output_dir, "Visualization", base + ".jpg")
-            imgviz.io.imsave(out_viz_file, viz)
-
-    with open(out_ann_file, "w") as f:
-        json.dump(data, f)
+    print(
+        "Converted %d of %d files with %d job(s), %d up to date, %d removed"
+        % (
+            len(todo) - len(failures),
+            len(todo),
+            jobs,
+            len(label_files) - len(todo),
+            len(removed),
+        )
+    )
+    if failures:
+        print("%d file(s) failed:" % len(failures))
+        for filename, error in failures:
+            print("  %s: %s" % (filename, error))
+        sys.exit(1)
 
 
 if __name__ == "__main__":
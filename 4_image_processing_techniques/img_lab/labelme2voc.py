@@ -12,6 +12,97 @@ import imgviz
 import numpy as np
 
 import labelme
+from labelme_image import read_label_file
+from labelme_jobs import convert_files
+from labelme_manifest import Manifest
+
+
+def convert_file(filename, output_dir, class_names, class_name_to_id, options):
+    """Write every output of one LabelMe JSON file.
+
+    Runs in the main process with --jobs 1 and in a worker process otherwise;
+    the outputs depend only on the arguments, so both give the same bytes.
+
+    Returns:
+        list: The written files, relative to ``output_dir``.
+    """
+    shapes, image = read_label_file(filename)
+
+    base = osp.splitext(osp.basename(filename))[0]
+    out_img_file = osp.join(output_dir, "JPEGImages", base + ".jpg")
+    out_clsp_file = osp.join(output_dir, "SegmentationClass", base + ".png")
+    if not options["nonpy"]:
+        out_cls_file = osp.join(output_dir, "SegmentationClassNpy", base + ".npy")
+    if not options["noviz"]:
+        out_clsv_file = osp.join(
+            output_dir,
+            "SegmentationClassVisualization",
+            base + ".jpg",
+        )
+    if not options["noobject"]:
+        out_insp_file = osp.join(output_dir, "SegmentationObject", base + ".png")
+        if not options["nonpy"]:
+            out_ins_file = osp.join(output_dir, "SegmentationObjectNpy", base + ".npy")
+        if not options["noviz"]:
+            out_insv_file = osp.join(
+                output_dir,
+                "SegmentationObjectVisualization",
+                base + ".jpg",
+            )
+
+    # the original JPEG bytes when possible; decoded only for the visualizations
+    image.save(out_img_file)
+
+    cls, ins = labelme.utils.shapes_to_label(
+        img_shape=image.shape,
+        shapes=shapes,
+        label_name_to_value=class_name_to_id,
+    )
+    ins[cls == -1] = 0  # ignore it.
+
+    # class label
+    labelme.utils.lblsave(out_clsp_file, cls)
+    if not options["nonpy"]:
+        np.save(out_cls_file, cls)
+    if not options["noviz"]:
+        clsv = imgviz.label2rgb(
+            cls,
+            imgviz.rgb2gray(image.array()),
+            label_names=class_names,
+            font_size=15,
+            loc="rb",
+        )
+        imgviz.io.imsave(out_clsv_file, clsv)
+
+    if not options["noobject"]:
+        # instance label
+        labelme.utils.lblsave(out_insp_file, ins)
+        if not options["nonpy"]:
+            np.save(out_ins_file, ins)
+        if not options["noviz"]:
+            instance_ids = np.unique(ins)
+            instance_names = [str(i) for i in range(max(instance_ids) + 1)]
+            insv = imgviz.label2rgb(
+                ins,
+                imgviz.rgb2gray(image.array()),
+                label_names=instance_names,
+                font_size=15,
+                loc="rb",
+            )
+            imgviz.io.imsave(out_insv_file, insv)
+
+    outputs = [out_img_file, out_clsp_file]
+    if not options["nonpy"]:
+        outputs.append(out_cls_file)
+    if not options["noviz"]:
+        outputs.append(out_clsv_file)
+    if not options["noobject"]:
+        outputs.append(out_insp_file)
+        if not options["nonpy"]:
+            outputs.append(out_ins_file)
+        if not options["noviz"]:
+            outputs.append(out_insv_file)
+    return [osp.relpath(output, output_dir) for output in outputs]
 
 
 def main():
@@ -32,30 +123,58 @@ def main():
     parser.add_argument(
         "--noviz", help="Flag to disable visualization", action="store_true"
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        help="Number of worker processes (0 = one per CPU core)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Update an existing output directory: convert only new or changed "
+        "files, delete the outputs of removed ones, resume an interrupted run",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     if osp.exists(args.output_dir):
-        print("Output directory already exists:", args.output_dir)
-        sys.exit(1)
-    os.makedirs(args.output_dir)
-    os.makedirs(osp.join(args.output_dir, "JPEGImages"))
-    os.makedirs(osp.join(args.output_dir, "SegmentationClass"))
+        if not args.incremental:
+            print("Output directory already exists:", args.output_dir)
+            sys.exit(1)
+        if os.listdir(args.output_dir) and not Manifest.exists(args.output_dir):
+            print("Output directory has no manifest to update:", args.output_dir)
+            sys.exit(1)
+        print("Updating dataset:", args.output_dir)
+    else:
+        print("Creating dataset:", args.output_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(osp.join(args.output_dir, "JPEGImages"), exist_ok=True)
+    os.makedirs(osp.join(args.output_dir, "SegmentationClass"), exist_ok=True)
     if not args.nonpy:
-        os.makedirs(osp.join(args.output_dir, "SegmentationClassNpy"))
+        os.makedirs(osp.join(args.output_dir, "SegmentationClassNpy"), exist_ok=True)
     if not args.noviz:
-        os.makedirs(osp.join(args.output_dir, "SegmentationClassVisualization"))
+        os.makedirs(
+            osp.join(args.output_dir, "SegmentationClassVisualization"), exist_ok=True
+        )
     if not args.noobject:
-        os.makedirs(osp.join(args.output_dir, "SegmentationObject"))
+        os.makedirs(osp.join(args.output_dir, "SegmentationObject"), exist_ok=True)
         if not args.nonpy:
-            os.makedirs(osp.join(args.output_dir, "SegmentationObjectNpy"))
+            os.makedirs(
+                osp.join(args.output_dir, "SegmentationObjectNpy"), exist_ok=True
+            )
         if not args.noviz:
-            os.makedirs(osp.join(args.output_dir, "SegmentationObjectVisualization"))
-    print("Creating dataset:", args.output_dir)
+            os.makedirs(
+                osp.join(args.output_dir, "SegmentationObjectVisualization"),
+                exist_ok=True,
+            )
 
     if osp.exists(args.labels):
         with open(args.labels) as f:
-            labels = [label.strip() for label in f if label]
+            labels_text = f.read()
+        labels = [label.strip() for label in labels_text.splitlines(True) if label]
     else:
+        labels_text = args.labels
         labels = [label.strip() for label in args.labels.split(",")]
 
     class_names = []
@@ -77,82 +196,50 @@ def main():
         f.writelines("\n".join(class_names))
     print("Saved class_names:", out_class_names_file)
 
-    for filename in sorted(glob.glob(osp.join(args.input_dir, "*.json"))):
-        print("Generating dataset from:", filename)
-
-        label_file = labelme.LabelFile(filename=filename)
-
-        base = osp.splitext(osp.basename(filename))[0]
-        out_img_file = osp.join(args.output_dir, "JPEGImages", base + ".jpg")
-        out_clsp_file = osp.join(args.output_dir, "SegmentationClass", base + ".png")
-        if not args.nonpy:
-            out_cls_file = osp.join(
-                args.output_dir, "SegmentationClassNpy", base + ".npy"
-            )
-        if not args.noviz:
-            out_clsv_file = osp.join(
-                args.output_dir,
-                "SegmentationClassVisualization",
-                base + ".jpg",
-            )
-        if not args.noobject:
-            out_insp_file = osp.join(
-                args.output_dir, "SegmentationObject", base + ".png"
-            )
-            if not args.nonpy:
-                out_ins_file = osp.join(
-                    args.output_dir, "SegmentationObjectNpy", base + ".npy"
-                )
-            if not args.noviz:
-                out_insv_file = osp.join(
-                    args.output_dir,
-                    "SegmentationObjectVisualization",
-                    base + ".jpg",
-                )
-
-        img = labelme.utils.img_data_to_arr(label_file.imageData)
-        if img.shape[2] == 4:
-            img = img[:, :, :3]
-        imgviz.io.imsave(out_img_file, img)
-
-
-        cls, ins = labelme.utils.shapes_to_label(
-            img_shape=img.shape,
-            shapes=label_file.shapes,
-            label_name_to_value=class_name_to_id,
+    options = dict(noobject=args.noobject, nonpy=args.nonpy, noviz=args.noviz)
+    jobs = args.jobs or os.cpu_count() or 1
+    filenames = sorted(glob.glob(osp.join(args.input_dir, "*.json")))
+
+    # every run keeps the manifest, so an interrupted run can be resumed with --incremental
+    manifest = Manifest(args.output_dir, "labelme2voc", options, labels_text).load()
+    if manifest.stale and manifest.entries:
+        print("Options or labels changed, rebuilding every file")
+    todo, removed = manifest.plan(filenames)
+    for name in removed:
+        print("Removing outputs of:", name)
+        manifest.remove(name)
+    digests = dict(todo)
+    todo = [filename for filename, _ in todo]
+
+    def on_converted(i, filename, outputs):
+        manifest.record(filename, digests[filename], outputs)
+
+    try:
+        failures = convert_files(
+            convert_file,
+            todo,
+            jobs,
+            (args.output_dir, class_names, class_name_to_id, options),
+            on_converted,
         )
-        ins[cls == -1] = 0  # ignore it.
-
-        # class label
-        labelme.utils.lblsave(out_clsp_file, cls)
-        if not args.nonpy:
-            np.save(out_cls_file, cls)
-        if not args.noviz:
-            clsv = imgviz.label2rgb(
-                cls,
-                imgviz.rgb2gray(img),
-                label_names=class_names,
-                font_size=15,
-                loc="rb",
-            )
-            imgviz.io.imsave(out_clsv_file, clsv)
-
-        if not args.noobject:
-            # instance label
-            labelme.utils.lblsave(out_insp_file, ins)
-            if not args.nonpy:
-                np.save(out_ins_file, ins)
-            if not args.noviz:
-                instance_ids = np.unique(ins)
-                instance_names = [str(i) for i in range(max(instance_ids) + 1)]
-                insv = imgviz.label2rgb(
-                    ins,
-                    imgviz.rgb2gray(img),
-                    label_names=instance_names,
-                    font_size=15,
-                    loc="rb",
-                )
-                imgviz.io.imsave(out_insv_file, insv)
+    finally:
+        manifest.close()
+
+    print(
+        "Converted %d of %d files with %d job(s), %d up to date, %d removed"
+        % (
+            len(todo) - len(failures),
+            len(todo),
+            jobs,
+            len(filenames) - len(todo),
+            len(removed),
+        )
+    )
+    if failures:
+        print("%d file(s) failed:" % len(failures))
+        for filename, error in failures:
+            print("  %s: %s" % (filename, error))
+        sys.exit(1)
 
 
 if __name__ == "__main__":
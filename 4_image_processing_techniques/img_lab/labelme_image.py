@@ -0,0 +1,98 @@
+"""
+Reading a LabelMe JSON file without decoding its image, for labelme2voc.py and
+labelme2coco.py.
+
+``labelme.LabelFile`` decodes every image to check its size and re-encodes the
+file behind ``imagePath``, and the converters then decode it again and write
+it back to JPEGImages/ as a new JPEG: lossy, slow, and twice the I/O.
+``read_label_file`` keeps the image as the bytes that were stored (embedded
+``imageData`` or the ``imagePath`` file) and reads only the header. When those
+bytes are an RGB JPEG without an EXIF rotation, ``LabelImage.save`` copies them
+to the output unchanged. The pixels are decoded only if the image is needed:
+for the visualizations, or when it has to be re-encoded (PNG or RGBA input,
+grayscale or CMYK JPEG, rotated JPEG).
+"""
+
+import base64
+import io
+import json
+import os.path as osp
+
+import imgviz
+import PIL.Image
+
+import labelme
+from labelme.label_file import LabelFileError
+
+EXIF_ORIENTATION = 0x0112
+
+
+class LabelImage(object):
+    """The image of one LabelMe file: its stored bytes and a lazily decoded array."""
+
+    def __init__(self, data):
+        self.data = data
+        self._array = None
+        with PIL.Image.open(io.BytesIO(data)) as image:  # parses the header only
+            self.format = image.format
+            self.mode = image.mode
+            self.width, self.height = image.size
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1) if self.format == "JPEG" else 1
+        # labelme ignores the EXIF rotation of embedded images, so a rotated JPEG is re-encoded without it
+        self.passthrough = self.format == "JPEG" and self.mode == "RGB" and orientation == 1
+
+    @property
+    def shape(self):
+        return (self.height, self.width, 3)
+
+    def array(self):
+        """The decoded pixels, alpha channel dropped (as the converters always did)."""
+        if self._array is None:
+            img = labelme.utils.img_data_to_arr(self.data)
+            if img.shape[2] == 4:
+                img = img[:, :, :3]
+            self._array = img
+        return self._array
+
+    def save(self, filename):
+        """Write the image as a JPEG: the stored bytes when possible, else decoded and re-encoded."""
+        if self.passthrough:
+            with open(filename, "wb") as f:
+                f.write(self.data)
+        else:
+            imgviz.io.imsave(filename, self.array())
+
+
+def read_label_file(filename):
+    """The shapes and image of a LabelMe JSON file.
+
+    Returns:
+        tuple: ``(shapes, LabelImage)``. The shapes carry the keys labelme's
+        ``shapes_to_label`` / ``shape_to_mask`` use, with labelme's defaults.
+    """
+    try:
+        with open(filename) as f:
+            data = json.load(f)
+        if data["imageData"] is not None:
+            image_data = base64.b64decode(data["imageData"])
+        else:
+            image_path = osp.join(osp.dirname(filename), data["imagePath"])
+            with open(image_path, "rb") as f:
+                image_data = f.read()
+        image = LabelImage(image_data)
+        if data["imageData"] is None and image.format == "JPEG" and not image.passthrough:
+            # labelme applies the EXIF rotation of imagePath files
+            image = LabelImage(labelme.LabelFile.load_image_file(image_path))
+        shapes = [
+            dict(
+                label=s["label"],
+                points=s["points"],
+                shape_type=s.get("shape_type", "polygon"),
+                flags=s.get("flags", {}),
+                group_id=s.get("group_id"),
+            )
+            for s in data["shapes"]
+        ]
+    except Exception as e:
+        raise LabelFileError(e)
+    return shapes, image
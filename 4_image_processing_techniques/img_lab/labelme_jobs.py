@@ -0,0 +1,71 @@
+"""
+Serial or multi-process conversion of LabelMe files, for labelme2voc.py and
+labelme2coco.py.
+"""
+
+import collections
+import concurrent.futures
+import traceback
+
+
+def _error(exc):
+    return "".join(traceback.format_exception_only(type(exc), exc)).strip()
+
+
+def convert_files(convert_file, filenames, jobs, convert_args, on_converted=None):
+    """Run ``convert_file(filename, *convert_args)`` on every file, serially or on
+    a pool of ``jobs`` processes.
+
+    At most ``2 * jobs`` files are in flight, and progress is reported in input
+    order. A failing file does not stop the run. ``on_converted(i, filename,
+    result)`` is called in the main process, in input order, for every file
+    that was converted.
+
+    Returns:
+        list: ``(filename, error message)`` of the files that failed.
+    """
+    failures = []
+    total = len(filenames)
+
+    def report(i, filename, result, error):
+        if error is None:
+            print("[%d/%d] Generated dataset from: %s" % (i + 1, total, filename))
+            if on_converted is not None:
+                on_converted(i, filename, result)
+        else:
+            print("[%d/%d] FAILED %s: %s" % (i + 1, total, filename, error))
+            failures.append((filename, error))
+
+    if jobs <= 1:
+        for i, filename in enumerate(filenames):
+            try:
+                result, error = convert_file(filename, *convert_args), None
+            except Exception as e:
+                result, error = None, _error(e)
+            report(i, filename, result, error)
+        return failures
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = collections.deque()
+        queued = iter(enumerate(filenames))
+        try:
+            while True:
+                while len(pending) < 2 * jobs:
+                    item = next(queued, None)
+                    if item is None:
+                        break
+                    i, filename = item
+                    future = pool.submit(convert_file, filename, *convert_args)
+                    pending.append((i, filename, future))
+                if not pending:
+                    break
+                i, filename, future = pending.popleft()
+                try:
+                    result, error = future.result(), None
+                except Exception as e:
+                    result, error = None, _error(e)
+                report(i, filename, result, error)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    return failures
@@ -0,0 +1,193 @@
+"""
+Manifest of a dataset built by labelme2voc.py / labelme2coco.py, for
+incremental and resumable builds.
+
+The manifest is a JSON-lines journal in the output directory. The first line
+holds the converter, its options and the hash of the labels; every later line
+records one converted input file (content hash and the outputs it produced) or
+the removal of one. A line is appended and flushed as soon as a file is done,
+so a crashed run leaves a manifest that covers exactly the files that
+finished, and the next ``--incremental`` run resumes from there. At the end of
+a run the journal is compacted to one line per file.
+
+Only the input name, hash and outputs of each record are kept in memory, with
+the offset of its line in the journal. Extra fields (labelme2coco stores every
+file's image and annotation entries) stay on disk and are read back one
+record at a time by ``Manifest.records``.
+"""
+
+import hashlib
+import json
+import os
+import os.path as osp
+
+MANIFEST_NAME = ".labelme_manifest.jsonl"
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def input_hash(filename):
+    """Hash of a LabelMe JSON file, plus the image it points to when imageData is not embedded."""
+    with open(filename, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data)
+    try:
+        document = json.loads(data)
+    except ValueError:
+        return digest.hexdigest()  # the converter reports the broken file
+    if isinstance(document, dict) and not document.get("imageData") and document.get("imagePath"):
+        image_path = osp.join(osp.dirname(filename), document["imagePath"])
+        if osp.exists(image_path):
+            with open(image_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    """Per-input records of one output directory."""
+
+    def __init__(self, output_dir, converter, options, labels):
+        """
+        Args:
+            output_dir (str): Dataset directory; the manifest lives inside it.
+            converter (str): Name of the converter (``"labelme2voc"``, ``"labelme2coco"``).
+            options (dict): Converter options that change the outputs.
+            labels (str): Contents of the labels file (or the comma-separated labels).
+        """
+        self.output_dir = output_dir
+        self.path = osp.join(output_dir, MANIFEST_NAME)
+        self.header = dict(
+            converter=converter, options=options, labels_sha256=sha256_bytes(labels.encode())
+        )
+        self.entries = {}  # input file name -> record, without its extra fields
+        self.stale = False  # options or labels changed since the last build
+        self._offsets = {}  # input file name -> offset of its full record in the journal
+        self._size = 0  # end of the last complete line of the journal
+        self._journal = None
+
+    @classmethod
+    def exists(cls, output_dir):
+        return osp.exists(osp.join(output_dir, MANIFEST_NAME))
+
+    def load(self):
+        """Read the journal, replaying appends and removals; a torn last line (crash) is dropped."""
+        if not osp.exists(self.path):
+            return self
+        header = None
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                start, offset = offset, offset + len(line)
+                if not line.endswith(b"\n"):
+                    offset = start  # the next append overwrites it
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if header is None:
+                    header = record
+                elif record.get("removed"):
+                    self._forget(record["input"])
+                else:
+                    self._index(record, start)
+        self._size = offset
+        self.stale = header != self.header
+        return self
+
+    def _index(self, record, offset):
+        name = record["input"]
+        self.entries[name] = dict(input=name, sha256=record["sha256"], outputs=record["outputs"])
+        self._offsets[name] = offset
+
+    def _forget(self, name):
+        self.entries.pop(name, None)
+        self._offsets.pop(name, None)
+
+    def plan(self, filenames):
+        """Split the current inputs into work and removals.
+
+        Returns:
+            tuple: ``(todo, removed)`` with ``todo`` the ``(filename, sha256)`` of new or
+            changed inputs (every input when the manifest is stale) and ``removed`` the
+            names of recorded inputs that no longer exist (every record when stale).
+        """
+        current = {osp.basename(filename): filename for filename in filenames}
+        todo = []
+        for filename in filenames:
+            digest = input_hash(filename)
+            entry = self.entries.get(osp.basename(filename))
+            if self.stale or entry is None or entry["sha256"] != digest:
+                todo.append((filename, digest))
+        if self.stale:
+            removed = list(self.entries)
+        else:
+            removed = [name for name in self.entries if name not in current]
+        return todo, removed
+
+    def _append(self, record):
+        """Write ``record`` to the journal and return the offset of its line."""
+        if self._journal is None:
+            if self.stale or not osp.exists(self.path):
+                # a stale build is redone from scratch: plan() removes every old record
+                self._journal = open(self.path, "wb")
+                self._journal.write((json.dumps(self.header) + "\n").encode())
+                self.stale = False
+            else:
+                self._journal = open(self.path, "r+b")
+                self._journal.seek(self._size)
+                self._journal.truncate()
+        offset = self._journal.tell()
+        self._journal.write((json.dumps(record) + "\n").encode())
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        return offset
+
+    def record(self, filename, digest, outputs, **extra):
+        """The input ``filename`` (hash ``digest``) was converted into ``outputs`` (paths relative to the dataset)."""
+        record = dict(input=osp.basename(filename), sha256=digest, outputs=sorted(outputs), **extra)
+        self._index(record, self._append(record))
+
+    def remove(self, name):
+        """Delete the outputs recorded for input ``name`` and forget it."""
+        entry = self.entries.get(name)
+        for output in entry["outputs"] if entry else []:
+            path = osp.join(self.output_dir, output)
+            if osp.exists(path):
+                os.remove(path)
+        self._append(dict(input=name, removed=True))
+        self._forget(name)
+
+    def records(self):
+        """Yield the full records, extra fields included, sorted by input name."""
+        if not self.entries:
+            return
+        if self._journal is not None:
+            self._journal.flush()
+        with open(self.path, "rb") as f:
+            for name in sorted(self.entries):
+                f.seek(self._offsets[name])
+                yield json.loads(f.readline())
+
+    def close(self):
+        """Compact the journal to the header plus one line per input."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self.stale:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write((json.dumps(self.header) + "\n").encode())
+            offsets = {}
+            if self.entries:
+                with open(self.path, "rb") as journal:
+                    for name in sorted(self.entries):
+                        journal.seek(self._offsets[name])
+                        offsets[name] = f.tell()
+                        f.write(journal.readline())
+            self._size = f.tell()
+        os.replace(tmp, self.path)
+        self._offsets = offsets
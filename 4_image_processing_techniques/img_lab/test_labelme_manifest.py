@@ -0,0 +1,148 @@
+"""Incremental plans, journal replay and resume of labelme_manifest.Manifest (no labelme needed)."""
+
+import json
+import os
+import os.path as osp
+
+from labelme_manifest import MANIFEST_NAME, Manifest, input_hash
+
+OPTIONS = dict(noviz=False)
+LABELS = "__ignore__\n_background_\ncat\ndog\n"
+
+
+def write_input(input_dir, name, label="cat", image_path=None):
+    document = dict(shapes=[dict(label=label, points=[[0, 0], [1, 1]], shape_type="rectangle")])
+    if image_path is None:
+        document["imageData"] = "aW1hZ2U="
+    else:
+        document["imagePath"] = image_path
+    filename = osp.join(str(input_dir), name + ".json")
+    with open(filename, "w") as f:
+        json.dump(document, f)
+    return filename
+
+
+def convert(manifest, output_dir, todo):
+    """Stand-in for a converter: one output file per input, recorded as it finishes."""
+    for filename, digest in todo:
+        output = osp.splitext(osp.basename(filename))[0] + ".png"
+        with open(osp.join(str(output_dir), output), "w") as f:
+            f.write(filename)
+        manifest.record(filename, digest, [output], image=dict(file_name=output))
+
+
+def build(input_dir, output_dir, options=OPTIONS, labels=LABELS):
+    """One --incremental run; returns what it planned."""
+    manifest = Manifest(str(output_dir), "labelme2voc", options, labels).load()
+    filenames = sorted(str(path) for path in input_dir.glob("*.json"))
+    todo, removed = manifest.plan(filenames)
+    for name in removed:
+        manifest.remove(name)
+    convert(manifest, output_dir, todo)
+    manifest.close()
+    return [osp.basename(filename) for filename, _ in todo], removed
+
+
+def journal_lines(output_dir):
+    with open(osp.join(str(output_dir), MANIFEST_NAME), "rb") as f:
+        return f.read().splitlines(True)
+
+
+def test_only_new_and_changed_files_are_converted_and_removed_ones_cleaned_up(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for name in ("a", "b", "c"):
+        write_input(input_dir, name)
+
+    assert build(input_dir, output_dir) == (["a.json", "b.json", "c.json"], [])
+    assert build(input_dir, output_dir) == ([], [])
+
+    write_input(input_dir, "b", label="dog")
+    write_input(input_dir, "d")
+    os.remove(str(input_dir / "c.json"))
+    assert build(input_dir, output_dir) == (["b.json", "d.json"], ["c.json"])
+    assert sorted(os.listdir(str(output_dir))) == [MANIFEST_NAME, "a.png", "b.png", "d.png"]
+
+    manifest = Manifest(str(output_dir), "labelme2voc", OPTIONS, LABELS).load()
+    assert not manifest.stale and sorted(manifest.entries) == ["a.json", "b.json", "d.json"]
+    assert [record["image"]["file_name"] for record in manifest.records()] == ["a.png", "b.png", "d.png"]
+    assert len(journal_lines(output_dir)) == 4  # compacted: the header plus one line per input
+
+
+def test_a_changed_image_file_changes_the_hash(tmp_path):
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b"jpeg 1")
+    filename = write_input(tmp_path, "a", image_path="a.jpg")
+    before = input_hash(filename)
+    image.write_bytes(b"jpeg 2")
+    assert input_hash(filename) != before
+
+    embedded = write_input(tmp_path, "b")
+    before = input_hash(embedded)
+    image.write_bytes(b"jpeg 3")
+    assert input_hash(embedded) == before  # imageData is embedded, the file on disk does not matter
+
+
+def test_changed_options_or_labels_rebuild_everything(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for name in ("a", "b"):
+        write_input(input_dir, name)
+    build(input_dir, output_dir)
+
+    assert build(input_dir, output_dir, options=dict(noviz=True)) == (["a.json", "b.json"], ["a.json", "b.json"])
+    assert build(input_dir, output_dir, options=dict(noviz=True)) == ([], [])
+    header = json.loads(journal_lines(output_dir)[0])
+    assert header["options"] == dict(noviz=True)
+
+    todo, removed = build(input_dir, output_dir, options=dict(noviz=True), labels=LABELS + "bird\n")
+    assert todo == ["a.json", "b.json"] and removed == ["a.json", "b.json"]
+    assert sorted(os.listdir(str(output_dir))) == [MANIFEST_NAME, "a.png", "b.png"]
+
+
+def test_an_interrupted_run_resumes_from_the_last_finished_file(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    filenames = [write_input(input_dir, name) for name in ("a", "b", "c")]
+
+    manifest = Manifest(str(output_dir), "labelme2voc", OPTIONS, LABELS).load()
+    todo, _ = manifest.plan(filenames)
+    convert(manifest, output_dir, todo[:2])
+    manifest._journal.close()  # killed before close(): the journal is not compacted
+
+    manifest = Manifest(str(output_dir), "labelme2voc", OPTIONS, LABELS).load()
+    assert sorted(manifest.entries) == ["a.json", "b.json"]
+    todo, removed = manifest.plan(filenames)
+    assert [osp.basename(filename) for filename, _ in todo] == ["c.json"] and removed == []
+    convert(manifest, output_dir, todo)
+    manifest.close()
+    assert build(input_dir, output_dir) == ([], [])
+
+
+def test_a_torn_last_line_is_dropped_and_overwritten(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    for name in ("a", "b"):
+        write_input(input_dir, name)
+    build(input_dir, output_dir)
+    with open(str(output_dir / MANIFEST_NAME), "ab") as f:
+        f.write(b'{"input": "c.json", "sha256": "ab')  # crashed halfway through the write
+
+    write_input(input_dir, "c")
+    assert build(input_dir, output_dir) == (["c.json"], [])
+    lines = journal_lines(output_dir)
+    assert all(line.endswith(b"\n") for line in lines)
+    assert [json.loads(line)["input"] for line in lines[1:]] == ["a.json", "b.json", "c.json"]
+
+    # a torn line followed by nothing else: the next append starts where it began
+    with open(str(output_dir / MANIFEST_NAME), "ab") as f:
+        f.write(b'{"input": "d.js')
+    manifest = Manifest(str(output_dir), "labelme2voc", OPTIONS, LABELS).load()
+    manifest.record(write_input(input_dir, "d"), "digest", ["d.png"])
+    manifest._journal.close()
+    assert journal_lines(output_dir)[-1] == (json.dumps(dict(input="d.json", sha256="digest",
+                                                              outputs=["d.png"])) + "\n").encode()
@@ -0,0 +1,91 @@
+"""
+Compare the serial `self.pipe(prompt)` path with the continuous batcher.
+
+    python benchmark_text_batching.py --num-prompts 8 --max-new-tokens 64 --batch-size 8
+
+Both paths use greedy decoding so they do the same amount of work. The
+script prints wall time and tokens/sec for each, and optionally writes them
+to a JSON file.
+"""
+
+import argparse
+import json
+import time
+
+from model_work import textModel
+
+
+PROMPTS = [
+    "What is deep learning",
+    "Explain overfitting in one paragraph",
+    "Why do we normalize images before training a CNN",
+    "What is transfer learning",
+    "Describe the U-Net architecture",
+    "What does a learning rate do",
+    "How does dropout help a neural network",
+    "What is the difference between a list and a tuple in Python",
+]
+
+
+def run_serial(text_model, prompts, max_new_tokens):
+    tokenizer = text_model.pipe.tokenizer
+    n_tokens = 0
+    start = time.perf_counter()
+    for prompt in prompts:
+        outputs = text_model.pipe(prompt, max_new_tokens=max_new_tokens, do_sample=False, return_full_text=False)
+        n_tokens += len(tokenizer(outputs[0]["generated_text"], add_special_tokens=False).input_ids)
+    return time.perf_counter() - start, n_tokens
+
+
+def run_batched(text_model, prompts, max_new_tokens):
+    batcher = text_model.batcher
+    tokens_before = batcher.generated_tokens
+    start = time.perf_counter()
+    futures = [batcher.submit(prompt, max_new_tokens=max_new_tokens, do_sample=False) for prompt in prompts]
+    for future in futures:
+        future.result()
+    return time.perf_counter() - start, batcher.generated_tokens - tokens_before
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--num-prompts", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8, help="continuous batcher max batch size")
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    text_model = textModel()
+    text_model.load_pipeline()
+    text_model.start_batching(max_batch_size=args.batch_size)
+
+    prompts = [text_model.build_prompt(PROMPTS[i % len(PROMPTS)]) for i in range(args.num_prompts)]
+
+    # warm-up so neither path pays for first-call allocations
+    run_serial(text_model, prompts[:1], 4)
+    run_batched(text_model, prompts[:1], 4)
+
+    results = {}
+    for name, runner in (("serial", run_serial), ("continuous_batching", run_batched)):
+        elapsed, n_tokens = runner(text_model, prompts, args.max_new_tokens)
+        results[name] = {
+            "wall_time_s": round(elapsed, 3),
+            "generated_tokens": n_tokens,
+            "tokens_per_sec": round(n_tokens / elapsed, 2),
+        }
+        print(f"{name:<20} {elapsed:8.2f} s  {n_tokens:6d} tokens  {n_tokens / elapsed:8.2f} tokens/s")
+
+    results["speedup"] = round(results["continuous_batching"]["tokens_per_sec"] / results["serial"]["tokens_per_sec"], 2)
+    results["batcher"] = text_model.batcher.stats()
+    results["config"] = vars(args) | {"device": text_model.device_name}
+    print(f"speedup: {results['speedup']}x")
+    print(json.dumps(results["batcher"], indent=2))
+
+    text_model.batcher.stop()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,104 @@
 from fastapi import FastAPI, Request,Body
 from schemas import studentRequestModel,textRequestModel,textResponseModel,image_predRequestModel
 import time
+import os
+import sys
 import uvicorn
 import asyncio
+import utils
+from typing import Literal
 
 
-from fastapi import status,Response,Query
+from fastapi import status,Response,Query,HTTPException,Depends
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 
 
 from contextlib import asynccontextmanager
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "8_final_proj"))
+from serving.executor import StageExecutor
+from serving.metrics import METRICS_CONTENT_TYPE, MODEL_LOAD_SECONDS, MetricsMiddleware, render_metrics, stage, timed_run
+from serving.readiness import Readiness, add_health_routes, warmup_batch_sizes
 from model_work import textModel,audioModel
 from model_work import CatAndDogModel,TextGenerationModel
+from model_registry import ModelRegistry
 
 
 
 
 ml_models ={}
 
-@asynccontextmanager
-async def startup_lifespan(app : FastAPI):
 
+def load_text_model():
     text_m_obj = textModel()
     text_m_obj.load_pipeline()
-    ml_models["text_m_obj"] = text_m_obj
+    text_m_obj.start_batching(max_batch_size=int(os.getenv("TEXT_BATCH_SIZE", 8)),
+                              prefix_cache_bytes=int(os.getenv("PREFIX_CACHE_MB", 256)) * 1024 * 1024)
+    return text_m_obj
 
 
+def load_audio_model():
     audio_m_obj = audioModel()
     audio_m_obj.load_audio_model()
-    ml_models["audio_m_obj"] = audio_m_obj
+    return audio_m_obj
 
 
+def load_cat_dog_model():
     catAndDogModel = CatAndDogModel()
-    catAndDogModel.load_model()
-    ml_models["catAndDogModel"] = catAndDogModel
+    if not catAndDogModel.load_model():
+        raise RuntimeError("cat/dog model could not be loaded")
+    return catAndDogModel
+
+
+# models are loaded on first use and evicted (least recently used first) past MODEL_MEMORY_BUDGET_MB
+# prewarmed models also run a warm-up before the app reports ready; WARMUP=0 skips it
+registry = ModelRegistry.from_env()
+registry.register("text", load_text_model, unloader=lambda text_m_obj: text_m_obj.batcher.stop(),
+                  warmup=lambda text_m_obj: text_m_obj.warm_up())
+registry.register("audio", load_audio_model, warmup=lambda audio_m_obj: audio_m_obj.warm_up())
+registry.register("cat_dog", load_cat_dog_model,
+                  warmup=lambda catAndDogModel: catAndDogModel.warm_up(warmup_batch_sizes(1)))
+registry.register("openai", TextGenerationModel)
+
+readiness = Readiness()
+
+
+def env_model_list(name):
+    """Model names from a comma-separated environment variable; a typo fails startup instead of a later request."""
+    model_names = [model_name.strip() for model_name in os.getenv(name, "").split(",") if model_name.strip()]
+    registry.check_names(model_names, name)
+    return model_names
 
 
+async def prewarm_models(pinned, prewarm):
+    for model_name in pinned:
+        registry.pin(model_name)
+    with readiness.phase("loading"):
+        await registry.prewarm(prewarm, warm_up=os.getenv("WARMUP", "1") != "0")
+    for model_name in prewarm:
+        model_stats = registry.stats()["models"][model_name]
+        readiness.record_load(model_name, model_stats["load_time_s"])
+        if model_stats["warmed"]:
+            readiness.record_warmup(model_name, {"total": round(model_stats["warmup_time_s"] * 1000, 1)})
+    readiness.mark_ready()
 
 
-    textGenModel = TextGenerationModel()    
-    ml_models["textGenModel"] = textGenModel
+@asynccontextmanager
+async def startup_lifespan(app : FastAPI):
 
+    # blocking model / client calls run here instead of on the event loop
+    ml_models["stages"] = StageExecutor.from_env()
 
+    # PINNED_MODELS are never evicted and, like PREWARM_MODELS, loaded (concurrently) and warmed up
+    # in the background; the model routes answer 503 until /health/ready reports the replica ready
+    pinned = env_model_list("PINNED_MODELS")
+    readiness.start(prewarm_models(pinned, set(pinned + env_model_list("PREWARM_MODELS"))))
 
     yield
+    await readiness.stop()
+    ml_models["stages"].shutdown(wait=False)
+    await registry.shutdown()
     ml_models.clear()
 
 
@@ -51,6 +106,10 @@ async def startup_lifespan(app : FastAPI):
 
 
 app = FastAPI(lifespan=startup_lifespan)
+# in-flight requests and per-route latency for /metrics
+app.add_middleware(MetricsMiddleware)
+# /health/live, /health/ready (200 once the prewarmed models are loaded and warm) and /health
+add_health_routes(app, readiness)
 
 
 @app.get("/")
@@ -58,27 +117,70 @@ def home():
     return "hello world"
 
 
+@app.get("/stages/stats")
+def stages_stats():
+    return ml_models["stages"].stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape: stage and request latency histograms, in-flight requests, model load times"""
+    for name, model_stats in registry.stats()["models"].items():
+        if model_stats["loads"]:
+            MODEL_LOAD_SECONDS.set(model_stats["load_time_s"], name)
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/models/stats")
+def models_stats():
+    """loaded / pinned models, their size and the memory budget"""
+    return registry.stats()
+
+
+@app.post("/models/{name}/load")
+async def prewarm_model(name : str, pinned : bool = Query(default=False)):
+    """Load a model ahead of its first request, optionally pinning it so it is never evicted."""
+    if name not in registry:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+    if pinned:
+        registry.pin(name)
+    await registry.get(name)
+    return registry.stats()["models"][name]
+
+
+@app.post("/models/{name}/unload")
+async def unload_model(name : str):
+    if name not in registry:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+    if registry.busy(name):
+        # unloading now would pull the model out from under the requests (and streams) using it
+        raise HTTPException(status_code=409, detail=f"Model {name} is loading or serving requests, retry later")
+    registry.pin(name, pinned=False)
+    await registry.unload(name)
+    return registry.stats()["models"][name]
+
+
 @app.post("/get_student")
 def get_student(request : Request,
                 body : studentRequestModel = Body(...)) -> textResponseModel:
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     result = "OK"
     return textResponseModel(
-        execution_time=int(time.time()-start_time),
+        execution_time=int(time.perf_counter()-start_time),
         result=result
     )
 
 
 @app.post("/sync")
 def sync_prediction(prompt: str) -> textResponseModel:
-    start_time = time.time()
+    start_time = time.perf_counter()
     time.sleep(5)
 
     
     result = "OK"
     return textResponseModel(
-        execution_time=int(time.time()-start_time),
+        execution_time=int(time.perf_counter()-start_time),
         result=result
     )
 
@@ -86,48 +188,99 @@ def sync_prediction(prompt: str) -> textResponseModel:
 
 @app.post("/async")
 async def async_prediction() ->textResponseModel:
-    start_time = time.time()
+    start_time = time.perf_counter()
     await asyncio.sleep(5)
 
     result = "OK"
     return textResponseModel(
-        execution_time=int(time.time()-start_time),
+        execution_time=int(time.perf_counter()-start_time),
         result=result
     )
 
 
-@app.post("/text_gen")
-def serve_text_gen(request : Request,
+@app.post("/text_gen", dependencies=[Depends(readiness.require)])
+async def serve_text_gen(request : Request,
                 body : textRequestModel = Body(...)) -> textResponseModel:
-    start_time = time.time()
-    generated_text = ml_models["text_m_obj"].predict(user_message = body.prompt)
+    start_time = time.perf_counter()
+    async with registry.use("text") as text_m_obj:
+        with stage("inference"):
+            generated_text = await asyncio.wrap_future(text_m_obj.predict_batched(user_message = body.prompt))
 
     return textResponseModel(
-            execution_time=int(time.time()-start_time),
+            execution_time=int(time.perf_counter()-start_time),
             result=generated_text
         )
 
-@app.get("/audio_gen",
-          responses={status.HTTP_200_OK:{"content" : {"audio/wav":{}}}},
+@app.get("/text_gen/stats")
+def text_gen_stats():
+    """tokens/sec and batch occupancy of the continuous batcher"""
+    text_m_obj = registry.peek("text")
+    if text_m_obj is None:
+        return {"loaded": False}
+    return text_m_obj.batcher.stats()
+
+
+@app.post("/text_gen/stream", dependencies=[Depends(readiness.require)],
+          responses={status.HTTP_200_OK:{"content" : {"text/event-stream":{}}}},
           response_class=StreamingResponse,)
-async def serve_audio_gen(prompt = Query(...),prest : audioModel.VoicePresets = Query(default="v2/en_speaker_9")) -> StreamingResponse:
-    
-    output_audio_array = ml_models["audio_m_obj"].generate_audio(prompt)
-    
-    return StreamingResponse(output_audio_array, media_type="audio/wav",headers={"Content-Disposition": "inline; filename=generated_audio.wav"})
+async def serve_text_gen_stream(body : textRequestModel = Body(...),
+                          backend : Literal["local", "openai"] = Query(default="local")) -> StreamingResponse:
+    """Stream the reply as Server-Sent Events: one `data: {"token": ...}` frame per piece, then `event: done`."""
+    model_name = "text" if backend == "local" else "openai"
+    await registry.get(model_name)  # a failed load is an error response, not a broken stream
+
+    async def token_stream():
+        # holding the lease for the whole stream keeps the model from being evicted or unloaded mid-response
+        async with registry.use(model_name) as model:
+            if backend == "local":
+                tokens = model.stream(user_message = body.prompt)
+            else:
+                tokens = model.stream_text(body.prompt)
+            # the token generator blocks, so it is iterated in Starlette's threadpool, off the event loop
+            async for frame in iterate_in_threadpool(utils.sse_token_stream(tokens)):
+                yield frame
+
+    return StreamingResponse(token_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/audio_gen", dependencies=[Depends(readiness.require)],
+          responses={status.HTTP_200_OK:{"content" : {"audio/wav":{}, "audio/ogg":{}}}},
+          response_class=StreamingResponse,)
+async def serve_audio_gen(prompt = Query(...),prest : audioModel.VoicePresets = Query(default="v2/en_speaker_9"),
+                          audio_format : Literal["wav", "ogg"] = Query(default="wav", alias="format")) -> StreamingResponse:
+    """Synthesize the prompt sentence by sentence and stream each piece as soon as it is ready."""
+    audio_m_obj = await registry.get("audio")
+    encoder = utils.AudioStreamEncoder(audio_m_obj.sample_rate, audio_format)
+    stages = ml_models["stages"]
 
+    async def audio_stream():
+        # holding the lease for the whole stream keeps Bark from being evicted mid-response
+        async with registry.use("audio") as audio_m_obj:
+            for chunk in utils.split_sentences(prompt):
+                audio = await timed_run("inference", stages.inference, audio_m_obj.synthesize, chunk, prest)
+                # encoding a few seconds of audio takes a few ms, and the encoder is stateful, so it stays inline
+                with stage("encode"):
+                    encoded = encoder.encode(audio)
+                yield encoded
+            yield encoder.close()
 
+    return StreamingResponse(audio_stream(), media_type=encoder.media_type,
+                             headers={"Content-Disposition": f"inline; filename=generated_audio.{audio_format}"})
 
 
-@app.post("/predict")
-def predict(request: Request, body: image_predRequestModel = Body(...)) -> image_predRequestModel:
+
+
+@app.post("/predict", dependencies=[Depends(readiness.require)])
+async def predict(request: Request, body: image_predRequestModel = Body(...)) -> image_predRequestModel:
     
 
     request_data = body
-    catAndDogModel = ml_models["catAndDogModel"]
-
-    img_array = catAndDogModel.preprocess_image(request_data.image)
-    class_name, prediction = catAndDogModel.predict(img_array)
+    async with registry.use("cat_dog") as catAndDogModel:
+        img_array = await timed_run("preprocess", ml_models["stages"].decode, catAndDogModel.preprocess_image,
+                                    request_data.image)
+        class_name, prediction = await timed_run("inference", ml_models["stages"].inference, catAndDogModel.predict,
+                                                 img_array)
     str_output = f"Prediction: {class_name}, Confidence: {prediction:.2f}"
     request_data.class_name = str_output
     
@@ -137,12 +290,14 @@ def predict(request: Request, body: image_predRequestModel = Body(...)) -> image
 
 
 
-@app.post("/text_generation")
+@app.post("/text_generation", dependencies=[Depends(readiness.require)])
 async def generate_text(request: Request, body: textRequestModel = Body(...)) -> textResponseModel:
 
-    start_time = time.time()
-    response_text =  ml_models["textGenModel"].generate_text(body.prompt)
-    execution_time = start_time - time.time()
+    start_time = time.perf_counter()
+    async with registry.use("openai") as textGenModel:
+        response_text = await timed_run("inference", ml_models["stages"].inference, textGenModel.generate_text,
+                                        body.prompt)
+    execution_time = time.perf_counter() - start_time
     print(f"Response: {response_text}")
     print(f"Execution time: {execution_time:.2f} seconds")
 
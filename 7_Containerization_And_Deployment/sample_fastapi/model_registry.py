@@ -0,0 +1,291 @@
+"""
+Lazy, memory-budgeted registry for the models served by this app.
+
+Loading TinyLlama, Bark and the Keras classifier up front makes startup slow
+and keeps gigabytes resident even when only one endpoint is used.
+`ModelRegistry` loads a model the first time a request needs it, measures
+its resident size, and unloads least-recently-used models once the total
+passes `memory_budget_bytes`.
+
+- concurrent first requests for the same model share one load,
+- pinned models are never evicted,
+- `prewarm()` loads models ahead of the first request, concurrently, and runs their warm-up,
+- a model that is in use by a request (`async with registry.use(name)`) is not evicted.
+"""
+
+import asyncio
+import contextlib
+import gc
+import os
+import time
+
+
+def _rss_bytes():
+    """Current resident set size of this process (Linux), 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _tensor_bytes(obj, seen=None, depth=0):
+    """Bytes held by the torch / Keras weights reachable from `obj` (a few attribute levels deep)."""
+    seen = set() if seen is None else seen
+    if obj is None or id(obj) in seen or depth > 3:
+        return 0
+    seen.add(id(obj))
+
+    # torch.nn.Module
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    # keras.Model
+    if hasattr(obj, "weights") and hasattr(obj, "count_params"):
+        return sum(int(w.numpy().nbytes) for w in obj.weights)
+
+    if isinstance(obj, (str, bytes, int, float, bool)) or not hasattr(obj, "__dict__"):
+        return 0
+    return sum(_tensor_bytes(value, seen, depth + 1) for value in vars(obj).values())
+
+
+def model_size_bytes(obj, rss_delta=0):
+    """Size of a loaded model: its weights if they can be found, else the RSS growth during the load."""
+    try:
+        weights = _tensor_bytes(obj)
+    except Exception:
+        weights = 0
+    return weights or max(rss_delta, 0)
+
+
+class ModelEntry:
+
+    def __init__(self, name, loader, unloader=None, pinned=False, warmup=None):
+        self.name = name
+        self.loader = loader
+        self.unloader = unloader
+        self.pinned = pinned
+        self.warmup = warmup
+        self.warmed = False
+
+        self.model = None
+        self.size_bytes = 0        # kept after an unload so the next load can make room up front
+        self.last_used = 0.0
+        self.in_use = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_time_s = 0.0
+        self.warmup_time_s = 0.0
+
+
+class ModelRegistry:
+
+    def __init__(self, memory_budget_bytes=0):
+        """
+        Args:
+            memory_budget_bytes (int): Total size the loaded models may take, 0 means no limit.
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries = {}
+        self._loading = {}  # name -> asyncio.Future of the load in progress
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+
+    @classmethod
+    def from_env(cls):
+        """Budget from `MODEL_MEMORY_BUDGET_MB` (0 or unset = unlimited)."""
+        return cls(memory_budget_bytes=int(os.getenv("MODEL_MEMORY_BUDGET_MB", 0)) * 1024 * 1024)
+
+
+    def register(self, name, loader, unloader=None, pinned=False, warmup=None):
+        """Declare a model without loading it.
+
+        Args:
+            name (str): Key used by `get()` / `use()`.
+            loader (callable): Blocking, zero-argument function that returns the loaded model.
+                               It runs in a worker thread.
+            unloader (callable | None): Called with the model when it is evicted (stop threads, free caches).
+            pinned (bool): Never evict this model.
+            warmup (callable | None): Called with the model by `prewarm()` after loading it, in a worker
+                                      thread, so the first request does not pay for graph building,
+                                      lazy initialization or cache fills.
+        """
+        self._entries[name] = ModelEntry(name, loader, unloader, pinned, warmup)
+
+
+    def __contains__(self, name):
+        return name in self._entries
+
+
+    def check_names(self, names, source):
+        """Raise ValueError naming `source` (e.g. an environment variable) if a name is not registered."""
+        unknown = [name for name in names if name not in self._entries]
+        if unknown:
+            raise ValueError(f"{source} names unknown model(s): {', '.join(unknown)} "
+                             f"(registered: {', '.join(self._entries)})")
+
+
+    def pin(self, name, pinned=True):
+        self.check_names([name], "pin()")
+        self._entries[name].pinned = pinned
+
+
+    def busy(self, name):
+        """True while a request holds the model (`use()`) or it is being loaded."""
+        return self._entries[name].in_use > 0 or name in self._loading
+
+
+    def peek(self, name):
+        """The model if it is loaded, else None. Never triggers a load."""
+        return self._entries[name].model
+
+
+    @property
+    def loaded_bytes(self):
+        return sum(entry.size_bytes for entry in self._entries.values() if entry.model is not None)
+
+
+    async def get(self, name):
+        """Return the loaded model, loading it first if needed."""
+        entry = self._entries[name]
+        entry.last_used = time.monotonic()
+
+        if entry.model is not None:
+            self.hits += 1
+            return entry.model
+
+        if name in self._loading:
+            self.coalesced += 1
+            return await asyncio.shield(self._loading[name])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[name] = future
+        try:
+            # a model seen before has a known size, so make room before loading it again
+            if entry.size_bytes:
+                await self._evict(needed=entry.size_bytes, keep=name)
+
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            model = await asyncio.to_thread(entry.loader)
+            entry.load_time_s = time.perf_counter() - started
+            entry.size_bytes = await asyncio.to_thread(model_size_bytes, model, _rss_bytes() - rss_before)
+            entry.model = model
+            entry.loads += 1
+            entry.last_used = time.monotonic()
+
+            await self._evict(keep=name)
+            future.set_result(model)
+            return model
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, even when nobody else was waiting
+            raise
+        finally:
+            del self._loading[name]
+
+
+    @contextlib.asynccontextmanager
+    async def use(self, name):
+        """`async with registry.use("text") as model:` keeps the model from being evicted while the block runs."""
+        model = await self.get(name)
+        entry = self._entries[name]
+        entry.in_use += 1
+        try:
+            yield model
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+
+    async def prewarm(self, names, warm_up=True):
+        """Load several models concurrently (e.g. from the lifespan hook), each warmed up as soon as it is loaded."""
+        await asyncio.gather(*(self._load_and_warm(name, warm_up) for name in names))
+
+
+    async def _load_and_warm(self, name, warm_up):
+        model = await self.get(name)
+        entry = self._entries[name]
+        if not warm_up or entry.warmup is None or entry.warmed:
+            return
+        entry.in_use += 1  # not evicted while warming up
+        try:
+            started = time.perf_counter()
+            await asyncio.to_thread(entry.warmup, model)
+            entry.warmup_time_s = time.perf_counter() - started
+            entry.warmed = True
+        finally:
+            entry.in_use -= 1
+
+
+    async def unload(self, name):
+        entry = self._entries[name]
+        model, entry.model = entry.model, None
+        entry.warmed = False
+        if model is None:
+            return
+        if entry.unloader is not None:
+            await asyncio.to_thread(entry.unloader, model)
+        del model
+        gc.collect()
+
+
+    async def _evict(self, needed=0, keep=None):
+        """Unload least-recently-used, unpinned, idle models until `needed` more bytes fit the budget."""
+        if not self.memory_budget_bytes:
+            return
+
+        candidates = sorted(
+            (entry for entry in self._entries.values()
+             if entry.model is not None and not entry.pinned and not entry.in_use and entry.name != keep),
+            key=lambda entry: entry.last_used,
+        )
+        for entry in candidates:
+            if self.loaded_bytes + needed <= self.memory_budget_bytes:
+                break
+            print(f"evicting model {entry.name} ({entry.size_bytes / 2**20:.0f} MB)")
+            await self.unload(entry.name)
+            entry.evictions += 1
+
+        if self.loaded_bytes + needed > self.memory_budget_bytes:
+            print(f"model memory budget exceeded: {(self.loaded_bytes + needed) / 2**20:.0f} MB loaded "
+                  f"> {self.memory_budget_bytes / 2**20:.0f} MB (pinned or in-use models cannot be evicted)")
+
+
+    async def shutdown(self):
+        for name in list(self._entries):
+            await self.unload(name)
+
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "loaded_bytes": self.loaded_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "models": {
+                entry.name: {
+                    "loaded": entry.model is not None,
+                    "loading": entry.name in self._loading,
+                    "pinned": entry.pinned,
+                    "in_use": entry.in_use,
+                    "size_bytes": entry.size_bytes,
+                    "loads": entry.loads,
+                    "evictions": entry.evictions,
+                    "load_time_s": round(entry.load_time_s, 2),
+                    "warmed": entry.warmed,
+                    "warmup_time_s": round(entry.warmup_time_s, 2),
+                    "idle_s": round(now - entry.last_used, 1) if entry.last_used else None,
+                }
+                for entry in self._entries.values()
+            },
+        }
@@ -2,11 +2,18 @@
 from typing import Literal
 import numpy as np
 from io import BytesIO
-from transformers import AutoProcessor, AutoModel, Pipeline, pipeline
+from transformers import AutoProcessor, AutoModel, Pipeline, pipeline, TextIteratorStreamer
+from threading import Thread
 from typing import Literal
 import torch
 import utils
 import os
+import sys
+from text_batching import ContinuousBatcher
+from prefix_cache import PrefixKVCache
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "8_final_proj"))
+from serving.readiness import warm_up
 import json
 from openai import OpenAI
 from tensorflow.keras.preprocessing import image
@@ -16,6 +23,12 @@ from tensorflow.keras.models import load_model
 class textModel():
     def __init__(self):
         self.pipeline = None
+        self.batcher = None
+        self.prefix_cache = None
+        self.system_message = {
+            "role": "system",
+            "content": "You are a friendly chatbot who always responds in the style of a pirate",
+        }
         self.device_name = None
         if torch.backends.mps.is_available():
             self.device_name = "mps" #cuda
@@ -29,15 +42,30 @@ class textModel():
         print("textModel is loaded ")
 
 
-    def predict(self,user_message):
+    def start_batching(self, max_batch_size=8, prefix_cache_bytes=256 * 1024 * 1024):
+        # token-step batching: concurrent prompts share every forward pass
+        # and the system message KV is computed once and reused
+        self.prefix_cache = PrefixKVCache(self.pipe.model, self.pipe.tokenizer, max_bytes=prefix_cache_bytes)
+        self.batcher = ContinuousBatcher(self.pipe.model, self.pipe.tokenizer, max_batch_size=max_batch_size,
+                                         max_new_tokens=256, prefix_cache=self.prefix_cache)
+        self.batcher.start()
+
+
+    def build_prompt(self, user_message):
         messages = [
-            {
-                "role": "system",
-                "content": "You are a friendly chatbot who always responds in the style of a pirate",
-            },
+            self.system_message,
             {"role": "user", "content": user_message},
         ]
-        prompt = self.pipe.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return self.pipe.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+
+    def system_prefix(self):
+        """The formatted system message every prompt starts with."""
+        return self.pipe.tokenizer.apply_chat_template([self.system_message], tokenize=False)
+
+
+    def predict(self,user_message):
+        prompt = self.build_prompt(user_message)
         outputs = self.pipe(prompt, max_new_tokens=256, do_sample=True, temperature=0.7, top_k=50, top_p=0.95)
 
         outputs_data = outputs[0]["generated_text"].split("<|assistant|>")
@@ -48,6 +76,40 @@ class textModel():
         return result
 
 
+    def warm_up(self):
+        """One short generation through the batcher: first forward pass, and the system prompt's KV in the prefix cache."""
+        self.batcher.submit(self.build_prompt("Hello"), max_new_tokens=4, temperature=0.7, top_k=50, top_p=0.95,
+                            prefix=self.system_prefix()).result()
+
+
+    def predict_batched(self, user_message):
+        """Same sampling settings as predict(), but through the continuous batcher. Returns a Future."""
+        prompt = self.build_prompt(user_message)
+        return self.batcher.submit(prompt, max_new_tokens=256, temperature=0.7, top_k=50, top_p=0.95,
+                                   prefix=self.system_prefix())
+
+
+    def stream(self, user_message):
+        """Yield text pieces as soon as the pipeline produces them (only the assistant reply)."""
+        prompt = self.build_prompt(user_message)
+        streamer = TextIteratorStreamer(self.pipe.tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        def generate():
+            try:
+                self.pipe(prompt, max_new_tokens=256, do_sample=True, temperature=0.7, top_k=50, top_p=0.95, streamer=streamer)
+            except Exception:
+                streamer.end()  # unblock the reader below instead of leaving it waiting forever
+                raise
+
+        # generate() blocks until the last token, so it runs in a worker thread while we read the streamer
+        generation = Thread(target=generate, daemon=True)
+        generation.start()
+        for text in streamer:
+            if text:
+                yield text
+        generation.join()
+
+
 
 class audioModel():
     
@@ -57,6 +119,8 @@ class audioModel():
         self.preset = "v2/en_speaker_9"
         self.processor = None
         self.model = None
+        self.voice_presets = {}  # preset name -> speaker embedding arrays, loaded once
+
 
     def load_audio_model(self) -> tuple[AutoProcessor, AutoModel]:
 
@@ -70,26 +134,47 @@ class audioModel():
         self.model = AutoModel.from_pretrained("suno/bark-small")
 
         print("audioModel is loaded ")
+
+
+    def voice_preset(self, preset):
+        """Speaker embeddings for `preset`, read from the hub cache on the first call only."""
+        if preset not in self.voice_presets:
+            # the processor resolves a preset name to its arrays (from the hub cache) under "history_prompt"
+            arrays = self.processor(text=[""], voice_preset=preset, return_tensors="np")["history_prompt"]
+            self.voice_presets[preset] = {key: np.asarray(value) for key, value in arrays.items()}
+        return self.voice_presets[preset]
+
+
+    def warm_up(self):
+        """Synthesize one word: loads the default voice preset and runs every Bark sub-model once."""
+        self.synthesize("Hello.")
+
+
+    @property
+    def sample_rate(self) -> int:
+        return self.model.generation_config.sample_rate
+
+
+    def synthesize(self, text: str, preset: str | None = None) -> np.ndarray:
+        """Generate the waveform for one (short) piece of text."""
+
+        # Preprocess text prompt with the cached speaker voice preset embedding and return a Pytorch tensor array of tokenized inputs
+        inputs = self.processor(text=[text], return_tensors="pt", voice_preset=self.voice_preset(preset or self.preset))
+
+        # Generate an audio array that contains amplitude values of the synthesized audio signal over time.
+        return self.model.generate(**inputs, do_sample=True).cpu().numpy().squeeze()
     
 
     def generate_audio(
         self,
-        prompt: str ) -> tuple[np.array, int]:
+        prompt: str,
+        preset: str | None = None) -> BytesIO:
 
         if self.processor is None or self.model is None:
             return
-        
 
-        # Preprocess text prompt with a speaker voice preset embedding and return a Pytorch tensor array of tokenized inputs using return_tensors="pt"
-        inputs = self.processor(text=[prompt], return_tensors="pt", voice_preset=self.preset)
-
-
-        # Generate an audio array that contains amplitude values of the synthesized audio signal over time.
-        output = self.model.generate(**inputs, do_sample=True).cpu().numpy().squeeze()
-
-        # Obtain the sampling rate from model generating configurations which can be used to produce the audio.
-        sample_rate = self.model.generation_config.sample_rate
-        audio_buffer = utils.audio_array_to_buffer(output,sample_rate)
+        output = self.synthesize(prompt, preset)
+        audio_buffer = utils.audio_array_to_buffer(output, self.sample_rate)
 
 
         return audio_buffer
@@ -134,6 +219,11 @@ class CatAndDogModel:
         return img_array
 
 
+    def warm_up(self, batch_sizes=(1,)):
+        """Dummy batches of every size /predict sends, so the first request does not build the graph."""
+        return warm_up(self.model.predict, (*self.input_img_size, 3), batch_sizes)
+
+
     def predict(self, img_array):
         prediction = self.model.predict(img_array)[0][0]
         class_name = "dogs" if prediction > 0.5 else "cats"
@@ -145,7 +235,8 @@ class CatAndDogModel:
 class TextGenerationModel:
 
     def __init__(self):
-        self.client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+        # LM Studio by default; OPENAI_BASE_URL points it at another server (e.g. serving/stub_openai.py)
+        self.client = OpenAI(base_url=os.getenv("OPENAI_BASE_URL", "http://localhost:1234/v1"), api_key="lm-studio")
 
     
     def generate_text(self, prompt):
@@ -161,3 +252,22 @@ class TextGenerationModel:
 
 
         return reponse
+
+
+    def stream_text(self, prompt):
+        """Same request as generate_text, but yields the completion chunk by chunk."""
+        stream = self.client.chat.completions.create(
+        model="TheBloke/TinyLlama-1.1B-Chat-v1.0-GGUF",
+        messages=[
+            {"role": "system", "content": "Always answer in rhymes."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                yield text
@@ -0,0 +1,114 @@
+"""
+KV cache for fixed prompt prefixes (the chat system message).
+
+Every /text_gen prompt starts with the same `<|system|> ... </s>` block, so
+its keys/values are identical on every call. `PrefixKVCache` computes them
+once per prefix and hands them to the continuous batcher, which then only
+runs the user message through the model during prefill.
+
+Entries are kept in LRU order and evicted once their total size passes
+`max_bytes`.
+"""
+
+import collections
+import threading
+
+import torch
+from transformers import DynamicCache
+
+
+class PrefixKVCache:
+
+    def __init__(self, model, tokenizer, max_bytes=256 * 1024 * 1024):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_bytes = max_bytes
+        self.device = next(model.parameters()).device
+
+        self._entries = collections.OrderedDict()  # prefix text -> (prefix token ids, past key/values, n_bytes)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+
+
+    @staticmethod
+    def _nbytes(past):
+        return sum(t.numel() * t.element_size() for layer in past for t in layer)
+
+
+    @torch.no_grad()
+    def _compute(self, prefix_ids):
+        outputs = self.model(input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+        past = outputs.past_key_values
+        return past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+
+
+    def lookup(self, prefix, input_ids):
+        """Return `(past_key_values, n_prefix_tokens)` for `prefix` if `input_ids` starts with it, else None.
+
+        `input_ids` is the tokenized full prompt. The prefix is only reused when its tokens are an
+        exact prefix of the prompt's tokens, so a different token split at the boundary falls back
+        to a full prefill instead of producing a wrong cache.
+        """
+        with self._lock:
+            entry = self._entries.get(prefix)
+            if entry is not None:
+                self._entries.move_to_end(prefix)
+
+        if entry is None:
+            prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.device)
+            past = None
+        else:
+            prefix_ids, past, _ = entry
+
+        n_prefix = prefix_ids.shape[1]
+        # at least one prompt token must remain to produce the next-token logits
+        if n_prefix >= input_ids.shape[1] or not torch.equal(input_ids[0, :n_prefix], prefix_ids[0]):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        if past is not None:
+            with self._lock:
+                self.hits += 1
+            return past, n_prefix
+
+        past = self._compute(prefix_ids)
+        self._insert(prefix, prefix_ids, past)
+        return past, n_prefix
+
+
+    def _insert(self, prefix, prefix_ids, past):
+        n_bytes = self._nbytes(past)
+        with self._lock:
+            self.misses += 1
+            if n_bytes > self.max_bytes or prefix in self._entries:
+                return
+            self._entries[prefix] = (prefix_ids, past, n_bytes)
+            self.total_bytes += n_bytes
+            while self.total_bytes > self.max_bytes:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "skipped": self.skipped,
+            }
@@ -0,0 +1,78 @@
+"""Lazy loading, leases, eviction and name checks of the model registry."""
+
+import asyncio
+
+import pytest
+
+from model_registry import ModelRegistry
+
+
+class Weights:
+    """A loaded model whose size the registry reads from `parameters()` / `buffers()`."""
+
+    def __init__(self, n_bytes):
+        self.n_bytes = n_bytes
+
+    def parameters(self):
+        return [Tensor(self.n_bytes)]
+
+    def buffers(self):
+        return []
+
+
+class Tensor:
+
+    def __init__(self, n_bytes):
+        self.n_bytes = n_bytes
+
+    def numel(self):
+        return self.n_bytes
+
+    def element_size(self):
+        return 1
+
+
+def _registry(budget=0):
+    registry = ModelRegistry(memory_budget_bytes=budget)
+    loads = []
+    for name in ("a", "b", "c"):
+        registry.register(name, lambda name=name: loads.append(name) or Weights(100))
+    return registry, loads
+
+
+def test_concurrent_first_requests_share_one_load():
+    registry, loads = _registry()
+
+    async def main():
+        models = await asyncio.gather(*(registry.get("a") for _ in range(3)))
+        return models
+
+    models = asyncio.run(main())
+    assert loads == ["a"] and models[0] is models[1] is models[2]
+    assert registry.stats()["models"]["a"]["size_bytes"] == 100
+
+
+def test_a_model_in_use_is_neither_evicted_nor_busy_afterwards():
+    registry, loads = _registry(budget=150)
+
+    async def main():
+        async with registry.use("a"):
+            assert registry.busy("a")
+            await registry.get("b")  # over budget, but "a" is leased
+            assert registry.peek("a") is not None
+        assert not registry.busy("a")
+        await registry.get("c")  # the lease is gone, so both make room
+
+    asyncio.run(main())
+    assert loads == ["a", "b", "c"]
+    assert registry.peek("a") is None and registry.peek("b") is None
+    assert registry.stats()["loaded_bytes"] == 100
+
+
+def test_unknown_names_fail_with_the_setting_that_named_them():
+    registry, _ = _registry()
+    registry.check_names(["a", "c"], "PINNED_MODELS")
+    with pytest.raises(ValueError, match=r"PREWARM_MODELS names unknown model\(s\): txt \(registered: a, b, c\)"):
+        registry.check_names(["a", "txt"], "PREWARM_MODELS")
+    with pytest.raises(ValueError, match="txt"):
+        registry.pin("txt")
@@ -0,0 +1,186 @@
+"""Continuous batching and the prefix KV cache on a tiny randomly initialised Llama."""
+
+import threading
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers", exc_type=ImportError)
+
+from prefix_cache import PrefixKVCache
+from text_batching import ContinuousBatcher
+
+PREFIX = "<|system|>You are a pirate.</s>"
+
+
+class CharTokenizer:
+    """One token per character after a BOS token, like the prompts TinyLlama's tokenizer produces."""
+
+    bos_token_id = 1
+    eos_token_id = 2
+
+    def __call__(self, text, return_tensors="pt"):
+        ids = [self.bos_token_id] + [3 + ord(char) % 60 for char in text]
+        return transformers.BatchEncoding({"input_ids": torch.tensor([ids])})
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(chr(ord("!") + i) for i in ids if not skip_special_tokens or i > self.eos_token_id)
+
+
+class GatedModel:
+    """Lets `free_calls` forward passes through, then holds the batcher thread until `opened` is set."""
+
+    def __init__(self, model, free_calls):
+        self.model = model
+        self.free_calls = free_calls
+        self.opened = threading.Event()
+
+    def __call__(self, **kwargs):
+        if self.free_calls:
+            self.free_calls -= 1
+        else:
+            self.opened.wait(30)
+        return self.model(**kwargs)
+
+    def parameters(self):
+        return self.model.parameters()
+
+
+class CancellingModel:
+    """Cancels `future` from inside forward pass number `at_call`, i.e. while the batcher is mid-step."""
+
+    def __init__(self, model, at_call):
+        self.model = model
+        self.at_call = at_call
+        self.calls = 0
+        self.future = None
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.calls == self.at_call:
+            assert self.future.cancel()
+        return self.model(**kwargs)
+
+    def parameters(self):
+        return self.model.parameters()
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                                      num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=512)
+    return transformers.LlamaForCausalLM(config).eval()
+
+
+def _generate(model, prompts, max_batch_size, **kwargs):
+    batcher = ContinuousBatcher(model, CharTokenizer(), max_batch_size=max_batch_size, max_new_tokens=12, **kwargs)
+    futures = [batcher.submit(prompt, do_sample=False, prefix=PREFIX) for prompt in prompts]
+    batcher.start()  # every prompt is queued, so the first step already batches them
+    try:
+        return [future.result(timeout=60) for future in futures], batcher.stats()
+    finally:
+        batcher.stop()
+
+
+def _wait_for(condition, timeout_s=30):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_batched_decoding_matches_one_at_a_time(model):
+    prompts = [PREFIX + text for text in ("Ahoy", "What is deep learning?", "x")]
+    alone, _ = _generate(model, prompts, max_batch_size=1)
+    batched, stats = _generate(model, prompts, max_batch_size=3)
+    assert batched == alone
+    assert stats["completed_requests"] == 3 and stats["mean_batch_occupancy"] > 1 / 3
+
+
+def test_cancelled_request_leaves_the_batch_and_the_rest_completes(model):
+    gated = GatedModel(model, free_calls=2)  # both prefills, then the first decode step waits
+    batcher = ContinuousBatcher(gated, CharTokenizer(), max_batch_size=4)
+    short = batcher.submit("Ahoy", max_new_tokens=30, do_sample=False)
+    long = batcher.submit("Hello there", max_new_tokens=60, do_sample=False)
+    batcher.start()
+    try:
+        _wait_for(lambda: batcher.stats()["active_sequences"] == 2)
+        assert short.cancel()  # the client of the first request disconnects mid-generation
+        gated.opened.set()
+        assert isinstance(long.result(timeout=60), str)
+
+        queued = batcher.submit("never admitted")
+        queued.cancel()
+        assert isinstance(batcher.submit("still served", max_new_tokens=4).result(timeout=60), str)
+        stats = batcher.stats()
+        assert stats["cancelled_requests"] == 2 and stats["failed_requests"] == 0
+        assert stats["active_sequences"] == 0 and batcher._thread.is_alive()
+    finally:
+        batcher.stop()
+
+
+def test_a_request_cancelled_during_its_last_step_is_counted_as_cancelled(model):
+    cancelling = CancellingModel(model, at_call=3)  # both prefills, then the step that finishes "Ahoy"
+    batcher = ContinuousBatcher(cancelling, CharTokenizer(), max_batch_size=4)
+    short = cancelling.future = batcher.submit("Ahoy", max_new_tokens=2, do_sample=False)
+    long = batcher.submit("Hello there", max_new_tokens=8, do_sample=False)
+    batcher.start()
+    try:
+        assert isinstance(long.result(timeout=60), str)
+        assert short.cancelled()
+        stats = batcher.stats()
+        assert (stats["completed_requests"], stats["cancelled_requests"], stats["failed_requests"]) == (1, 1, 0)
+        assert batcher._thread.is_alive()
+    finally:
+        batcher.stop()
+
+
+def test_stop_fails_active_and_queued_requests(model):
+    gated = GatedModel(model, free_calls=1)  # one prefill, then the decode step waits
+    batcher = ContinuousBatcher(gated, CharTokenizer(), max_batch_size=1)
+    futures = [batcher.submit("Ahoy", max_new_tokens=500, do_sample=False) for _ in range(3)]
+    futures[0].cancel()
+    batcher.start()
+    _wait_for(lambda: batcher.stats()["active_sequences"] == 1)
+    threading.Timer(0.2, gated.opened.set).start()  # lets the step stop() waits for finish
+    batcher.stop()
+    assert futures[0].cancelled()
+    for future in futures[1:]:
+        with pytest.raises(RuntimeError, match="stopped"):
+            future.result(timeout=1)
+
+
+def test_prefix_cache_gives_the_same_text_with_a_shorter_prefill(model):
+    prompts = [PREFIX + text for text in ("Ahoy", "What is deep learning?")]
+    plain, plain_stats = _generate(model, prompts, max_batch_size=2)
+    cache = PrefixKVCache(model, CharTokenizer())
+    cached, cached_stats = _generate(model, prompts, max_batch_size=2, prefix_cache=cache)
+
+    n_prefix = len(PREFIX) + 1
+    assert cached == plain
+    assert cached_stats["prefill_tokens_saved"] == 2 * n_prefix
+    assert cached_stats["prefill_tokens"] == plain_stats["prefill_tokens"] - 2 * n_prefix
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_prefix_cache_skips_mismatches_and_evicts_least_recently_used(model):
+    tokenizer = CharTokenizer()
+    cache = PrefixKVCache(model, tokenizer)
+    prompt = tokenizer("sys A user").input_ids
+    assert cache.lookup("sys B", prompt) is None  # not a prefix of the prompt
+    assert cache.lookup("sys A user", prompt) is None  # no prompt token left to predict from
+    assert cache.stats()["skipped"] == 2 and cache.stats()["entries"] == 0
+
+    past, n_prefix = cache.lookup("sys A", prompt)
+    assert n_prefix == 6
+    snapshot = [key.clone() for key, _ in past]
+    one_entry = cache.stats()["bytes"]
+
+    cache.max_bytes = 2 * one_entry
+    for name in "BAC":  # A is used again after B, so B is the one evicted
+        cache.lookup("sys " + name, tokenizer("sys %s user" % name).input_ids)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 2 * one_entry
+    assert list(cache._entries) == ["sys A", "sys C"]
+    assert all(torch.equal(key, before) for (key, _), before in zip(cache.lookup("sys A", prompt)[0], snapshot))
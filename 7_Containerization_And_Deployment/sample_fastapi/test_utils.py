@@ -0,0 +1,53 @@
+"""Sentence chunking, the streamed audio encodings and SSE frames."""
+
+import io
+import json
+
+import numpy as np
+import pytest
+
+soundfile = pytest.importorskip("soundfile")
+
+import utils
+
+SAMPLE_RATE = 24000
+
+
+def _tone(seconds, frequency=440.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def test_split_sentences_keeps_chunks_short():
+    text = "One. Two! Three? " + "x" * 150 + ". Four."
+    assert utils.split_sentences(text, max_chars=20) == ["One. Two! Three?", "x" * 150 + ".", "Four."]
+    assert utils.split_sentences("  ") == []
+
+
+@pytest.mark.parametrize("audio_format", list(utils.AudioStreamEncoder.MEDIA_TYPES))
+def test_streamed_audio_decodes_back(audio_format):
+    chunks = [_tone(0.5), _tone(0.25, 660.0), _tone(0.5)]
+    encoder = utils.AudioStreamEncoder(SAMPLE_RATE, audio_format)
+    pieces = [encoder.encode(chunk) for chunk in chunks] + [encoder.close()]
+    assert pieces[0]  # the first chunk is playable on its own, with its header
+
+    audio, sample_rate = soundfile.read(io.BytesIO(b"".join(pieces)), dtype="float32")
+    expected = np.concatenate(chunks)
+    assert sample_rate == SAMPLE_RATE and len(audio) == len(expected)
+    if audio_format == "wav":
+        assert np.abs(audio - expected).max() < 1e-4
+    else:  # lossy: compare the energy, not the samples
+        assert abs(np.sqrt(np.mean(audio ** 2)) - np.sqrt(np.mean(expected ** 2))) < 0.05
+
+
+def test_unknown_format_is_refused():
+    with pytest.raises(ValueError):
+        utils.AudioStreamEncoder(SAMPLE_RATE, "flac")
+    assert utils.AudioStreamEncoder(SAMPLE_RATE).close() == utils.AudioStreamEncoder(SAMPLE_RATE)._wav_header()
+
+
+def test_sse_stream_ends_with_timings():
+    frames = list(utils.sse_token_stream(iter(["Arr", ", matey"])))
+    assert frames[:2] == ['data: {"token": "Arr"}\n\n', 'data: {"token": ", matey"}\n\n']
+    event, data = frames[2].split("\n")[:2]
+    assert event == "event: done" and json.loads(data[len("data: "):])["chunks"] == 2
@@ -0,0 +1,317 @@
+"""
+Continuous (token-step) batching for the local TinyLlama text-generation model.
+
+`self.pipe(prompt, ...)` generates one prompt at a time, so N concurrent
+/text_gen requests are served one after another. `ContinuousBatcher` instead
+keeps a running batch of sequences and advances all of them by one token per
+forward pass:
+
+- a new request is prefilled on its own and joins the batch at the next step,
+- a sequence that hits EOS or its token budget leaves the batch right away,
+- a request whose future is cancelled (the client went away) is dropped
+  before the next step instead of being decoded to the end,
+- every sequence keeps its own KV cache; at each step the caches are
+  left-padded to the longest one and the padding is masked out.
+
+With a `PrefixKVCache`, requests that name a known prefix (the system
+message) start prefill from its cached keys/values.
+"""
+
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+import torch
+import torch.nn.functional as F
+from transformers import DynamicCache
+
+
+def _legacy_cache(past_key_values):
+    """Return the KV cache as a tuple of per-layer (key, value) tensors."""
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+
+class GenerationRequest:
+
+    def __init__(self, prompt, max_new_tokens, temperature, top_k, top_p, do_sample, prefix=None):
+        self.prompt = prompt
+        self.prefix = prefix
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+        self.do_sample = do_sample
+
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.generated = []
+        self.past = None     # tuple of (key, value) per layer, shape (1, heads, length, head_dim)
+        self.length = 0      # number of positions in `past`
+
+
+class ContinuousBatcher:
+
+    def __init__(self, model, tokenizer, max_batch_size=8, max_new_tokens=256, metrics_window_s=30.0, prefix_cache=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = prefix_cache
+        self.max_batch_size = max_batch_size
+        self.max_new_tokens = max_new_tokens
+        self.device = next(model.parameters()).device
+        self.eos_token_id = tokenizer.eos_token_id
+
+        self._pending = queue.Queue()
+        self._active = []
+        self._thread = None
+        self._running = False
+
+        # metrics
+        self.metrics_window_s = metrics_window_s
+        self._recent_steps = collections.deque()  # (timestamp, tokens generated in that step)
+        self.decode_steps = 0
+        self.occupied_slots = 0
+        self.generated_tokens = 0
+        self.completed_requests = 0
+        self.failed_requests = 0
+        self.cancelled_requests = 0
+        self.prefill_tokens = 0
+        self.prefill_tokens_saved = 0
+
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._loop, name="continuous-batcher", daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for request in self._active:
+            self._fail(request, RuntimeError("ContinuousBatcher stopped"))
+        self._active = []
+        while not self._pending.empty():
+            self._fail(self._pending.get_nowait(), RuntimeError("ContinuousBatcher stopped"))
+
+
+    def submit(self, prompt, max_new_tokens=None, temperature=0.7, top_k=50, top_p=0.95, do_sample=True, prefix=None) -> Future:
+        """Queue an already chat-formatted prompt. The returned future resolves to the generated text.
+
+        `prefix` is the leading part of `prompt` (e.g. the formatted system message) whose KV cache
+        may be reused from the prefix cache.
+        """
+        request = GenerationRequest(
+            prompt,
+            max_new_tokens or self.max_new_tokens,
+            temperature,
+            top_k,
+            top_p,
+            do_sample,
+            prefix,
+        )
+        self._pending.put(request)
+        return request.future
+
+
+    def _loop(self):
+        while self._running:
+            self._admit()
+            self._drop_cancelled()
+            if not self._active:
+                continue
+            try:
+                self._step()
+            except Exception as e:
+                for request in self._active:
+                    self._fail(request, e)
+                self._active = []
+
+
+    def _drop_cancelled(self):
+        """Free the slots of requests whose caller went away (e.g. the client disconnected)."""
+        active = [request for request in self._active if not request.future.cancelled()]
+        self.cancelled_requests += len(self._active) - len(active)
+        self._active = active
+
+
+    def _fail(self, request, error):
+        # the client can cancel at any moment, so try instead of checking done() first
+        try:
+            request.future.set_exception(error)
+            self.failed_requests += 1
+        except InvalidStateError:
+            self.cancelled_requests += 1
+
+
+    def _admit(self):
+        """Prefill waiting requests into free slots; block briefly when there is nothing to decode."""
+        while len(self._active) < self.max_batch_size:
+            try:
+                request = self._pending.get(timeout=0.05) if not self._active else self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if request.future.cancelled():
+                self.cancelled_requests += 1
+                continue
+            try:
+                self._prefill(request)
+            except Exception as e:
+                self._fail(request, e)
+
+
+    @torch.no_grad()
+    def _prefill(self, request):
+        input_ids = self.tokenizer(request.prompt, return_tensors="pt").input_ids.to(self.device)
+
+        cached = None
+        if request.prefix and self.prefix_cache is not None:
+            cached = self.prefix_cache.lookup(request.prefix, input_ids)
+
+        if cached is None:
+            outputs = self.model(input_ids=input_ids, past_key_values=DynamicCache(), use_cache=True)
+            self.prefill_tokens += input_ids.shape[1]
+        else:
+            # DynamicCache.update() concatenates into new tensors, so the cached prefix is never modified
+            prefix_past, n_prefix = cached
+            outputs = self.model(
+                input_ids=input_ids[:, n_prefix:],
+                past_key_values=DynamicCache.from_legacy_cache(prefix_past),
+                use_cache=True,
+            )
+            self.prefill_tokens += input_ids.shape[1] - n_prefix
+            self.prefill_tokens_saved += n_prefix
+
+        request.past = _legacy_cache(outputs.past_key_values)
+        request.length = input_ids.shape[1]
+        token = self._sample(outputs.logits[:, -1, :], [request])[0]
+        self._record_step(1)
+        if not self._append(request, token):
+            self._active.append(request)
+
+
+    @torch.no_grad()
+    def _step(self):
+        requests = self._active
+        batch_size = len(requests)
+        max_len = max(request.length for request in requests)
+
+        # Left-pad every cache to the longest one; padded slots are masked out below
+        past = []
+        for layer in range(len(requests[0].past)):
+            keys, values = [], []
+            for request in requests:
+                key, value = request.past[layer]
+                pad = max_len - request.length
+                if pad:
+                    key = F.pad(key, (0, 0, pad, 0))
+                    value = F.pad(value, (0, 0, pad, 0))
+                keys.append(key)
+                values.append(value)
+            past.append((torch.cat(keys), torch.cat(values)))
+
+        attention_mask = torch.zeros((batch_size, max_len + 1), dtype=torch.long, device=self.device)
+        for i, request in enumerate(requests):
+            attention_mask[i, max_len - request.length:] = 1
+        position_ids = torch.tensor([[request.length] for request in requests], device=self.device)
+        input_ids = torch.tensor([[request.generated[-1]] for request in requests], device=self.device)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=DynamicCache.from_legacy_cache(tuple(past)),
+            use_cache=True,
+        )
+        new_past = _legacy_cache(outputs.past_key_values)
+
+        # Strip the padding again so each sequence carries only its own positions
+        for i, request in enumerate(requests):
+            start = max_len - request.length
+            request.past = tuple((key[i:i + 1, :, start:], value[i:i + 1, :, start:]) for key, value in new_past)
+            request.length += 1
+
+        tokens = self._sample(outputs.logits[:, -1, :], requests)
+        self.decode_steps += 1
+        self.occupied_slots += batch_size
+        self._record_step(batch_size)
+
+        self._active = [request for request, token in zip(requests, tokens) if not self._append(request, token)]
+
+
+    def _append(self, request, token):
+        """Add a token to the request; finish it and return True when it is done."""
+        request.generated.append(token)
+        self.generated_tokens += 1
+        if token != self.eos_token_id and len(request.generated) < request.max_new_tokens:
+            return False
+
+        text = self.tokenizer.decode(request.generated, skip_special_tokens=True).strip()
+        request.past = None
+        try:
+            request.future.set_result(text)
+            self.completed_requests += 1
+        except InvalidStateError:  # cancelled during this step
+            self.cancelled_requests += 1
+        return True
+
+
+    def _sample(self, logits, requests):
+        tokens = []
+        for row, request in zip(logits.float(), requests):
+            if not request.do_sample or request.temperature <= 0:
+                tokens.append(int(row.argmax()))
+                continue
+
+            row = row / request.temperature
+            if request.top_k:
+                kth_value = torch.topk(row, min(request.top_k, row.numel())).values[-1]
+                row = row.masked_fill(row < kth_value, float("-inf"))
+            if request.top_p < 1.0:
+                sorted_logits, sorted_idx = torch.sort(row, descending=True)
+                sorted_probs = torch.softmax(sorted_logits, dim=-1)
+                remove = torch.cumsum(sorted_probs, dim=-1) - sorted_probs > request.top_p
+                sorted_logits = sorted_logits.masked_fill(remove, float("-inf"))
+                row = torch.full_like(row, float("-inf")).scatter(0, sorted_idx, sorted_logits)
+
+            tokens.append(int(torch.multinomial(torch.softmax(row, dim=-1), 1)))
+        return tokens
+
+
+    def _record_step(self, n_tokens):
+        now = time.perf_counter()
+        self._recent_steps.append((now, n_tokens))
+        while self._recent_steps and now - self._recent_steps[0][0] > self.metrics_window_s:
+            self._recent_steps.popleft()
+
+
+    def stats(self):
+        steps = list(self._recent_steps)
+        tokens_per_sec = 0.0
+        if len(steps) > 1:
+            elapsed = steps[-1][0] - steps[0][0]
+            if elapsed > 0:
+                tokens_per_sec = sum(n for _, n in steps[1:]) / elapsed
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "active_sequences": len(self._active),
+            "queue_depth": self._pending.qsize(),
+            "completed_requests": self.completed_requests,
+            "failed_requests": self.failed_requests,
+            "cancelled_requests": self.cancelled_requests,
+            "generated_tokens": self.generated_tokens,
+            "decode_steps": self.decode_steps,
+            "mean_batch_occupancy": round(self.occupied_slots / (self.decode_steps * self.max_batch_size), 3)
+                                    if self.decode_steps else 0.0,
+            "tokens_per_sec": round(tokens_per_sec, 2),
+            "prefill_tokens": self.prefill_tokens,
+            "prefill_tokens_saved": self.prefill_tokens_saved,
+            "prefix_cache": self.prefix_cache.stats() if self.prefix_cache is not None else None,
+        }
@@ -1,10 +1,133 @@
 
 import soundfile
 import numpy as np
-from io import BytesIO
+import json
+import re
+import struct
+import time
+from io import BytesIO, RawIOBase
 def audio_array_to_buffer(audio_array : np.array,sample_rate: int) -> BytesIO:
     buffer = BytesIO()
-    soundfile.write("test.wav",audio_array, sample_rate,format="WAV",subtype="PCM_16")
     soundfile.write(buffer,audio_array, sample_rate,format="WAV",subtype="PCM_16")
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
+
+
+def split_sentences(text: str, max_chars: int = 200) -> list[str]:
+    """Split a prompt into sentence chunks of at most ~max_chars, so each one can be synthesized on its own."""
+    chunks = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?;])\s+", text.strip()):
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class _StreamSink(RawIOBase):
+    """Writable in-memory file for soundfile; `take()` returns what was written since the last call."""
+
+    def __init__(self):
+        self._buffer = BytesIO()
+        self._sent = 0
+
+    def readable(self): return True
+    def writable(self): return True
+    def seekable(self): return True
+    def read(self, size=-1): return self._buffer.read(size)
+    def write(self, data): return self._buffer.write(data)
+    def seek(self, offset, whence=0): return self._buffer.seek(offset, whence)
+    def tell(self): return self._buffer.tell()
+
+    def take(self) -> bytes:
+        data = self._buffer.getbuffer()[self._sent:].tobytes()
+        self._sent += len(data)
+        return data
+
+
+class AudioStreamEncoder:
+    """Encode audio chunk by chunk into one continuous WAV / Ogg-Opus byte stream, without touching disk.
+
+    The total length is unknown while streaming: the WAV header says "until end of stream", and Ogg pages
+    need no length. FLAC is not offered: its STREAMINFO header (sample count, MD5) can only be completed
+    after the last sample, and libsndfile / soundfile cannot read a FLAC stream whose header was sent without it.
+    """
+
+    MEDIA_TYPES = {"wav": "audio/wav", "ogg": "audio/ogg"}
+
+    def __init__(self, sample_rate: int, audio_format: str = "wav"):
+        self.sample_rate = sample_rate
+        self.audio_format = audio_format
+        self._header_sent = False
+        self._sink = None
+        self._file = None
+        if audio_format == "ogg":
+            self._sink = _StreamSink()
+            self._file = soundfile.SoundFile(self._sink, mode="w", samplerate=sample_rate, channels=1,
+                                             format="OGG", subtype="OPUS")
+        elif audio_format != "wav":
+            raise ValueError(f"Unknown audio format: {audio_format}")
+
+    @property
+    def media_type(self) -> str:
+        return self.MEDIA_TYPES[self.audio_format]
+
+    def _wav_header(self) -> bytes:
+        unknown = 0xFFFFFFFF
+        byte_rate = self.sample_rate * 2
+        return (b"RIFF" + struct.pack("<I", unknown) + b"WAVE"
+                + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, self.sample_rate, byte_rate, 2, 16)
+                + b"data" + struct.pack("<I", unknown))
+
+    def encode(self, audio_array: np.ndarray) -> bytes:
+        """Bytes to send for one synthesized chunk (the first call also carries the header)."""
+        audio_array = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+        if self._file is None:
+            pcm = (np.clip(audio_array, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+            header = b"" if self._header_sent else self._wav_header()
+            self._header_sent = True
+            return header + pcm
+
+        self._file.write(audio_array)
+        self._file.flush()
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        """Trailing bytes (the last Ogg page)."""
+        if self._file is None:
+            return b"" if self._header_sent else self._wav_header()
+        self._file.close()
+        return self._sink.take()
+
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    """Format one Server-Sent Event frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def sse_token_stream(tokens):
+    """Wrap a text-piece iterator as SSE frames, ending with a `done` event that carries timings."""
+    start_time = time.perf_counter()
+    first_token_ms = None
+    n_chunks = 0
+    for text in tokens:
+        if first_token_ms is None:
+            first_token_ms = int((time.perf_counter() - start_time) * 1000)
+        n_chunks += 1
+        yield sse_event({"token": text})
+
+    yield sse_event(
+        {
+            "time_to_first_token_ms": first_token_ms,
+            "execution_time": int((time.perf_counter() - start_time) * 1000),
+            "chunks": n_chunks,
+        },
+        event="done",
+    )
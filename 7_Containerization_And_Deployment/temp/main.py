@@ -1,9 +1,16 @@
 from fastapi import FastAPI,Request, Body
+from fastapi.responses import Response
 import uvicorn
+import os
+import sys
 import time
 from models.schemas import image_predRequestModel, textRequestModel, textResponseModel
 from contextlib import asynccontextmanager
 from model_work import CatAndDogModel,TextGenerationModel
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "8_final_proj"))
+from serving.executor import StageExecutor
+from serving.metrics import METRICS_CONTENT_TYPE, MetricsMiddleware, model_load, render_metrics, stage, timed_run
 
 
 ml_models = {}
@@ -11,7 +18,8 @@ ml_models = {}
 async def lifespan(app: FastAPI):
 
     catAndDogModel = CatAndDogModel()
-    catAndDogModel.load_model()
+    with model_load("catAndDogModel"):
+        catAndDogModel.load_model()
 
 
     textGenModel = TextGenerationModel()
@@ -19,14 +27,20 @@ async def lifespan(app: FastAPI):
     ml_models["catAndDogModel"] = catAndDogModel
     ml_models["textGenModel"] = textGenModel
 
+    # blocking model / client calls run here instead of on the event loop
+    ml_models["stages"] = StageExecutor.from_env()
+
     
     yield
+    ml_models["stages"].shutdown(wait=False)
     ml_models.clear()
 
 
 
 
 app = FastAPI(lifespan=lifespan)
+# in-flight requests and per-route latency for /metrics
+app.add_middleware(MetricsMiddleware)
 
 
 
@@ -35,6 +49,16 @@ def home():
     return {"message": "Hello, World!"}
 
 
+@app.get("/stages/stats")
+def stages_stats():
+    return ml_models["stages"].stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.post("/predict")
 def predict(request: Request, body: image_predRequestModel = Body(...)) -> image_predRequestModel:
     
@@ -42,8 +66,10 @@ def predict(request: Request, body: image_predRequestModel = Body(...)) -> image
     request_data = body
     catAndDogModel = ml_models["catAndDogModel"]
 
-    img_array = catAndDogModel.preprocess_image(request_data.image)
-    class_name, prediction = catAndDogModel.predict(img_array)
+    with stage("preprocess"):
+        img_array = catAndDogModel.preprocess_image(request_data.image)
+    with stage("inference"):
+        class_name, prediction = catAndDogModel.predict(img_array)
     str_output = f"Prediction: {class_name}, Confidence: {prediction:.2f}"
     request_data.class_name = str_output
     
@@ -56,9 +82,10 @@ def predict(request: Request, body: image_predRequestModel = Body(...)) -> image
 @app.post("/text_generation")
 async def generate_text(request: Request, body: textRequestModel = Body(...)) -> textResponseModel:
 
-    start_time = time.time()
-    response_text =  ml_models["textGenModel"].generate_text(body.prompt)
-    execution_time = start_time - time.time()
+    start_time = time.perf_counter()
+    response_text = await timed_run("inference", ml_models["stages"].inference, ml_models["textGenModel"].generate_text,
+                                    body.prompt)
+    execution_time = time.perf_counter() - start_time
     print(f"Response: {response_text}")
     print(f"Execution time: {execution_time:.2f} seconds")
 
@@ -55,7 +55,8 @@ class CatAndDogModel:
 class TextGenerationModel:
 
     def __init__(self):
-        self.client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+        # LM Studio by default; OPENAI_BASE_URL points it at another server (e.g. serving/stub_openai.py)
+        self.client = OpenAI(base_url=os.getenv("OPENAI_BASE_URL", "http://localhost:1234/v1"), api_key="lm-studio")
 
     
     def generate_text(self, prompt):
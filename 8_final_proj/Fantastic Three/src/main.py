@@ -2,6 +2,7 @@
 
 import os
 import io
+import sys
 import numpy as np
 import cv2
 import base64
@@ -10,7 +11,12 @@ from PIL import Image
 from typing import Dict, Any, Literal
 from contextlib import asynccontextmanager
 
-from model_load import load_segmentation_model, segmentation_model
+from model_load import load_segmentation_model, segmentation_model, MODEL_PATH
+
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.cache import ResponseCache, make_key, model_file_version
+from serving.contours import labelme_document, mask_to_shapes
 
 # --- CONFIGURATION ---
 IMG_SIZE = (128, 128)
@@ -20,12 +26,19 @@ COLOR_MAP = np.array([
     [255, 0, 0],     # Class 1: Red (Dog)
     [0, 0, 255]      # Class 2: Blue (Cat)
 ], dtype=np.uint8)
+# LabelMe label names for mask_type=labelme (names from labels.txt)
+LABELS = {1: "dog", 2: "cat"}
+
+# Repeat uploads of the same photo are answered from here (RESPONSE_CACHE_MB / RESPONSE_CACHE_DIR)
+response_cache = ResponseCache.from_env()
+model_version = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global segmentation_model
+    global segmentation_model, model_version
     try:
         segmentation_model = load_segmentation_model()
+        model_version = model_file_version(MODEL_PATH)
         yield
     except (FileNotFoundError, RuntimeError) as e:
         print(f"Application failed to start due to model loading error: {e}")
@@ -45,6 +58,30 @@ def mask_to_rgb(mask: np.ndarray, color_map: np.ndarray) -> np.ndarray:
         rgb_mask[mask == class_idx] = color
     return rgb_mask
 
+def predict_class_mask(original_image: Image.Image) -> np.ndarray:
+    """Class mask at the model resolution (IMG_SIZE)"""
+    input_image = original_image.resize(IMG_SIZE)
+    input_image = np.array(input_image, dtype=np.float32) / 255.0
+    input_image = np.expand_dims(input_image, axis=0)
+
+    # Use verbose=0 to suppress the progress bar
+    predicted_masks = segmentation_model.predict(input_image, verbose=0)
+    return np.argmax(predicted_masks, axis=-1)[0]
+
+async def predict_polygons(image_bytes: bytes, filename: str, tolerance: float) -> Dict[str, Any]:
+    """LabelMe JSON with the per-class polygons, traced at the model resolution and scaled to the upload"""
+    if segmentation_model is None:
+        raise HTTPException(status_code=500, detail="Segmentation model not loaded.")
+
+    try:
+        original_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        shapes = mask_to_shapes(predict_class_mask(original_image), LABELS, tolerance, image_size=original_image.size)
+        return labelme_document(shapes, original_image.size, filename)
+
+    except Exception as e:
+        print(f"Error during segmentation prediction: {e}")
+        raise HTTPException(status_code=500, detail=f"Image processing failed: {e}")
+
 async def predict_segmentation(image_bytes: bytes) -> Dict[str, bytes]:
     if segmentation_model is None:
         raise HTTPException(status_code=500, detail="Segmentation model not loaded.")
@@ -52,14 +89,8 @@ async def predict_segmentation(image_bytes: bytes) -> Dict[str, bytes]:
     try:
         original_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
         original_image_np = np.array(original_image)
-        
-        input_image = original_image.resize(IMG_SIZE)
-        input_image = np.array(input_image, dtype=np.float32) / 255.0
-        input_image = np.expand_dims(input_image, axis=0)
-        
-        # Use verbose=0 to suppress the progress bar
-        predicted_masks = segmentation_model.predict(input_image, verbose=0)
-        pred_mask_encoded = np.argmax(predicted_masks, axis=-1)[0]
+
+        pred_mask_encoded = predict_class_mask(original_image)
         
         color_mask = mask_to_rgb(pred_mask_encoded, COLOR_MAP)
         color_mask_resized = cv2.resize(color_mask, (original_image_np.shape[1], original_image_np.shape[0]), interpolation=cv2.INTER_NEAREST)
@@ -88,13 +119,16 @@ async def predict_segmentation(image_bytes: bytes) -> Dict[str, bytes]:
 @app.post("/predict-mask", summary="Get a specific mask type", response_description="Returns the requested mask type as a PNG image")
 async def get_mask(
     file: UploadFile = File(...),
-    mask_type: Literal["overlay_mask", "color_mask"] = Query("overlay_mask", description="Specify the type of mask to return.")
+    mask_type: Literal["overlay_mask", "color_mask", "labelme"] = Query("overlay_mask", description="Specify the type of mask to return."),
+    tolerance: float = Query(1.0, ge=0, description="Polygon simplification tolerance in image pixels (labelme only).")
 ):
     """
     **Upload an image** and get either the **overlay mask** or the **color mask**.
     
     - Use the `mask_type` query parameter to choose which mask to receive.
     - If no parameter is provided, it defaults to the `overlay_mask`.
+    - `mask_type=labelme` returns the dog / cat outlines as LabelMe JSON polygons instead of a PNG,
+      simplified to `tolerance` pixels; the file can be opened in labelme or used as a pre-annotation.
     
     **Expects**: An image file (`.jpg`, `.png`, etc.)
     **Returns**: A PNG image with the requested segmentation result.
@@ -106,16 +140,34 @@ async def get_mask(
 
     try:
         image_data = await file.read()
-        segmented_images = await predict_segmentation(image_data)
-        
+
+        if mask_type == "labelme":
+            cache_key = make_key(image_data, model_version, mask_type=mask_type, tolerance=tolerance, filename=file.filename)
+            return await response_cache.get_or_compute(
+                cache_key, lambda: predict_polygons(image_data, file.filename, tolerance)
+            )
+
+        async def compute_mask() -> bytes:
+            segmented_images = await predict_segmentation(image_data)
+            return segmented_images[mask_type]
+
+        # Same bytes + same model + same mask_type -> same PNG, so identical uploads are computed once
+        cache_key = make_key(image_data, model_version, mask_type=mask_type)
+        mask_png = await response_cache.get_or_compute(cache_key, compute_mask)
+
         # Return the requested mask based on the query parameter
-        return Response(content=segmented_images[mask_type], media_type="image/png")
+        return Response(content=mask_png, media_type="image/png")
     
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@app.get("/cache/stats", tags=["Root"])
+async def cache_stats() -> Dict[str, Any]:
+    """Hit / miss / eviction counters of the response cache."""
+    return response_cache.stats()
+
 # Get Method 
 @app.get("/", tags=["Root"])
 async def read_root() -> Dict[str, str]:
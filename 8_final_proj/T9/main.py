@@ -1,35 +1,96 @@
-from fastapi import FastAPI, Response, UploadFile, File
+from fastapi import Depends, FastAPI, HTTPException, Response, UploadFile, File
 from fastapi.responses import RedirectResponse
 import uvicorn
 import numpy as np
 import cv2
+import os
+import sys
 from contextlib import asynccontextmanager
 from model_work import ImageModel
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from serving.batching import MicroBatcher
+from serving.executor import StageExecutor
+from serving.readiness import Readiness, add_health_routes, load_concurrently, warm_up, warmup_batch_sizes
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+
 ml_models = {}
+readiness = Readiness()
 
-@asynccontextmanager
-async def startup_lifespan(app: FastAPI):
+def load_image_model():
     model = ImageModel()
-    model.load_model()
+    if not model.load_model():
+        raise RuntimeError(f"Model could not be loaded from {model.model_path}")
+    return model
+
+async def start_serving(stages):
+    with readiness.phase("loading"):
+        model = (await load_concurrently({"imageModel": load_image_model}, readiness))["imageModel"]
     ml_models["imageModel"] = model
+
+    # Build the graph for every batch size the batcher can send before reporting ready
+    with readiness.phase("warming"):
+        readiness.record_warmup("imageModel", await stages.inference.run(
+            warm_up, model.predict_masks, (model.IMG_HEIGHT, model.IMG_WIDTH, 3),
+            warmup_batch_sizes(BATCH_MAX_SIZE), np.uint8 if model.uint8_io else np.float32,
+        ))
+
+    # Concurrent /predict calls share one forward pass per batching window
+    batcher = MicroBatcher(model.predict_masks, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                           executor=stages.inference)
+    await batcher.start()
+    ml_models["batcher"] = batcher
+    readiness.mark_ready()
+
+@asynccontextmanager
+async def startup_lifespan(app: FastAPI):
+    # Load and warm up in the background so /health/live answers at once; a failed load shows up in /health/ready
+    # Decode, inference and encode each get their own thread pool so none of them runs on the event loop
+    ml_models["stages"] = StageExecutor.from_env()
+    readiness.start(start_serving(ml_models["stages"]))
     yield
+    await readiness.stop()
+    batcher = ml_models.get("batcher")
+    if batcher is not None:
+        await batcher.stop()
+    stages = ml_models.get("stages")
+    if stages is not None:
+        stages.shutdown(wait=False)
     ml_models.clear()
 
 app = FastAPI(lifespan=startup_lifespan)
+# /health/live, /health/ready (200 once the model is loaded and warm) and /health
+add_health_routes(app, readiness)
 
 @app.get("/")
 def home():
     return RedirectResponse(url="/docs")
 
-@app.post("/predict", responses={200: {"content": {"image/png": {}}}}, response_class=Response)
+@app.get("/batching/stats", dependencies=[Depends(readiness.require)])
+def batching_stats():
+    return ml_models["batcher"].stats()
+
+def encode_overlay(model, pred_mask, img):
+    return cv2.imencode('.png', model.overlay(pred_mask, img))
+
+@app.post("/predict", dependencies=[Depends(readiness.require)],
+          responses={200: {"content": {"image/png": {}}}}, response_class=Response)
 async def predict(file: UploadFile = File(...)):
     image_bytes = await file.read()
-    overlayed_img = ml_models["imageModel"].predict_and_overlay(img=image_bytes)
-    success, buffer = cv2.imencode('.png', overlayed_img)
+    model = ml_models["imageModel"]
+    stages = ml_models["stages"]
+    try:
+        img_normalized, img = await stages.decode.run(model.preprocess, image_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pred_mask = await ml_models["batcher"].submit(img_normalized)
+    success, buffer = await stages.encode.run(encode_overlay, model, pred_mask, img)
     if not success:
         return Response(content=b"", media_type="image/png", status_code=500)
     return Response(content=buffer.tobytes(), media_type="image/png")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,8 +1,13 @@
 import tensorflow as tf
-from tensorflow.keras.models import load_model
 import numpy as np
 import cv2
 import os
+import sys
+
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from serving.backends import load_model
+from serving.ingest import decode_image_cv2
 
 COLOR_MAP = np.array([
     [0, 0, 0],       # Class 0: background
@@ -12,8 +17,10 @@ COLOR_MAP = np.array([
 
 class ImageModel():
     def __init__(self):
-        # Docker path (model copied to /app)
-        self.model_path = os.path.join(os.getcwd(), "cat_dog_segmentation_unet.keras")
+        # Docker path (model copied to /app); MODEL_PATH can point at a model exported
+        # with serving/export_model.py --no-antialias (uint8 in, mask out); MODEL_BACKEND=tflite
+        # loads the INT8 conversion from serving/quantize.py instead
+        self.model_path = os.getenv("MODEL_PATH", os.path.join(os.getcwd(), "cat_dog_segmentation_unet.keras"))
         print(f"[DEBUG] Model path set to: {self.model_path}")
         self.IMG_HEIGHT = 128
         self.IMG_WIDTH = 128
@@ -30,17 +37,39 @@ class ImageModel():
             return False
         return True
 
-    def model_predict(self, img):
-        if self.model is None:
-            raise ValueError("Model not loaded")
+    @property
+    def uint8_io(self):
+        # resizing, rescaling and argmax are part of an exported model's graph
+        return self.model is not None and self.model.inputs[0].dtype == "uint8"
 
-        # If img is bytes (uploaded), decode to numpy first
+    def preprocess(self, img):
+        # If img is bytes (uploaded), decode to numpy first; the overlay is 128x128, so
+        # JPEGs are decoded at a reduced scale instead of full resolution
         if isinstance(img, (bytes, bytearray)):
-            img_array = np.frombuffer(img, np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+            img = decode_image_cv2(img, target_size=(self.IMG_WIDTH, self.IMG_HEIGHT))
+            if img is None:
+                raise ValueError("Could not decode the uploaded image")
 
         img_resized = cv2.resize(img, (self.IMG_WIDTH, self.IMG_HEIGHT))
+        if self.uint8_io:
+            return img_resized, img
         img_normalized = img_resized.astype(np.float32) / 255.0
+        return img_normalized, img
+
+    def predict_masks(self, img_batch):
+        # (N, H, W, 3) batch in, (N, H, W) class masks out
+        if self.model is None:
+            raise ValueError("Model not loaded")
+        predicted_masks = self.model.predict(img_batch, verbose=0)
+        if self.uint8_io:
+            return predicted_masks
+        return np.argmax(predicted_masks, axis=-1)
+
+    def model_predict(self, img):
+        if self.model is None:
+            raise ValueError("Model not loaded")
+
+        img_normalized, img = self.preprocess(img)
         img_batch = np.expand_dims(img_normalized, axis=0)
 
         predicted_masks = self.model.predict(img_batch)
@@ -52,14 +81,16 @@ class ImageModel():
             rgb_mask[mask == class_idx] = color
         return rgb_mask
 
-    def predict_and_overlay(self, img):
-        predicted_masks, img_resized = self.model_predict(img)
-        pred_mask = np.argmax(predicted_masks, axis=-1)[0]
-
+    def overlay(self, pred_mask, img_resized):
         color_mask = self.mask_to_rgb(pred_mask, COLOR_MAP)
 
         # Ensure img_resized is same shape as mask
         img_resized_rgb = cv2.resize(img_resized, (color_mask.shape[1], color_mask.shape[0]))
 
         overlay = cv2.addWeighted(img_resized_rgb.astype(np.uint8), 0.6, color_mask, 0.4, 0)
-        return overlay
\ No newline at end of file
+        return overlay
+
+    def predict_and_overlay(self, img):
+        img_input, img = self.preprocess(img)
+        pred_mask = self.predict_masks(np.expand_dims(img_input, axis=0))[0]
+        return self.overlay(pred_mask, img)
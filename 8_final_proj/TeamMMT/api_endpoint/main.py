@@ -5,6 +5,8 @@ uploaded images to return overlay visualizations.
 """
 
 import io
+import os
+import sys
 from contextlib import asynccontextmanager
 
 import cv2
@@ -12,6 +14,10 @@ from fastapi import FastAPI, File, UploadFile
 from fastapi.responses import StreamingResponse
 from .model_work import CatDogModel
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.executor import StageExecutor
+
 seg_model = {}
 
 
@@ -22,7 +28,9 @@ async def startup_lifespan(app: FastAPI):
     semantic_seg_model = CatDogModel()
     semantic_seg_model.load_model("cats_and_dogs_final_model.keras")
     seg_model["semantic_seg_model"] = semantic_seg_model
+    seg_model["stages"] = StageExecutor.from_env()
     yield
+    seg_model["stages"].shutdown(wait=False)
     seg_model.clear()
 
 
@@ -45,13 +53,25 @@ async def overlay_pred(file: UploadFile = File(...)) -> StreamingResponse:
         return {"error": "Invalid file type"}
     file_bytes = await file.read()  # read the uploaded file
 
-    overlay_image = seg_model["semantic_seg_model"].predict_and_visualize_color(
-        file_bytes
+    model = seg_model["semantic_seg_model"]
+    stages = seg_model["stages"]
+
+    # Decode, predict and encode in their own pools so the event loop stays responsive
+    img, img_batch = await stages.decode.run(model.preprocess_image, file_bytes)
+    predicted_masks = await stages.inference.run(model.model.predict, img_batch)
+    overlay_image = await stages.encode.run(
+        model.visualize_color, predicted_masks, img
     )  # returns NumPy array
 
-    success, buffer = cv2.imencode(".png", overlay_image)
+    success, buffer = await stages.encode.run(cv2.imencode, ".png", overlay_image)
     if not success:
         return {"error": "Failed to encode image"}
 
     # Return PNG as StreamingResponse
-    return StreamingResponse(io.BytesIO(buffer.tobytes()), media_type="image/png")
\ No newline at end of file
+    return StreamingResponse(io.BytesIO(buffer.tobytes()), media_type="image/png")
+
+
+@app.get("/stages/stats")
+def stages_stats():
+    """Decode/inference/encode pool sizes and saturation, for sizing workers per core count."""
+    return seg_model["stages"].stats()
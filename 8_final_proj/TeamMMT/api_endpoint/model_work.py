@@ -1,10 +1,16 @@
 import io
+import os
+import sys
 
-import cv2
 import numpy as np
 import tensorflow as tf
 from PIL import Image
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.ingest import decode_image_pil
+from serving.postprocess import colorize, make_palette, overlay
+
 
 class CatDogModel:
     """Model Loading Class for Semantic Segmentation on Cat and Dog"""
@@ -23,6 +29,7 @@ class CatDogModel:
             ],
             dtype=np.uint8,
         )
+        self.palette = make_palette(self.color_map)
 
     @property
     def model(self):
@@ -73,14 +80,30 @@ class CatDogModel:
         """
         if image_path is not None:
             self.image_path = image_path
-            image = Image.open(io.BytesIO(self.image_path))
-            image = image.resize((128, 128))
-            image_array = np.array(image) / 255.0
-            img_batch = tf.expand_dims(image_array, axis=0)
+            image, img_batch = self.preprocess_image(image_path)
             predicted_masks = self.__model.predict(img_batch)
             return predicted_masks, image
         return None, None
 
+    def preprocess_image(self, image_bytes):
+        """
+        Decode raw image bytes and build the model input batch.
+
+        Args:
+            image_bytes (bytes): Raw image bytes (e.g., from an uploaded file).
+
+        Returns:
+            tuple:
+                - image (PIL.Image.Image): The input image resized to 128x128.
+                - img_batch (tensorflow.Tensor): Normalized (1, 128, 128, 3) batch.
+        """
+        # JPEGs are decoded at a reduced scale close to 128x128 instead of full resolution
+        image = decode_image_pil(image_bytes, target_size=(128, 128))
+        image = image.resize((128, 128))
+        image_array = np.array(image) / 255.0
+        img_batch = tf.expand_dims(image_array, axis=0)
+        return image, img_batch
+
     def mask_to_rgb(self, mask):
         """
         Convert a segmentation mask into a color RGB image.
@@ -91,10 +114,7 @@ class CatDogModel:
         Returns:
             numpy.ndarray: 3D RGB mask (H, W, 3) with colors applied per class.
         """
-        rgb_mask = np.zeros((*mask.shape, 3), dtype=np.uint8)
-        for class_idx, color in enumerate(self.color_map):
-            rgb_mask[mask == class_idx] = color
-        return rgb_mask
+        return colorize(mask, self.palette)
 
     def predict_and_visualize_color(self, image_path=None, overlay_alpha=0.4):
         """
@@ -109,11 +129,20 @@ class CatDogModel:
             numpy.ndarray: RGB image with segmentation mask overlay.
         """
         predicted_masks, img = self.semantic_segmentation(image_path)
-        pred_mask = tf.argmax(predicted_masks, axis=-1)[0].numpy()
-        color_mask = self.mask_to_rgb(pred_mask)
-        input_image_numpy = np.array(img).astype(np.uint8)
+        return self.visualize_color(predicted_masks, img, overlay_alpha)
 
-        overlay = cv2.addWeighted(
-            input_image_numpy, 1 - overlay_alpha, color_mask, overlay_alpha, 0
-        )
-        return overlay
\ No newline at end of file
+    def visualize_color(self, predicted_masks, img, overlay_alpha=0.4):
+        """
+        Overlay an already predicted segmentation mask on the input image.
+
+        Args:
+            predicted_masks (numpy.ndarray): Model output of shape (1, H, W, num_classes).
+            img (PIL.Image.Image): The preprocessed input image.
+            overlay_alpha (float): Transparency factor for overlay.
+
+        Returns:
+            numpy.ndarray: RGB image with segmentation mask overlay.
+        """
+        pred_mask = np.argmax(predicted_masks[0], axis=-1)
+        overlay_image, _ = overlay(np.asarray(img), pred_mask, self.palette, overlay_alpha)
+        return overlay_image
\ No newline at end of file
@@ -1,17 +1,36 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, Query
 from fastapi.responses import StreamingResponse
 import io
+import os
+import sys
+from typing import Literal
 import cv2
 import numpy as np
 from tensorflow.keras.models import load_model
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.contours import labelme_document, mask_to_shapes
+from serving.postprocess import make_palette, overlay
+
 app = FastAPI()
 
 model = load_model("ML011_SuYee_model.h5")
 
 IMG_HEIGHT, IMG_WIDTH = 128, 128
 
-def model_predict(img_bgr):
+# Colors for each class (BGR)
+PALETTE = make_palette({
+    0: [0, 0, 0],        # background
+    1: [0, 255, 0],      # cat = green
+    2: [0, 0, 255]       # dog = red
+})
+
+# LabelMe label names, as in the labels.txt used for labelme2voc
+LABELS = {1: "cat", 2: "dog"}
+
+def predict_class_mask(img_bgr):
+    """Class mask at the model resolution (IMG_HEIGHT, IMG_WIDTH)"""
     # Resize to model input size
     img_resized = cv2.resize(img_bgr, (IMG_WIDTH, IMG_HEIGHT)) / 255.0
     img_input = np.expand_dims(img_resized, axis=0)  # add batch
@@ -25,6 +44,10 @@ def model_predict(img_bgr):
     else:
         # Multi-class: argmax
         mask = np.argmax(pred, axis=-1).astype(np.uint8)  # shape (H,W)
+    return mask
+
+def model_predict(img_bgr):
+    mask = predict_class_mask(img_bgr)
 
     # Resize mask back to original image size
     mask = cv2.resize(mask, (img_bgr.shape[1], img_bgr.shape[0]), interpolation=cv2.INTER_NEAREST)
@@ -35,21 +58,9 @@ def overlay_mask(img_bgr, mask):
     img_bgr: original image (H,W,3)
     mask: predicted mask (H,W) with class IDs
     """
-    # Define colors for each class (BGR)
-    colors = {
-        0: [0, 0, 0],        # background
-        1: [0, 255, 0],      # cat = green
-        2: [0, 0, 255]       # dog = red
-    }
-
-    # Create color mask
-    color_mask = np.zeros_like(img_bgr)
-    for class_id, color in colors.items():
-        color_mask[mask == class_id] = color
-
-    # Overlay with transparency
+    # Colorize (palette lookup) and blend with transparency in one call
     alpha = 0.5
-    overlayed = cv2.addWeighted(img_bgr, 1-alpha, color_mask, alpha, 0)
+    overlayed, _ = overlay(img_bgr, mask, PALETTE, alpha)
     return overlayed
 
 @app.get("/")
@@ -57,12 +68,22 @@ def read_root():
     return {"message": "Hello, World!"}
 
 @app.post("/segment/")
-async def segment_image(file: UploadFile = File(...)):
+async def segment_image(
+    file: UploadFile = File(...),
+    output: Literal["overlay", "labelme"] = Query("overlay", description="overlay PNG or LabelMe polygons (JSON)"),
+    tolerance: float = Query(1.0, ge=0, description="Polygon simplification tolerance in image pixels"),
+):
     # Read uploaded image
     contents = await file.read()
     nparr = np.frombuffer(contents, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
+    if output == "labelme":
+        # Trace the mask at the model resolution and scale the points to the upload
+        height, width = img.shape[:2]
+        shapes = mask_to_shapes(predict_class_mask(img), LABELS, tolerance, image_size=(width, height))
+        return labelme_document(shapes, (width, height), file.filename)
+
     # Predict mask
     mask = model_predict(img)
 
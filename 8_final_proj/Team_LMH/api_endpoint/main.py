@@ -1,95 +1,182 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 import numpy as np
 from PIL import Image
 import io
 import os
+import sys
 import base64
 
 from model_work import CatDogModel
 from models.schema import PredictionResponse
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.cache import ResponseCache, make_key, model_file_version
+from serving.ingest import decode_image_pil
+from serving.postprocess import make_palette
+from serving.responses import JSON, PNG, encode_payload, negotiate, palette_png, parse_artifacts
+
 app = FastAPI()
 
 MODEL_PATH = os.path.join(os.getcwd(), "ml_models", "unet_model_ml020.h5")
 CLASS_NAMES_PATH = os.path.join(os.getcwd(), "ml_models", "class_names.json")
 
 cat_dog_model = CatDogModel(MODEL_PATH, CLASS_NAMES_PATH)
+MODEL_VERSION = model_file_version(MODEL_PATH)
+
+# Re-uploads of the same photo (retries, /compare round trips) skip decode + predict
+response_cache = ResponseCache.from_env()
+
+# Images /predict_image can return; the echo of the upload stays the default for existing clients
+ARTIFACTS = ("image", "mask", "colored_mask")
+DEFAULT_ARTIFACTS = ("image",)
+
+MASK_COLORS = {
+    0: (0, 0, 0),       # black = background
+    1: (0, 255, 0),     # green = cat
+    2: (0, 0, 255)      # blue = dog
+}
+MASK_PALETTE = make_palette(MASK_COLORS)
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Keep track of last uploaded file
 last_uploaded_file = None
+last_segmentation_file = None
 
 @app.get("/")
 def root():
     return {"message": "Cat vs Dog API is running!"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return response_cache.stats()
+
+
+def segment_image_bytes(image_bytes: bytes) -> dict:
+    """Decode, predict and colorize one upload. Pure function of the bytes, so it is cacheable."""
+    img = decode_image_pil(image_bytes, target_size=(128, 128))
+    img_resized = img.resize((128, 128))
+    img_array = np.array(img_resized) / 255.0
+
+    preds = cat_dog_model.model.predict(np.expand_dims(img_array, axis=0))[0]  
+    mask_model = np.argmax(preds, axis=-1)  # raw mask from model
+
+    mask = np.zeros_like(mask_model)
+    mask[mask_model == 0] = 0  # background
+    mask[mask_model == 1] = 2  # dog → 2
+    mask[mask_model == 2] = 1  # cat → 1
+
+    mask_rgb = np.zeros((mask.shape[0], mask.shape[1], 3), dtype=np.uint8)
+    for k, color in MASK_COLORS.items():
+        mask_rgb[mask == k] = color
+
+    mask_no_bg = mask[mask != 0]
+    if len(mask_no_bg) > 0:
+        unique, counts = np.unique(mask_no_bg, return_counts=True)
+        main_class_index = unique[np.argmax(counts)]
+    else:
+        main_class_index = 0  # fallback to background
+
+    # Correct class_names order
+    cat_dog_model.class_names = ["background", "cat", "dog"]
+    main_class = cat_dog_model.class_names[main_class_index]
+
+    confidence = float((mask == main_class_index).sum() / mask.size)
+
+    return {"mask": mask.astype(np.uint8), "mask_rgb": mask_rgb, "class_name": main_class, "confidence": confidence}
+
+
+def encode_artifacts(img_bytes: bytes, result: dict, artifacts: set) -> dict:
+    """Raw bytes of the requested images, keyed by artifact name."""
+    encoded = {}
+    if "image" in artifacts:
+        encoded["image"] = img_bytes
+    if "mask" in artifacts:
+        encoded["mask"] = palette_png(result["mask"], MASK_PALETTE, len(MASK_COLORS))
+    if "colored_mask" in artifacts:
+        buf = io.BytesIO()
+        Image.fromarray(result["mask_rgb"]).save(buf, format="PNG")
+        encoded["colored_mask"] = buf.getvalue()
+    return encoded
+
+
+def render_comparison(original_path: str, mask_path: str, alpha: float) -> bytes:
+    """Side-by-side original | mask | overlay as PNG bytes."""
+    original = Image.open(original_path).convert("RGB")
+    mask = Image.open(mask_path).convert("RGBA").resize(original.size)
+
+    mask.putalpha(int(alpha * 255))
+    overlay_img = Image.alpha_composite(original.convert("RGBA"), mask)
+
+    width, height = original.size
+    combined = Image.new("RGB", (width * 3, height))
+    combined.paste(original, (0, 0))
+    combined.paste(mask.convert("RGB"), (width, 0))
+    combined.paste(overlay_img.convert("RGB"), (width * 2, 0))
+
+    buf = io.BytesIO()
+    combined.save(buf, format="PNG")
+    return buf.getvalue()
+
 """
 Uploads an image, performs cat/dog segmentation, and returns prediction results.
 
+`artifacts` picks the images to return (image, mask, colored_mask; default image). The `Accept`
+header picks the encoding: JSON with base64 fields (default), multipart/mixed or
+application/msgpack with raw PNG bytes, or image/png for the palette mask alone.
 """
-@app.post("/predict_image", response_model=PredictionResponse)
-async def predict_image(file: UploadFile = File(...)):
+@app.post("/predict_image", response_model=PredictionResponse, response_model_exclude_none=True)
+async def predict_image(request: Request, file: UploadFile = File(...),
+                        artifacts: str = Query(default=None, description="Comma-separated: image, mask, colored_mask")):
     global last_uploaded_file, last_segmentation_file
+    media_type = negotiate(request.headers.get("accept"))
+    requested = parse_artifacts(artifacts, ARTIFACTS, DEFAULT_ARTIFACTS)
     try:
+        img_bytes = await file.read()
         input_path = os.path.join(UPLOAD_DIR, file.filename)
         with open(input_path, "wb") as f:
-            f.write(await file.read())
+            f.write(img_bytes)
 
         last_uploaded_file = input_path
 
-        img = Image.open(input_path).convert("RGB")
-        img_resized = img.resize((128, 128))
-        img_array = np.array(img_resized) / 255.0
-
-        preds = cat_dog_model.model.predict(np.expand_dims(img_array, axis=0))[0]  
-        mask_model = np.argmax(preds, axis=-1)  # raw mask from model
-
-        mask = np.zeros_like(mask_model)
-        mask[mask_model == 0] = 0  # background
-        mask[mask_model == 1] = 2  # dog → 2
-        mask[mask_model == 2] = 1  # cat → 1
-
-        colors = {
-            0: (0, 0, 0),       # black = background
-            1: (0, 255, 0),     # green = cat
-            2: (0, 0, 255)      # blue = dog
-        }
-        mask_rgb = np.zeros((mask.shape[0], mask.shape[1], 3), dtype=np.uint8)
-        for k, color in colors.items():
-            mask_rgb[mask == k] = color
+        # v2: entries also hold the class mask; older on-disk entries only have mask_rgb
+        cache_key = make_key(img_bytes, MODEL_VERSION, endpoint="predict_image", schema=2)
+        result = await response_cache.get_or_compute(
+            cache_key, lambda: run_in_threadpool(segment_image_bytes, img_bytes)
+        )
 
-        mask_img = Image.fromarray(mask_rgb)
+        mask_img = Image.fromarray(result["mask_rgb"])
         mask_filename = f"mask_{file.filename}"
         mask_path = os.path.join(UPLOAD_DIR, mask_filename)
         mask_img.save(mask_path)
         last_segmentation_file = mask_path
 
-        mask_no_bg = mask[mask != 0]
-        if len(mask_no_bg) > 0:
-            unique, counts = np.unique(mask_no_bg, return_counts=True)
-            main_class_index = unique[np.argmax(counts)]
-        else:
-            main_class_index = 0  # fallback to background
-
-        # Correct class_names order
-        cat_dog_model.class_names = ["background", "cat", "dog"]
-        main_class = cat_dog_model.class_names[main_class_index]
+        if media_type == PNG:
+            png_bytes = await run_in_threadpool(palette_png, result["mask"], MASK_PALETTE, len(MASK_COLORS))
+            return Response(content=png_bytes, media_type=PNG, headers={
+                "X-Class-Name": result["class_name"],
+                "X-Confidence": str(result["confidence"]),
+            })
 
-        confidence = float((mask == main_class_index).sum() / mask.size)
+        images = await run_in_threadpool(encode_artifacts, img_bytes, result, requested)
 
-        with open(input_path, "rb") as f:
-            img_bytes = f.read()
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
+        if media_type == JSON:
+            return PredictionResponse(
+                class_name=result["class_name"],
+                confidence=result["confidence"],
+                **{f"{name}_base64": base64.b64encode(data).decode("utf-8") for name, data in images.items()}
+            )
 
-        return PredictionResponse(
-            class_name=main_class,
-            confidence=confidence,
-            image_base64=img_base64
-        )
+        payload = {"class_name": result["class_name"], "confidence": result["confidence"], **images}
+        body, content_type = await run_in_threadpool(encode_payload, payload, media_type)
+        return Response(content=body, media_type=content_type)
 
+    except HTTPException:
+        raise  # 4xx from validation or negotiation keep their status
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -107,25 +194,29 @@ async def compare_images(alpha: float = 0.5):
         raise HTTPException(status_code=404, detail="No segmentation mask available. Upload an image first.")
 
     try:
-        original = Image.open(last_uploaded_file).convert("RGB")
-        mask = Image.open(last_segmentation_file).convert("RGBA").resize(original.size)
-
-        mask.putalpha(int(alpha * 255))
-        overlay_img = Image.alpha_composite(original.convert("RGBA"), mask)
-
-        width, height = original.size
-        combined = Image.new("RGB", (width * 3, height))
-        combined.paste(original, (0, 0))
-        combined.paste(mask.convert("RGB"), (width, 0))
-        combined.paste(overlay_img.convert("RGB"), (width * 2, 0))
+        with open(last_uploaded_file, "rb") as f:
+            original_bytes = f.read()
 
         compare_path = os.path.join(
             UPLOAD_DIR, f"compare_{os.path.splitext(os.path.basename(last_uploaded_file))[0]}.png"
         )
-        combined.save(compare_path, format="PNG")
 
-        return FileResponse(compare_path, media_type="image/png")
+        def compute_comparison() -> bytes:
+            png_bytes = render_comparison(last_uploaded_file, last_segmentation_file, alpha)
+            with open(compare_path, "wb") as f:
+                f.write(png_bytes)
+            return png_bytes
+
+        # The mask is a function of the upload and the model, so (upload, model, alpha) identifies the result
+        cache_key = make_key(original_bytes, MODEL_VERSION, endpoint="compare", alpha=alpha)
+        png_bytes = await response_cache.get_or_compute(
+            cache_key, lambda: run_in_threadpool(compute_comparison)
+        )
+
+        return Response(content=png_bytes, media_type="image/png")
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison failed: {str(e)}")
 
@@ -1,6 +1,10 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 class PredictionResponse(BaseModel):
     class_name: str
     confidence: float
-    image_base64: str  
+    image_base64: Optional[str] = None          # the upload, echoed back (default artifact)
+    mask_base64: Optional[str] = None           # class mask as an 8-bit palette PNG
+    colored_mask_base64: Optional[str] = None   # RGB mask PNG
@@ -1,12 +1,16 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from contextlib import asynccontextmanager
-from PIL import Image
 from .utils import predictImg
 from .model_work import CatAndDogModel
 
 import uvicorn
-import io
+import os
+import sys
 import numpy as np
+
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.ingest import decode_image_pil
     
 ml_models ={}
 
@@ -36,8 +40,8 @@ async def predict(file: UploadFile = File(...)):
     try:
         # Read and process the image
         raw = await file.read()
-        img = Image.open(io.BytesIO(raw))
-        img = img.convert("RGB")
+        # JPEGs are decoded at a reduced scale close to the model input instead of full resolution
+        img = decode_image_pil(raw, target_size=ml_models["catAndDogModel"].input_img_size)
         img = np.array(img)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid image.")
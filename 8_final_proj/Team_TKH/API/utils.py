@@ -5,9 +5,8 @@ import tensorflow as tf
 
 def predictImg(org_img, model):
     
-    # Preprocess the image
-    img = tf.convert_to_tensor(org_img, dtype=tf.float32)
-    img = tf.image.resize(img, model["catAndDogModel"].input_img_size)
+    # Preprocess the image (resize the uint8 pixels first, so only the small image becomes float32)
+    img = tf.image.resize(org_img, model["catAndDogModel"].input_img_size)
     img_normalized = img / 255.0
     img_batch = tf.expand_dims(img_normalized, axis=0)
     
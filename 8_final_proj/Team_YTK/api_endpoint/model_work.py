@@ -3,12 +3,18 @@ Overlay Model Working Module
 """
 
 import io
+import os
+import sys
 
-import cv2
 import numpy as np
 import tensorflow as tf
 from PIL import Image
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.ingest import decode_image_pil
+from serving.postprocess import colorize, make_palette, overlay
+
 
 class SemanticSegmentation:
     """Model Loading Class for Semantic Segmentation on Cat and Dog"""
@@ -27,6 +33,7 @@ class SemanticSegmentation:
             ],
             dtype=np.uint8,
         )
+        self.palette = make_palette(self.color_map)
 
     @property
     def model(self):
@@ -77,7 +84,8 @@ class SemanticSegmentation:
         """
         if image_path is not None:
             self.image_path = image_path
-            image = Image.open(io.BytesIO(self.image_path))
+            # JPEGs are decoded at a reduced scale close to 128x128 instead of full resolution
+            image = decode_image_pil(self.image_path, target_size=(128, 128))
             image = image.resize((128, 128))
             image_array = np.array(image) / 255.0
             img_batch = tf.expand_dims(image_array, axis=0)
@@ -95,10 +103,7 @@ class SemanticSegmentation:
         Returns:
             numpy.ndarray: 3D RGB mask (H, W, 3) with colors applied per class.
         """
-        rgb_mask = np.zeros((*mask.shape, 3), dtype=np.uint8)
-        for class_idx, color in enumerate(self.color_map):
-            rgb_mask[mask == class_idx] = color
-        return rgb_mask
+        return colorize(mask, self.palette)
 
     def predict_and_visualize_color(self, image_path=None, overlay_alpha=0.4):
         """
@@ -113,11 +118,6 @@ class SemanticSegmentation:
             numpy.ndarray: RGB image with segmentation mask overlay.
         """
         predicted_masks, img = self.semantic_segmentation(image_path)
-        pred_mask = tf.argmax(predicted_masks, axis=-1)[0].numpy()
-        color_mask = self.mask_to_rgb(pred_mask)
-        input_image_numpy = np.array(img).astype(np.uint8)
-
-        overlay = cv2.addWeighted(
-            input_image_numpy, 1 - overlay_alpha, color_mask, overlay_alpha, 0
-        )
-        return overlay
+        pred_mask = np.argmax(predicted_masks[0], axis=-1)
+        overlay_image, _ = overlay(np.asarray(img), pred_mask, self.palette, overlay_alpha)
+        return overlay_image
@@ -0,0 +1,3 @@
+"""
+Shared serving helpers for the final-project segmentation APIs.
+"""
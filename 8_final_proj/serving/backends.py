@@ -0,0 +1,130 @@
+"""
+Inference backends, selectable per model through environment variables.
+
+``load_model(path, name="MODEL")`` loads the Keras model as before unless
+``<name>_BACKEND=tflite``; then it loads the INT8 TFLite model made by
+``python -m serving.quantize`` from ``<name>_TFLITE_PATH`` (default: next to the
+Keras file, ``model.keras`` -> ``model_int8.tflite``).
+
+``TFLiteModel`` has the part of the Keras API the apps call (``predict``,
+``predict_on_batch``, ``inputs``, ``input_shape``, ``output_shape``) with the
+same float inputs and float class scores, so ``model_work.py`` code does not
+change. Quantization of inputs / dequantization of outputs happens inside.
+
+The interpreter comes from ``tflite_runtime`` or ``ai_edge_litert`` when
+installed (a few MB, no TensorFlow needed), else from ``tf.lite``.
+``TFLITE_NUM_THREADS`` sets the interpreter threads.
+"""
+
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+TensorSpec = namedtuple("TensorSpec", ["shape", "dtype"])
+
+
+def _interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def tflite_path_for(path):
+    """Default location of the INT8 model for a Keras model file."""
+    return os.path.splitext(path)[0] + "_int8.tflite"
+
+
+class TFLiteModel:
+    """A quantized TFLite model behind the Keras ``predict`` interface (float in, float scores out)."""
+
+    def __init__(self, path, num_threads=None):
+        """
+        Args:
+            path (str): ``.tflite`` file.
+            num_threads (int | None): Interpreter threads; defaults to ``TFLITE_NUM_THREADS`` if set.
+        """
+        if num_threads is None and os.getenv("TFLITE_NUM_THREADS"):
+            num_threads = int(os.getenv("TFLITE_NUM_THREADS"))
+        self.path = path
+        self._interpreter = _interpreter_class()(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        # one interpreter, called from executor threads
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None, *self._input["shape"][1:].tolist())
+
+    @property
+    def output_shape(self):
+        return (None, *self._output["shape"][1:].tolist())
+
+    @property
+    def inputs(self):
+        # inputs are taken as float, like the Keras model the file was converted from
+        return [TensorSpec(self.input_shape, "float32")]
+
+    def _quantize(self, batch):
+        dtype = self._input["dtype"]
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+        scale, zero_point = self._input["quantization"]
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        if self._output["dtype"] == np.float32:
+            return output
+        scale, zero_point = self._output["quantization"]
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, batch):
+        batch = np.asarray(batch)
+        with self._lock:
+            if batch.shape[0] != self._input["shape"][0]:
+                self._interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+            self._interpreter.set_tensor(self._input["index"], self._quantize(batch))
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output["index"])
+        return self._dequantize(output)
+
+    def predict(self, x, verbose=0, **kwargs):
+        return self.predict_on_batch(x)
+
+
+def load_model(path, name="MODEL", **kwargs):
+    """Load the model for ``path`` with the backend configured for ``name``.
+
+    Args:
+        path (str): Keras model file (``.keras`` / ``.h5``), or a ``.tflite`` file.
+        name (str): Prefix of the ``<name>_BACKEND`` / ``<name>_TFLITE_PATH`` variables.
+        **kwargs: Passed to ``tf.keras.models.load_model``.
+
+    Returns:
+        tf.keras.Model | TFLiteModel
+    """
+    backend = os.getenv(f"{name}_BACKEND", "keras").lower()
+    if path.endswith(".tflite"):
+        backend = "tflite"
+    if backend == "tflite":
+        tflite_path = path if path.endswith(".tflite") else os.getenv(f"{name}_TFLITE_PATH", tflite_path_for(path))
+        print(f"Loading INT8 TFLite model: {tflite_path}")
+        return TFLiteModel(tflite_path)
+    if backend != "keras":
+        raise ValueError(f"Unknown {name}_BACKEND {backend!r}, expected keras or tflite")
+
+    import tensorflow as tf
+    return tf.keras.models.load_model(path, **kwargs)
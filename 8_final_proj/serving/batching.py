@@ -0,0 +1,177 @@
+"""
+Request-coalescing micro-batcher for the segmentation endpoints.
+
+Handlers ``await batcher.submit(sample)`` with a single preprocessed image.
+One worker task gathers queued samples into a batch (up to ``max_batch_size``
+or until ``max_wait_ms`` has passed since the first sample arrived), runs a
+single forward pass and hands every row of the output back to the handler
+that submitted it.
+"""
+
+import asyncio
+import collections
+import time
+
+import numpy as np
+
+
+def _percentiles(values, qs=(50, 95, 99)):
+    """Return ``{"p50": ..., "p95": ..., "p99": ..., "max": ...}`` for ``values`` (ms)."""
+    if not values:
+        return {f"p{q}": 0.0 for q in qs} | {"max": 0.0}
+    data = np.asarray(values, dtype=np.float64)
+    result = {f"p{q}": round(float(np.percentile(data, q)), 3) for q in qs}
+    result["max"] = round(float(data.max()), 3)
+    return result
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-image requests into batched model calls."""
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, executor=None, delay_window=2048):
+        """
+        Args:
+            predict_fn (callable): Takes a stacked ``(N, ...)`` NumPy batch and returns
+                                   an indexable result with one row per sample.
+            max_batch_size (int): Largest batch handed to ``predict_fn``.
+            max_wait_ms (float): How long the first queued request may wait for company.
+            executor (concurrent.futures.Executor | None): Where ``predict_fn`` runs.
+                                   ``None`` uses the event loop's default thread pool.
+            delay_window (int): Number of recent queueing delays kept for percentiles.
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+
+        self.batch_sizes = collections.Counter()
+        self.queue_delays_ms = collections.deque(maxlen=delay_window)
+        self.total_requests = 0
+        self.total_batches = 0
+
+        self._queue = None
+        self._arrived = None
+        self._worker = None
+
+    async def start(self):
+        """Start the worker task on the running event loop."""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._arrived = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the worker task and fail any request still waiting in the queue."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher stopped"))
+
+    async def submit(self, sample):
+        """Queue one sample and wait for its row of the batched prediction.
+
+        Args:
+            sample (numpy.ndarray): A single model input without the batch axis.
+
+        Returns:
+            The ``predict_fn`` output row that belongs to ``sample``.
+        """
+        if self._worker is None:
+            await self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((sample, future, time.perf_counter()))
+        self._arrived.set()
+        self.total_requests += 1
+        return await future
+
+    async def _collect(self, batch):
+        """Block for the first request, then fill ``batch`` until it is full or the window closes.
+
+        Requests are appended to ``batch`` as they are dequeued, so the caller still holds them
+        if the worker is cancelled halfway.
+        """
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+
+                # Requests whose handler already went away are dropped before the forward pass.
+                batch = [item for item in batch if not item[1].done()]
+                if not batch:
+                    continue
+
+                started = time.perf_counter()
+                for _, _, enqueued in batch:
+                    self.queue_delays_ms.append((started - enqueued) * 1000.0)
+                self.batch_sizes[len(batch)] += 1
+                self.total_batches += 1
+
+                try:
+                    samples = np.stack([sample for sample, _, _ in batch])
+                    outputs = await loop.run_in_executor(self.executor, self.predict_fn, samples)
+                    if len(outputs) != len(batch):
+                        raise ValueError(
+                            f"predict_fn returned {len(outputs)} rows for a batch of {len(batch)}"
+                        )
+                except Exception as e:
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (_, future, _), output in zip(batch, outputs):
+                    if not future.done():
+                        future.set_result(output)
+        finally:
+            # cancelled (stop()) with requests already taken off the queue: fail them too
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("MicroBatcher stopped"))
+
+    def stats(self):
+        """Queue depth, batch-size histogram and queueing-delay percentiles as a JSON-able dict."""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "mean_batch_size": round(
+                sum(size * count for size, count in self.batch_sizes.items()) / self.total_batches, 3
+            ) if self.total_batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "queue_delay_ms": _percentiles(list(self.queue_delays_ms)),
+        }
@@ -0,0 +1,107 @@
+"""
+Compare full-resolution decode + resize with reduced-scale decode + resize on large JPEGs.
+
+    python -m serving.benchmark_ingest --width 4032 --height 3024 --repeats 20
+    python -m serving.benchmark_ingest --images photo1.jpg photo2.jpg --output ingest.json
+
+Without ``--images`` a synthetic photo-like JPEG of the given size is used.
+For each decoder the script reports the mean time per image and the number of
+pixels the decoder had to materialize before the resize to 128x128.
+"""
+
+import argparse
+import io
+import json
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from serving.ingest import decode_image_cv2, decode_image_pil
+
+TARGET_SIZE = (128, 128)
+
+
+def synthetic_jpeg(width, height, quality=90):
+    """A smooth, noisy JPEG that compresses like a phone photo."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([
+        128 + 100 * np.sin(xx / 97.0),
+        128 + 100 * np.cos(yy / 61.0),
+        128 + 100 * np.sin((xx + yy) / 143.0),
+    ], axis=-1)
+    img += rng.normal(0, 12, img.shape)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def pil_full(data):
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    return img.size, img.resize(TARGET_SIZE)
+
+
+def pil_reduced(data):
+    img = decode_image_pil(data, target_size=TARGET_SIZE)
+    return img.size, img.resize(TARGET_SIZE)
+
+
+def cv2_full(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return img.shape[1::-1], cv2.resize(img, TARGET_SIZE)
+
+
+def cv2_reduced(data):
+    img = decode_image_cv2(data, target_size=TARGET_SIZE)
+    return img.shape[1::-1], cv2.resize(img, TARGET_SIZE)
+
+
+def bench(fn, images, repeats):
+    fn(images[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for data in images:
+            decoded_size, _ = fn(data)
+    elapsed = (time.perf_counter() - start) / (repeats * len(images))
+    return elapsed, decoded_size
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--images", nargs="*", help="JPEG files to decode (default: a synthetic one)")
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    if args.images:
+        images = [open(path, "rb").read() for path in args.images]
+    else:
+        images = [synthetic_jpeg(args.width, args.height)]
+
+    results = {}
+    for name, fn in (("pil_full", pil_full), ("pil_reduced", pil_reduced),
+                     ("cv2_full", cv2_full), ("cv2_reduced", cv2_reduced)):
+        elapsed, decoded_size = bench(fn, images, args.repeats)
+        results[name] = {
+            "ms_per_image": round(elapsed * 1000, 2),
+            "decoded_size": list(decoded_size),
+            "decoded_megapixels": round(decoded_size[0] * decoded_size[1] / 1e6, 3),
+        }
+        print(f"{name:<12} {elapsed * 1000:8.2f} ms  decoded {decoded_size[0]}x{decoded_size[1]}")
+
+    for backend in ("pil", "cv2"):
+        speedup = results[f"{backend}_full"]["ms_per_image"] / results[f"{backend}_reduced"]["ms_per_image"]
+        results[f"{backend}_speedup"] = round(speedup, 2)
+        print(f"{backend} speedup: {speedup:.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
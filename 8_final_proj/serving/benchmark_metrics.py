@@ -0,0 +1,80 @@
+"""
+Overhead of the metrics layer per request.
+
+    python -m serving.benchmark_metrics --requests 20000
+
+Calls a FastAPI app in-process (no sockets) whose endpoint does nothing but
+enter the five ``stage`` timers, with and without ``MetricsMiddleware`` and
+the timers, and reports the difference per request. That absolute cost is what
+instrumentation adds to every request; compare it with the request latency of
+the app (``serving_request_duration_seconds``) to get the relative overhead.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from serving.metrics import STAGES, MetricsMiddleware, stage
+
+
+def build_app(instrumented):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/segment/{item}")
+    async def segment(item: int):
+        if instrumented:
+            for name in STAGES:
+                with stage(name):
+                    pass
+        return {"item": item}
+
+    return app
+
+
+async def call(app, requests):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/segment/1", "raw_path": b"/segment/1", "root_path": "",
+             "query_string": b"", "headers": [], "server": ("test", 80), "client": ("test", 1)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(100):
+        await app(dict(scope), receive, send)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    plain = asyncio.run(call(build_app(False), args.requests))
+    instrumented = asyncio.run(call(build_app(True), args.requests))
+    results = {
+        "plain_us": round(plain * 1e6, 1),
+        "instrumented_us": round(instrumented * 1e6, 1),
+        "overhead_us": round((instrumented - plain) * 1e6, 1),
+    }
+    for latency_ms in (5, 30, 100):
+        results[f"overhead_pct_of_{latency_ms}ms_request"] = round((instrumented - plain) * 1e5 / latency_ms, 3)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Cross-team model benchmark: every team's model wrapper on one shared corpus, ranked in a leaderboard.
+
+    # from 8_final_proj/
+    python -m serving.benchmark_models                       # every team whose model file is present
+    python -m serving.benchmark_models --model team_mdy=/models/unet.keras --model t9=/models/unet.keras \\
+        --limit 40 --output runs/models.json
+    python -m serving.benchmark_models --list                # discovered classes and their adapters
+
+The model classes (``model_work.py`` / ``models.py`` / ``model_load.py`` of each
+team) are discovered by parsing the source, and each one known to ``ADAPTERS``
+is driven through the same interface: the team's own class loads the model (so
+the cold-load time is that of the team's loading code) and the team's own
+preprocessing prepares the input. Classes without an adapter are listed as such.
+
+Every team runs in a fresh subprocess, so the cold load includes nothing another
+team already loaded and the peak RSS is that team's alone. Per team:
+
+- ``import_s`` / ``load_s``: importing the team module (TensorFlow included) and loading the model
+- single-image latency: preprocessing + forward pass + argmax, one image at a time (p50 / p95)
+- batched throughput: images per second with ``--batch-size`` images per forward pass
+- ``peak_rss_mb`` and ``model_rss_mb`` (RSS growth during the load)
+- mean IoU against ``encoded_masks`` (background / cat / dog, after mapping the team's
+  class order) and foreground IoU (animal vs background, independent of the class order)
+
+The corpus is the photos of ``--dataset`` that have a mask in ``encoded_masks``.
+Those masks are JPEG files, so values above 2 (compression noise at the edges)
+are ignored.
+"""
+
+import argparse
+import ast
+import asyncio
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image
+
+FINAL_PROJ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+DEFAULT_DATASET = os.path.join("Team_TKH", "dataset", "cat_and_dog_dataset")
+MODEL_FILES = ("model_work.py", "models.py", "model_load.py")
+
+# encoded_masks class ids
+BACKGROUND, CAT, DOG = 0, 1, 2
+NUM_CLASSES = 3
+IGNORE_LABEL = 255
+
+# module: path relative to 8_final_proj; model_path: the team's default, relative to the module's folder;
+# labels: dataset class id of each model output class (encoded_masks is background, cat, dog)
+Adapter = namedtuple("Adapter", ["module", "class_name", "model_path", "labels", "build"])
+
+
+def _model_input(batch):
+    """A preprocessed (1, H, W, 3) batch (numpy or tf) as one (H, W, 3) array."""
+    return np.asarray(batch)[0]
+
+
+def _pil_128(data):
+    """decode_image_pil + resize to 128x128 + /255, the preprocessing most teams share."""
+    from serving.ingest import decode_image_pil
+
+    image = decode_image_pil(data, target_size=(128, 128)).resize((128, 128))
+    return np.asarray(image) / 255.0
+
+
+def _build_team_mdy(module, model_path):
+    wrapper = module.SemanticSegmentation()
+    wrapper.load_model(model_path)
+    return wrapper.model, lambda data: _model_input(wrapper.preprocess_image(data)[1])
+
+
+def _build_t9(module, model_path):
+    wrapper = module.ImageModel()
+    wrapper.model_path = model_path
+    if not wrapper.load_model():
+        raise RuntimeError(f"ImageModel could not load {model_path}")
+    return wrapper.model, lambda data: wrapper.preprocess(data)[0]
+
+
+def _build_kmm(module, model_path):
+    wrapper = module.SegmentationModel()
+    wrapper.model_path = model_path
+    if not asyncio.run(wrapper.load_model()):
+        raise RuntimeError(f"SegmentationModel could not load {model_path}")
+    return wrapper.model, lambda data: _model_input(wrapper.preprocess_image(data))
+
+
+def _build_ml_heros(module, model_path):
+    # the model is an architecture JSON plus a weights file: "arch.json,weights.h5"
+    wrapper = module.SegmentationModel()
+    wrapper.json_path, wrapper.weights_path = model_path.split(",", 1)
+    asyncio.run(wrapper.load_model())
+
+    def preprocess(data):
+        # predict_image: cv2 decode (BGR), resize to 128x128, / 255
+        import cv2
+
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        return cv2.resize(image, (128, 128)) / 255.0
+
+    return wrapper.model, preprocess
+
+
+def _build_tkh(module, model_path):
+    wrapper = module.CatAndDogModel()
+    wrapper.model_path = model_path
+    if not wrapper.load_model():
+        raise RuntimeError(f"CatAndDogModel could not load {model_path}")
+
+    def preprocess(data):
+        # main.predict + utils.predictImg: reduced-scale decode, tf.image.resize, / 255
+        import tensorflow as tf
+        from serving.ingest import decode_image_pil
+
+        image = np.array(decode_image_pil(data, target_size=wrapper.input_img_size))
+        return tf.image.resize(image, wrapper.input_img_size).numpy() / 255.0
+
+    return wrapper.model, preprocess
+
+
+def _build_lmh(module, model_path):
+    # class_names.json next to the model, else the one the team ships
+    class_names = os.path.join(os.path.dirname(model_path), "class_names.json")
+    if not os.path.exists(class_names):
+        class_names = os.path.join(os.path.dirname(module.__file__), "ml_models", "class_names.json")
+    wrapper = module.CatDogModel(model_path, class_names)
+    # main.segment_image_bytes
+    return wrapper.model, _pil_128
+
+
+def _build_ytk(module, model_path):
+    wrapper = module.SemanticSegmentation()
+    wrapper.load_model(model_path)
+    # semantic_segmentation()
+    return wrapper.model, _pil_128
+
+
+def _build_mmt(module, model_path):
+    wrapper = module.CatDogModel()
+    wrapper.load_model(model_path)
+    return wrapper.model, lambda data: _model_input(wrapper.preprocess_image(data)[1])
+
+
+ADAPTERS = {
+    "team_mdy": Adapter("team_mdy/dog_cat_segmentation/model_work.py", "SemanticSegmentation",
+                        "model/cat_dog_segmentation_unet.keras", (BACKGROUND, DOG, CAT), _build_team_mdy),
+    "t9": Adapter("T9/model_work.py", "ImageModel", "cat_dog_segmentation_unet.keras",
+                  (BACKGROUND, CAT, DOG), _build_t9),
+    "team_kmm": Adapter("Team-KMM/api_endpoints/model_work.py", "SegmentationModel", "models/cat_and_dog_unet.keras",
+                        (BACKGROUND, CAT, DOG), _build_kmm),
+    "ml_heros": Adapter("ML_Heros/models.py", "SegmentationModel", "models/cat&dog.json,models/cat&dogs_weights.h5",
+                        (BACKGROUND, CAT, DOG), _build_ml_heros),
+    "team_tkh": Adapter("Team_TKH/API/model_work.py", "CatAndDogModel", "cat_dog_unet.keras",
+                        (BACKGROUND, CAT, DOG), _build_tkh),
+    "team_lmh": Adapter("Team_LMH/api_endpoint/model_work.py", "CatDogModel", "ml_models/unet_model_ml020.h5",
+                        (BACKGROUND, DOG, CAT), _build_lmh),
+    "team_ytk": Adapter("Team_YTK/api_endpoint/model_work.py", "SemanticSegmentation", "cats_dogs_mobilenet.keras",
+                        (BACKGROUND, CAT, DOG), _build_ytk),
+    "team_mmt": Adapter("TeamMMT/api_endpoint/model_work.py", "CatDogModel", "cats_and_dogs_final_model.keras",
+                        (BACKGROUND, CAT, DOG), _build_mmt),
+}
+
+
+def discover_model_classes(root=FINAL_PROJ):
+    """(module path relative to ``root``, class name) of every class in the teams' model files."""
+    found = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(d for d in subdirectories
+                                   if d not in ("serving", "dataset", "__pycache__") and not d.startswith("."))
+        for name in sorted(files):
+            if name not in MODEL_FILES:
+                continue
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as f:
+                tree = ast.parse(f.read(), filename=path)
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            found += [(relative, node.name) for node in tree.body if isinstance(node, ast.ClassDef)]
+    return found
+
+
+def corpus(dataset_dir, limit=None):
+    """(photo, encoded mask) path pairs, sorted, every mask present."""
+    photos = os.path.join(dataset_dir, "JPEGImages")
+    masks = os.path.join(dataset_dir, "encoded_masks")
+    pairs = []
+    for name in sorted(os.listdir(masks)):
+        stem = os.path.splitext(name)[0]
+        for extension in (".jpg", ".jpeg", ".png"):
+            if os.path.exists(os.path.join(photos, stem + extension)):
+                pairs.append((os.path.join(photos, stem + extension), os.path.join(masks, name)))
+                break
+    return pairs[:limit] if limit else pairs
+
+
+def load_truth(mask_path):
+    truth = np.asarray(Image.open(mask_path).convert("L")).copy()
+    truth[truth >= NUM_CLASSES] = IGNORE_LABEL
+    return truth
+
+
+def iou_scores(truth, prediction):
+    """(mean IoU over the classes present in either mask, foreground IoU) for one image."""
+    valid = truth != IGNORE_LABEL
+    ious = []
+    for class_id in range(NUM_CLASSES):
+        t, p = (truth == class_id) & valid, (prediction == class_id) & valid
+        union = np.count_nonzero(t | p)
+        if union:
+            ious.append(np.count_nonzero(t & p) / union)
+    t, p = (truth != BACKGROUND) & valid, (prediction != BACKGROUND) & valid
+    union = np.count_nonzero(t | p)
+    foreground = np.count_nonzero(t & p) / union if union else 1.0
+    return (float(np.mean(ious)) if ious else 1.0), foreground
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def run_worker(name, model_path, pairs, batch_size, repeats):
+    """Benchmark one team in this (fresh) process; returns the result dict."""
+    adapter = ADAPTERS[name]
+    module_path = os.path.join(FINAL_PROJ, adapter.module)
+    module_dir = os.path.dirname(module_path)
+    # the team code resolves paths against the working directory and imports its siblings
+    os.chdir(module_dir)
+    sys.path.insert(0, module_dir)
+
+    start = time.perf_counter()
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(module_path))[0], module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_s = time.perf_counter() - start
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    model, preprocess = adapter.build(module, model_path)
+    load_s = time.perf_counter() - start
+    model_rss = _rss_mb() - rss_before
+
+    labels = np.asarray(adapter.labels, dtype=np.uint8)
+
+    def to_masks(output):
+        output = np.asarray(output)
+        return labels[output.argmax(axis=-1) if output.ndim == 4 else output]
+
+    photos = []
+    for photo, _ in pairs:
+        with open(photo, "rb") as f:
+            photos.append(f.read())
+
+    # warm-up: the first call builds the graph
+    model.predict_on_batch(np.stack([preprocess(photos[0])]))
+
+    latencies, masks = [], []
+    for data in photos:
+        start = time.perf_counter()
+        mask = to_masks(model.predict_on_batch(np.stack([preprocess(data)])))[0]
+        latencies.append(time.perf_counter() - start)
+        masks.append(mask)
+
+    batch_runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(0, len(photos), batch_size):
+            to_masks(model.predict_on_batch(np.stack([preprocess(data) for data in photos[i:i + batch_size]])))
+        batch_runs.append(time.perf_counter() - start)
+
+    mean_ious, foreground_ious = [], []
+    for mask, (_, mask_path) in zip(masks, pairs):
+        truth = load_truth(mask_path)
+        prediction = np.asarray(Image.fromarray(mask).resize(truth.shape[::-1], Image.NEAREST))
+        mean_iou, foreground_iou = iou_scores(truth, prediction)
+        mean_ious.append(mean_iou)
+        foreground_ious.append(foreground_iou)
+
+    latency_ms = np.asarray(latencies) * 1000
+    return {
+        "team": name,
+        "class": f"{adapter.module}:{adapter.class_name}",
+        "model_path": model_path,
+        "model_mb": round(sum(os.path.getsize(path) for path in model_path.split(",")) / 1e6, 1),
+        "input_shape": list(model.input_shape[1:]),
+        "images": len(photos),
+        "import_s": round(import_s, 2),
+        "load_s": round(load_s, 2),
+        "latency_ms": {"p50": round(float(np.percentile(latency_ms, 50)), 2),
+                       "p95": round(float(np.percentile(latency_ms, 95)), 2)},
+        "batch_size": batch_size,
+        "images_per_s": round(len(photos) / min(batch_runs), 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "model_rss_mb": round(model_rss, 1),
+        "mean_iou": round(float(np.mean(mean_ious)), 4),
+        "foreground_iou": round(float(np.mean(foreground_ious)), 4),
+    }
+
+
+def run_team(name, model_path, pairs, batch_size=16, repeats=3, timeout_s=900):
+    """Run :func:`run_worker` for one team in a subprocess; failures come back as ``{"error": ...}``."""
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(pairs, f)
+        corpus_file = f.name
+    command = [sys.executable, "-m", "serving.benchmark_models", "--worker", name, "--worker-model", model_path,
+               "--worker-corpus", corpus_file, "--batch-size", str(batch_size), "--repeats", str(repeats)]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [FINAL_PROJ, os.getenv("PYTHONPATH")])),
+           "TF_CPP_MIN_LOG_LEVEL": os.getenv("TF_CPP_MIN_LOG_LEVEL", "2")}
+    try:
+        completed = subprocess.run(command, cwd=FINAL_PROJ, env=env, capture_output=True, text=True,
+                                   timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        return {"team": name, "error": f"timed out after {timeout_s} s"}
+    finally:
+        os.unlink(corpus_file)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return {"team": name, "error": (completed.stderr.strip().splitlines() or ["no output"])[-1]}
+
+
+def leaderboard(results):
+    """Markdown table, best mean IoU first; teams that did not run are listed at the bottom."""
+    ranked = sorted((r for r in results if "error" not in r and "skipped" not in r),
+                    key=lambda r: (-r["mean_iou"], r["latency_ms"]["p50"]))
+    lines = [
+        "| # | Team | Mean IoU | Foreground IoU | p50 ms | p95 ms | Images/s | Load s | Peak RSS MB | Model MB |",
+        "| - | ---- | -------- | -------------- | ------ | ------ | -------- | ------ | ----------- | -------- |",
+    ]
+    for rank, r in enumerate(ranked, 1):
+        lines.append(f"| {rank} | {r['team']} | {r['mean_iou']:.3f} | {r['foreground_iou']:.3f} | "
+                     f"{r['latency_ms']['p50']} | {r['latency_ms']['p95']} | {r['images_per_s']} | {r['load_s']} | "
+                     f"{r['peak_rss_mb']:.0f} | {r['model_mb']} |")
+    for r in results:
+        if "error" in r or "skipped" in r:
+            lines.append(f"| - | {r['team']} | {r.get('error') or r.get('skipped')} | | | | | | | |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", action="append", metavar="TEAM=PATH",
+                        help="model file of a team (repeatable; ml_heros takes ARCH.json,WEIGHTS.h5); "
+                             "default: the path the team's code loads")
+    parser.add_argument("--teams", nargs="+", choices=sorted(ADAPTERS), help="only these teams")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="folder with JPEGImages/ and encoded_masks/")
+    parser.add_argument("--limit", type=int, help="first N images of the corpus")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeats", type=int, default=3, help="batched passes over the corpus, best one counts")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per team")
+    parser.add_argument("--list", action="store_true", help="list the discovered classes and exit")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-model", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker_corpus) as f:
+            pairs = json.load(f)
+        print(json.dumps(run_worker(args.worker, args.worker_model, pairs, args.batch_size, args.repeats)))
+        return
+
+    adapted = {(adapter.module, adapter.class_name): name for name, adapter in ADAPTERS.items()}
+    discovered = discover_model_classes()
+    if args.list:
+        for module, class_name in discovered:
+            print(f"{module}:{class_name:<24} {adapted.get((module, class_name), 'no adapter')}")
+        return
+
+    overrides = dict(pair.split("=", 1) for pair in args.model or [])
+    unknown = set(overrides) - set(ADAPTERS)
+    if unknown:
+        parser.error(f"unknown team(s) in --model: {', '.join(sorted(unknown))}")
+    pairs = corpus(os.path.abspath(args.dataset), args.limit)
+    if not pairs:
+        parser.error(f"no photos with encoded_masks under {args.dataset}")
+
+    results = []
+    for module, class_name in discovered:
+        name = adapted.get((module, class_name))
+        if name is None:
+            results.append({"team": f"{module}:{class_name}", "skipped": "no adapter"})
+            continue
+        if args.teams and name not in args.teams:
+            continue
+        adapter = ADAPTERS[name]
+        paths = [os.path.abspath(path) for path in overrides[name].split(",")] if name in overrides else [
+            os.path.join(FINAL_PROJ, os.path.dirname(adapter.module), path) for path in adapter.model_path.split(",")]
+        missing = [os.path.relpath(path) for path in paths if not os.path.exists(path)]
+        if missing:
+            results.append({"team": name, "skipped": f"model file not found: {', '.join(missing)}"})
+            continue
+        model_path = ",".join(paths)
+        print(f"{name}: {', '.join(map(os.path.relpath, paths))} on {len(pairs)} images", file=sys.stderr)
+        results.append(run_team(name, model_path, pairs, args.batch_size, args.repeats, args.timeout))
+
+    print(leaderboard(results))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"dataset": args.dataset, "images": len(pairs), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmark of the postprocessing kernels against the per-app loops they replace.
+
+    python -m serving.benchmark_postprocess --repeats 50 --output postprocess.json
+
+At 128x128 (model output) and 3840x2160 (full-size overlays) it times, per response:
+
+- ``loops``:   per-class boolean colorize + ``cv2.addWeighted`` + ``np.unique`` class percentages
+- ``kernels``: ``overlay`` (palette lookup + blend) + ``class_counts`` / ``class_percentages``
+
+and checks that both produce the same color mask, overlay and percentages.
+"""
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from serving.postprocess import class_counts, class_percentages, make_palette, overlay
+
+COLOR_MAP = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0]], dtype=np.uint8)
+SIZES = {"128x128": (128, 128), "3840x2160": (3840, 2160)}
+
+
+def loops_postprocess(image, mask, alpha=0.4):
+    """What team_mdy / TeamMMT / Team_YTK / Team_AI did before."""
+    rgb_mask = np.zeros((*mask.shape, 3), dtype=np.uint8)
+    for class_idx, color in enumerate(COLOR_MAP):
+        rgb_mask[mask == class_idx] = color
+    blended = cv2.addWeighted(image, 1 - alpha, rgb_mask, alpha, 0)
+
+    unique, counts = np.unique(mask, return_counts=True)
+    percentages = {int(u): int(c / mask.size * 100) for u, c in zip(unique, counts)}
+    return blended, rgb_mask, percentages
+
+
+def kernels_postprocess(image, mask, palette, alpha=0.4):
+    blended, rgb_mask = overlay(image, mask, palette, alpha)
+    percentages = class_percentages(class_counts(mask, num_classes=len(COLOR_MAP)))
+    return blended, rgb_mask, percentages
+
+
+def sample(width, height):
+    """A blob-shaped 3-class mask (argmax output is uint8 after the export tool, int64 before)."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width]
+    mask = np.zeros((height, width), dtype=np.int64)
+    mask[(yy - height * 0.5) ** 2 + (xx - width * 0.35) ** 2 < (height * 0.3) ** 2] = 1
+    mask[(yy - height * 0.4) ** 2 + (xx - width * 0.7) ** 2 < (height * 0.2) ** 2] = 2
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return image, mask
+
+
+def bench(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    palette = make_palette(COLOR_MAP)
+    results = {}
+    for name, (width, height) in SIZES.items():
+        image, mask = sample(width, height)
+
+        expected = loops_postprocess(image, mask)
+        got = kernels_postprocess(image, mask, palette)
+        np.testing.assert_array_equal(got[0], expected[0])
+        np.testing.assert_array_equal(got[1], expected[1])
+        assert got[2] == expected[2]
+
+        repeats = args.repeats if width * height < 1_000_000 else max(args.repeats // 10, 3)
+        loops_s = bench(lambda: loops_postprocess(image, mask), repeats)
+        kernels_s = bench(lambda: kernels_postprocess(image, mask, palette), repeats)
+        results[name] = {
+            "loops_ms": round(loops_s * 1000, 3),
+            "kernels_ms": round(kernels_s * 1000, 3),
+            "speedup": round(loops_s / kernels_s, 2),
+        }
+        print(f"{name:<10} loops {loops_s * 1000:9.3f} ms   kernels {kernels_s * 1000:9.3f} ms   "
+              f"{loops_s / kernels_s:5.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
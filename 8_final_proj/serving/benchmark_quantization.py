@@ -0,0 +1,109 @@
+"""
+FP32 Keras vs INT8 TFLite: latency, model size and mean IoU drift.
+
+    python -m serving.benchmark_quantization model.keras --dataset ../Team_TKH/dataset/cat_and_dog_dataset
+
+Quantizes the model first when ``<model>_int8.tflite`` does not exist yet
+(calibrated on the training split), then evaluates both models on the held-out
+split of :func:`serving.quantize.split_dataset` against the VOC masks in
+``SegmentationClass/``. Mean IoU is averaged over the classes present in the
+ground truth or the prediction of each image, then over images.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from serving.backends import TFLiteModel, tflite_path_for
+from serving.quantize import dataset_images, load_image, quantize_int8, split_dataset
+
+IGNORE_LABEL = 255
+
+
+def mean_iou(truth, prediction, num_classes):
+    """Mean IoU of one image over the classes present in ``truth`` or ``prediction``."""
+    valid = truth != IGNORE_LABEL
+    ious = []
+    for class_id in range(num_classes):
+        truth_c, prediction_c = (truth == class_id) & valid, (prediction == class_id) & valid
+        union = np.count_nonzero(truth_c | prediction_c)
+        if union:
+            ious.append(np.count_nonzero(truth_c & prediction_c) / union)
+    return float(np.mean(ious)) if ious else 1.0
+
+
+def load_mask(dataset_dir, image_path, size):
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    mask = Image.open(os.path.join(dataset_dir, "SegmentationClass", stem + ".png"))
+    return np.asarray(mask.resize(size, Image.NEAREST))
+
+
+def latency_ms(model, images, batch_size, repeats):
+    batch = images[:batch_size]
+    model.predict_on_batch(batch)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict_on_batch(batch)
+    return (time.perf_counter() - start) / repeats / len(batch) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help=".keras / .h5 model")
+    parser.add_argument("--dataset", required=True, help="VOC-style dataset (JPEGImages/, SegmentationClass/)")
+    parser.add_argument("--tflite", help="INT8 model (default: <model>_int8.tflite, created if missing)")
+    parser.add_argument("--samples", type=int, default=100, help="calibration photos when quantizing")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="optional JSON file for the report")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    keras_model = tf.keras.models.load_model(args.model, compile=False)
+    height, width = keras_model.input_shape[1:3]
+    num_classes = keras_model.output_shape[-1]
+    train, evaluation = split_dataset(dataset_images(args.dataset))
+
+    tflite_path = args.tflite or tflite_path_for(args.model)
+    if not os.path.exists(tflite_path):
+        step = max(len(train) // args.samples, 1)
+        calibration = [load_image(path, (width, height)) for path in train[::step][:args.samples]]
+        with open(tflite_path, "wb") as f:
+            f.write(quantize_int8(keras_model, calibration))
+    int8_model = TFLiteModel(tflite_path)
+
+    images = np.stack([load_image(path, (width, height)) for path in evaluation]).astype(np.float32) / 255.0
+    masks = [load_mask(args.dataset, path, (width, height)) for path in evaluation]
+
+    report = {
+        "eval_images": len(evaluation),
+        "size_mb": {"fp32": round(os.path.getsize(args.model) / 1e6, 2), "int8": round(os.path.getsize(tflite_path) / 1e6, 2)},
+        "latency_ms_per_image": {},
+        "mean_iou": {},
+    }
+    predictions = {}
+    for name, model in (("fp32", keras_model), ("int8", int8_model)):
+        scores = np.concatenate([model.predict_on_batch(images[i:i + 16]) for i in range(0, len(images), 16)])
+        predictions[name] = scores.argmax(axis=-1)
+        report["mean_iou"][name] = round(float(np.mean([
+            mean_iou(mask, prediction, num_classes) for mask, prediction in zip(masks, predictions[name])
+        ])), 4)
+        report["latency_ms_per_image"][name] = {
+            f"batch_{batch_size}": round(latency_ms(model, images, batch_size, args.repeats), 2)
+            for batch_size in (1, 16)
+        }
+    report["mean_iou"]["drift"] = round(report["mean_iou"]["int8"] - report["mean_iou"]["fp32"], 4)
+    report["mask_agreement"] = round(float(np.mean(predictions["fp32"] == predictions["int8"])), 4)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
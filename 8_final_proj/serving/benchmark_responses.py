@@ -0,0 +1,109 @@
+"""
+Payload size and serialization time of the /segment response encodings.
+
+    python -m serving.benchmark_responses --repeats 50 --output responses.json
+
+Builds a team_mdy-style result (overlay, colored mask and class mask PNGs of a
+synthetic photo) at 128x128 and 1024x1024 and serializes it as base64 JSON,
+multipart/mixed and MessagePack, for all three images and for the palette mask
+alone, plus the bare palette PNG. PNG encoding is timed separately since every
+encoding pays it.
+"""
+
+import argparse
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from serving.postprocess import blend, colorize, make_palette
+from serving.responses import JSON, MSGPACK, MULTIPART, encode_payload, palette_png
+
+SIZES = {"128x128": 128, "1024x1024": 1024}
+PALETTE = make_palette({0: (0, 0, 0), 1: (255, 0, 0), 2: (0, 255, 0)})
+
+
+def sample(size):
+    """Smooth synthetic photo and a two-blob 3-class mask."""
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    rng = np.random.default_rng(0)
+    photo = np.stack([xx * 200, yy * 180, (xx + yy) * 100], axis=-1) + rng.normal(0, 8, (size, size, 3))
+    photo = np.clip(photo, 0, 255).astype(np.uint8)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    mask[(yy - 0.5) ** 2 + (xx - 0.35) ** 2 < 0.06] = 1
+    mask[(yy - 0.4) ** 2 + (xx - 0.75) ** 2 < 0.02] = 2
+    return photo, mask
+
+
+def png(array):
+    buf = io.BytesIO()
+    Image.fromarray(array).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def bench(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    media_types = {"json_base64": JSON, "multipart": MULTIPART}
+    try:
+        import msgpack  # noqa: F401
+        media_types["msgpack"] = MSGPACK
+    except ImportError:
+        print("msgpack not installed, skipping MessagePack")
+
+    results = {}
+    for name, size in SIZES.items():
+        photo, mask = sample(size)
+        colored = colorize(mask, PALETTE)
+        overlay = blend(photo, colored, 0.4)
+
+        timings = {
+            "png_overlay": bench(lambda: png(overlay), args.repeats),
+            "png_colored_mask": bench(lambda: png(colored), args.repeats),
+            "png_palette_mask": bench(lambda: palette_png(mask, PALETTE, 3), args.repeats),
+        }
+        images = {"overlay_image": png(overlay), "colored_mask_image": png(colored), "mask_image": palette_png(mask, PALETTE, 3)}
+        summary = {"class_percentages": {0: 70, 1: 21, 2: 9}, "detected_classes": [{"class_id": 1, "label": "Dog"}]}
+        payloads = {
+            "all": {"results": [{**images, **summary}], "execution_time_ms": 12, "model_version": "1.0"},
+            "mask_only": {"results": [{"mask_image": images["mask_image"], **summary}],
+                          "execution_time_ms": 12, "model_version": "1.0"},
+        }
+
+        sizes = {"png_bytes": {key: len(data) for key, data in images.items()}}
+        for payload_name, payload in payloads.items():
+            for encoding, media_type in media_types.items():
+                key = f"{payload_name}_{encoding}"
+                timings[key] = bench(lambda: encode_payload(payload, media_type), args.repeats)
+                sizes[key] = len(encode_payload(payload, media_type)[0])
+        sizes["png_palette_mask"] = len(images["mask_image"])
+
+        results[name] = {
+            "bytes": sizes,
+            "ms": {key: round(seconds * 1000, 3) for key, seconds in timings.items()},
+        }
+        print(name)
+        for key, value in sizes.items():
+            if key != "png_bytes":
+                print(f"  {key:<24} {value:>9} B  {timings.get(key, 0) * 1000:8.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
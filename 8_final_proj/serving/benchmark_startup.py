@@ -0,0 +1,78 @@
+"""
+Cold start and first-request latency of an app, with and without the startup warm-up.
+
+    # from 8_final_proj/
+    python -m serving.benchmark_startup team_mdy --env MODEL_PATH=/path/to/model.keras
+    python -m serving.benchmark_startup t9 --env MODEL_PATH=/path/to/model.keras --burst 5 --output runs/startup.json
+
+Each variant starts the app as a uvicorn subprocess (``serving.loadtest.SubprocessApp``)
+and waits for ``/health/ready``; ``cold_start_s`` is spawn to ready as the client sees
+it. Then it sends one request (``first_ms``), a second one (``second_ms``) and a burst
+of ``--burst`` concurrent requests, which the micro-batcher turns into a batch size
+not seen before (``burst_max_ms``). "cold" sets ``WARMUP_BATCH_SIZES=`` (no warm-up),
+"warm" uses the app's default warm-up.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from serving.loadtest import TARGETS, SubprocessApp, load_images, parse_env, request_kwargs
+
+
+async def first_requests(url, target, images, burst):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+
+        async def send(i):
+            start = time.perf_counter()
+            response = await client.request(target.method, target.path, **request_kwargs(target, images, i))
+            response.raise_for_status()
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        first = await send(0)
+        second = await send(1)
+        burst_ms = await asyncio.gather(*(send(2 + i) for i in range(burst)))
+        health = (await client.get("/health")).json()
+    return {"first_ms": first, "second_ms": second, "burst_max_ms": max(burst_ms), "server": health}
+
+
+def run_variant(target, env, images, burst):
+    start = time.perf_counter()
+    with SubprocessApp(target, env) as app:
+        cold_start_s = round(time.perf_counter() - start, 2)
+        result = asyncio.run(first_requests(app.url, target, images, burst))
+    return {"cold_start_s": cold_start_s, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=["team_mdy", "t9"])
+    parser.add_argument("--env", action="append", metavar="NAME=VALUE", help="environment of the app (repeatable)")
+    parser.add_argument("--burst", type=int, default=3, help="concurrent requests after the first two")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    target = TARGETS[args.target]
+    images = load_images()
+    env = parse_env(args.env)
+    results = {
+        "cold": run_variant(target, {**env, "WARMUP_BATCH_SIZES": ""}, images, args.burst),
+        "warm": run_variant(target, env, images, args.burst),
+    }
+
+    print(f"{'':6} {'cold start':>11} {'first':>9} {'second':>9} {'burst max':>10}")
+    for name, r in results.items():
+        print(f"{name:6} {r['cold_start_s']:>9.1f} s {r['first_ms']:>6.0f} ms {r['second_ms']:>6.0f} ms "
+              f"{r['burst_max_ms']:>7.0f} ms")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"target": args.target, "env": env, **results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Throughput of tiled inference on CPU.
+
+    python -m serving.benchmark_tiling --model team_mdy/dog_cat_segmentation/model/cat_dog_segmentation_unet.keras
+    python -m serving.benchmark_tiling --width 2048 --height 1536 --output tiling.json
+
+Runs ``iter_mask_strips`` over a synthetic photo for each tile size / batch size
+and reports tiles per second, megapixels per second and the peak memory of the
+score accumulators (numpy allocations, via tracemalloc) next to what a
+full-size score map would take. Without ``--model`` a small randomly
+initialized 128x128 U-Net of the same layout as the team models is used.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from serving.tiling import iter_mask_strips, keras_predict_fn, tile_origins
+
+
+def small_unet(size=128, num_classes=3):
+    import tensorflow as tf
+    from tensorflow.keras import layers
+
+    inputs = tf.keras.Input((size, size, 3))
+    skips, x = [], inputs
+    for filters in (16, 32, 64):
+        x = layers.Conv2D(filters, 3, padding="same", activation="relu")(x)
+        skips.append(x)
+        x = layers.MaxPooling2D()(x)
+    x = layers.Conv2D(128, 3, padding="same", activation="relu")(x)
+    for filters, skip in zip((64, 32, 16), reversed(skips)):
+        x = layers.Conv2DTranspose(filters, 3, strides=2, padding="same")(x)
+        x = layers.Concatenate()([x, skip])
+        x = layers.Conv2D(filters, 3, padding="same", activation="relu")(x)
+    outputs = layers.Conv2D(num_classes, 1, activation="softmax")(x)
+    return tf.keras.Model(inputs, outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--model", help=".keras model; a small random U-Net when omitted")
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=1536)
+    parser.add_argument("--tiles", type=int, nargs="+", default=[128, 256])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--output", help="optional JSON file for the results")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.model, compile=False) if args.model else small_unet()
+    model_size = model.input_shape[1]
+    predict = keras_predict_fn(model)
+    num_classes = model.output_shape[-1] if len(model.output_shape) == 4 else 3
+
+    yy, xx = np.mgrid[0:args.height, 0:args.width]
+    image = np.stack([xx % 256, yy % 256, (xx + yy) % 256], axis=-1).astype(np.uint8)
+    predict(np.zeros((1, model_size, model_size, 3), dtype=np.uint8))  # build the graph
+
+    full_map_mb = args.height * args.width * num_classes * 4 / 1e6
+    results = {"image": [args.width, args.height], "model_size": model_size, "full_score_map_mb": round(full_map_mb, 1),
+               "runs": []}
+    print(f"{args.width}x{args.height}, model input {model_size}, full score map would be {full_map_mb:.0f} MB")
+
+    for tile in args.tiles:
+        stride = tile - args.overlap
+        tiles = len(tile_origins(args.height, tile, stride)) * len(tile_origins(args.width, tile, stride))
+        for batch_size in args.batch_sizes:
+            tracemalloc.start()
+            start = time.perf_counter()
+            for _ in iter_mask_strips(predict, image, tile=tile, overlap=args.overlap, model_size=model_size,
+                                      batch_size=batch_size, num_classes=num_classes):
+                pass
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            run = {
+                "tile": tile, "batch_size": batch_size, "tiles": tiles, "seconds": round(seconds, 3),
+                "tiles_per_s": round(tiles / seconds, 1),
+                "megapixels_per_s": round(args.width * args.height / 1e6 / seconds, 2),
+                "peak_numpy_mb": round(peak / 1e6, 1),
+            }
+            results["runs"].append(run)
+            print(f"tile {tile:>4} batch {batch_size:>3}: {tiles} tiles in {seconds:.2f} s, "
+                  f"{run['tiles_per_s']} tiles/s, {run['megapixels_per_s']} MP/s, peak {run['peak_numpy_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Content-addressed response cache for the segmentation endpoints.
+
+Clients often upload the same photo again (retries, thumbnails, /compare
+flows). The cache key is a hash of the raw upload bytes plus the model
+version and every request parameter that changes the output, so a repeat
+upload skips decode, resize, ``model.predict`` and PNG encoding.
+
+- in-process LRU tier with a byte budget,
+- optional on-disk tier (``disk_dir``) that survives restarts,
+- concurrent requests for the same key share one computation.
+"""
+
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+
+def make_key(data, model_version, **params):
+    """Build a cache key from the raw upload bytes, the model version and request parameters.
+
+    Args:
+        data (bytes): Raw uploaded bytes, hashed as-is (no decoding).
+        model_version (str): Anything that changes when the served weights change.
+        **params: Request parameters that affect the output (alpha, threshold, mask_type, ...).
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256(data)
+    digest.update(b"\0")
+    digest.update(json.dumps({"model_version": model_version, **params}, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def model_file_version(path):
+    """A model version string that changes when the model file is replaced."""
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _sizeof(value):
+    return len(value) if isinstance(value, (bytes, bytearray)) else len(pickle.dumps(value))
+
+
+class ResponseCache:
+    """LRU cache of computed responses, with single-flight computation per key."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Budget for the in-process tier.
+            disk_dir (str | None): Directory for the on-disk tier, ``None`` disables it.
+            disk_max_bytes (int): Budget for the on-disk tier.
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._entries = collections.OrderedDict()  # key -> (value, size)
+        self._inflight = {}                        # key -> asyncio.Task
+        self._disk_lock = threading.Lock()
+        self.bytes = 0
+        self.disk_bytes = 0
+
+        self.counters = collections.Counter(
+            hits=0, disk_hits=0, misses=0, coalesced=0, evictions=0, disk_evictions=0, errors=0
+        )
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from ``RESPONSE_CACHE_MB``, ``RESPONSE_CACHE_DIR`` and ``RESPONSE_CACHE_DISK_MB``."""
+        return cls(
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MB", 64)) * 1024 * 1024,
+            disk_dir=os.getenv("RESPONSE_CACHE_DIR") or None,
+            disk_max_bytes=int(os.getenv("RESPONSE_CACHE_DISK_MB", 1024)) * 1024 * 1024,
+        )
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached value for ``key``, or await ``compute()`` once and cache its result.
+
+        Args:
+            key (str): Key from :func:`make_key`.
+            compute (callable): Zero-argument callable returning an awaitable of the value
+                                (``bytes`` or any picklable object).
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return self._entries[key][0]
+
+        if key in self._inflight:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        # The computation runs in its own task and every caller, the first one included, only
+        # waits on it: a client that disconnects cancels its own wait, not the shared work.
+        task = asyncio.ensure_future(self._compute(key, compute))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._computed(key, done))
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        value = await self._disk_get(key) if self.disk_dir else None
+        if value is not None:
+            self.counters["disk_hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            value = await compute()
+            if self.disk_dir:
+                await asyncio.to_thread(self._disk_put, key, value)
+        self._put(key, value)
+        return value
+
+    def _computed(self, key, task):
+        del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # also marks the exception as retrieved when every caller went away
+            self.counters["errors"] += 1
+
+    def _put(self, key, value):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.counters["evictions"] += 1
+
+    # -----------------------------
+    # on-disk tier
+    # -----------------------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue  # being written by _disk_put
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    async def _disk_get(self, key):
+        return await asyncio.to_thread(self._disk_read, key)
+
+    def _disk_read(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # a truncated or stale file is treated as a miss
+            return None
+        os.utime(path)  # mtime doubles as the disk tier's LRU clock
+        return value
+
+    def _disk_put(self, key, value):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f)
+
+        # runs on worker threads: the byte count and eviction are shared state
+        with self._disk_lock:
+            try:
+                self.disk_bytes -= os.path.getsize(path)  # replacing an existing entry
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self.disk_bytes += os.path.getsize(path)
+
+            if self.disk_bytes > self.disk_max_bytes:
+                for old_path, size, _ in sorted(self._disk_files(), key=lambda item: item[2]):
+                    if self.disk_bytes <= self.disk_max_bytes:
+                        break
+                    if old_path == path:
+                        continue
+                    try:
+                        os.remove(old_path)
+                    except FileNotFoundError:
+                        continue
+                    self.disk_bytes -= size
+                    self.counters["disk_evictions"] += 1
+
+    def stats(self):
+        lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "hit_rate": round((self.counters["hits"] + self.counters["disk_hits"]) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "disk_dir": self.disk_dir,
+            "disk_bytes": self.disk_bytes,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,145 @@
+"""
+Per-class polygons of a predicted mask, as LabelMe JSON.
+
+Clients that only draw outlines do not need the overlay / mask PNGs. Each class
+of the mask is traced with ``cv2.findContours``, simplified with
+``cv2.approxPolyDP`` and returned as LabelMe ``polygon`` shapes, so the response
+can be opened in labelme or fed to the labelme -> VOC converters as a
+pre-annotation.
+
+LabelMe polygons cannot have holes. A hole (e.g. background between a cat's
+legs) is emitted as a ``_background_`` polygon, and all shapes are ordered by
+area, largest first. Filling the shapes in order, as ``labelme2voc.py`` does,
+then paints a hole after the object around it and an object after the hole it
+sits in.
+"""
+
+import cv2
+import numpy as np
+
+LABELME_VERSION = "4.0.0"
+BACKGROUND_LABEL = "_background_"
+
+
+def _has_diagonal_pinch(binary):
+    """True if two pixels touch only at a corner (a 2x2 checkerboard), where 4- and 8-connectivity differ."""
+    top_left, top_right = binary[:-1, :-1], binary[:-1, 1:]
+    bottom_left, bottom_right = binary[1:, :-1], binary[1:, 1:]
+    return bool(np.any((top_left == bottom_right) & (top_right == bottom_left) & (top_left != top_right)))
+
+
+def _top_level_contours(binary, offset=(0, 0)):
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+    if hierarchy is None:
+        return []
+    return [contour for contour, (_, _, _, parent) in zip(contours, hierarchy[0]) if parent == -1]
+
+
+def _component_contours(binary):
+    """Outer outline of each 4-connected component of ``binary``.
+
+    Regions of one class that only touch diagonally can sit on both sides of another class's outline;
+    traced together (``findContours`` is 8-connected) their single polygon would be painted in the
+    wrong order, so they are traced one component at a time.
+    """
+    if not _has_diagonal_pinch(binary):
+        # 4- and 8-connected components are the same; islands in holes are top-level in RETR_CCOMP
+        return _top_level_contours(binary)
+
+    count, components, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=4)
+    outlines = []
+    for component in range(1, count):
+        x, y, w, h = stats[component, :4]
+        piece = (components[y:y + h, x:x + w] == component).astype(np.uint8)
+        contours, _ = cv2.findContours(piece, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(int(x), int(y)))
+        outlines += contours
+    return outlines
+
+
+def _hole_contours(binary):
+    """Outlines of the holes themselves (the enclosed background pixels, not the object pixels around them).
+
+    Holes are the 4-connected background components that do not touch the image border: the pixels a
+    polygon fill of the outer outline paints although they are not part of the object. The inverse mask
+    is padded with a ring of ones to merge all border background into one frame component, the outline
+    starting at the corner.
+    """
+    inverse = np.pad((binary == 0).astype(np.uint8), 1, constant_values=1)
+    return [
+        contour - 1 for contour in _component_contours(inverse)
+        if cv2.boundingRect(contour)[:2] != (0, 0)
+    ]
+
+
+def mask_to_shapes(mask, labels, tolerance=1.0, image_size=None, holes=True):
+    """Trace every non-background class of ``mask`` into LabelMe polygon shapes.
+
+    Args:
+        mask (numpy.ndarray): (H, W) class mask.
+        labels (dict): ``{class_id: label}``; classes not listed (and class 0) are skipped.
+                       Use the names of the dataset's ``labels.txt`` to reuse the output as annotations.
+        tolerance (float): Maximum distance, in output-image pixels, between the simplified polygon and
+                           the traced outline (``cv2.approxPolyDP`` epsilon). 0 keeps every corner.
+        image_size (tuple[int, int] | None): (width, height) the points are scaled to, e.g. the size of the
+                                             upload when the mask is at the model resolution.
+        holes (bool): Emit holes as ``_background_`` polygons.
+
+    Returns:
+        list[dict]: LabelMe shapes, largest first; polygons that simplify to fewer than 3 points are dropped.
+    """
+    mask = np.asarray(mask)
+    height, width = mask.shape[:2]
+    out_width, out_height = image_size if image_size is not None else (width, height)
+    scale = np.array([out_width / width, out_height / height])
+    epsilon = tolerance / scale.max()
+
+    traced = []
+    for class_id, label in labels.items():
+        if class_id == 0:
+            continue
+        binary = (mask == class_id).astype(np.uint8)
+        if not binary.any():
+            continue
+        traced += [(label, contour) for contour in _component_contours(binary)]
+        if holes:
+            traced += [(BACKGROUND_LABEL, contour) for contour in _hole_contours(binary)]
+
+    # largest first; a hole goes before an object of the same area (e.g. a cat filling a hole in a dog)
+    traced.sort(key=lambda item: (-cv2.contourArea(item[1]), item[0] != BACKGROUND_LABEL))
+
+    shapes = []
+    for label, contour in traced:
+        if epsilon > 0:
+            contour = cv2.approxPolyDP(contour, epsilon, True)
+        if len(contour) < 3:
+            continue
+        # pixel centers at mask resolution -> pixel coordinates of the output image
+        points = (contour.reshape(-1, 2) + 0.5) * scale - 0.5
+        shapes.append({
+            "label": label,
+            "points": np.round(points, 2).tolist(),
+            "group_id": None,
+            "shape_type": "polygon",
+            "flags": {},
+        })
+    return shapes
+
+
+def labelme_document(shapes, image_size, image_path=None):
+    """Wrap shapes into a LabelMe annotation file (``imageData`` is left out, the client has the image).
+
+    Args:
+        shapes (list[dict]): From :func:`mask_to_shapes`.
+        image_size (tuple[int, int]): (width, height) of the annotated image.
+        image_path (str | None): File name stored in ``imagePath``.
+    """
+    width, height = image_size
+    return {
+        "version": LABELME_VERSION,
+        "flags": {},
+        "shapes": shapes,
+        "imagePath": image_path,
+        "imageData": None,
+        "imageHeight": int(height),
+        "imageWidth": int(width),
+    }
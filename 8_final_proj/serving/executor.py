@@ -0,0 +1,134 @@
+"""
+Stage executors that keep blocking work off the asyncio event loop.
+
+Each request goes through three CPU-heavy stages: decode (PIL / OpenCV image
+decoding and resizing), inference (``model.predict`` or a blocking client
+call) and encode (colorizing, blending, PNG encoding). ``StageExecutor``
+gives every stage its own sized pool so a slow model call cannot starve
+decoding, and a slow request cannot freeze the event loop (and with it the
+health checks).
+
+The pools are thread pools. The stage work is bound methods of loaded models
+(``model.preprocess_image``), which a process pool would have to pickle along
+with the model, and the heavy parts (PIL, OpenCV, NumPy, TensorFlow) release
+the GIL anyway.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+
+class StagePool(Executor):
+    """A thread pool that counts pending work so saturation can be reported.
+
+    ``StagePool`` is itself a ``concurrent.futures.Executor``, so it can be handed to
+    ``loop.run_in_executor`` or to ``MicroBatcher(executor=...)`` directly.
+    """
+
+    def __init__(self, name, max_workers):
+        """
+        Args:
+            name (str): Stage name used in thread names and stats.
+            max_workers (int): Pool size.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-stage")
+
+        self.name = name
+        self.max_workers = max_workers
+
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.peak_pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_latency_s = 0.0
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        started = time.perf_counter()
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(functools.partial(self._on_done, started))
+        return future
+
+    def _on_done(self, started, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            self.total_latency_s += time.perf_counter() - started
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on this pool and await the result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self, functools.partial(fn, *args, **kwargs))
+
+    def stats(self):
+        """Pool size, busy/queued work and saturation (busy workers / pool size)."""
+        with self._lock:
+            pending = self.pending
+            busy = min(pending, self.max_workers)
+            return {
+                "max_workers": self.max_workers,
+                "busy": busy,
+                "queued": pending - busy,
+                "saturation": round(busy / self.max_workers, 3),
+                "peak_pending": self.peak_pending,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "mean_latency_ms": round(self.total_latency_s * 1000.0 / self.completed, 3) if self.completed else 0.0,
+            }
+
+
+class StageExecutor:
+    """Separate, sized pools for the decode, inference and encode stages."""
+
+    def __init__(self, decode_workers=None, inference_workers=1, encode_workers=None):
+        """
+        Args:
+            decode_workers (int | None): Decode pool size, defaults to the core count.
+            inference_workers (int): Inference pool size. Keep it small: TensorFlow and
+                                     torch already spread one forward pass over all cores.
+            encode_workers (int | None): Encode pool size, defaults to the core count.
+        """
+        cpu_count = os.cpu_count() or 1
+        self.cpu_count = cpu_count
+        self.decode = StagePool("decode", decode_workers or cpu_count)
+        self.inference = StagePool("inference", inference_workers)
+        self.encode = StagePool("encode", encode_workers or cpu_count)
+
+    @classmethod
+    def from_env(cls):
+        """Build the executor from ``DECODE_WORKERS``, ``INFERENCE_WORKERS`` and ``ENCODE_WORKERS``."""
+        def workers(name, default):
+            value = os.getenv(name)
+            return int(value) if value else default
+
+        return cls(
+            decode_workers=workers("DECODE_WORKERS", None),
+            inference_workers=workers("INFERENCE_WORKERS", 1),
+            encode_workers=workers("ENCODE_WORKERS", None),
+        )
+
+    def stats(self):
+        return {
+            "cpu_count": self.cpu_count,
+            "stages": {pool.name: pool.stats() for pool in (self.decode, self.inference, self.encode)},
+        }
+
+    def shutdown(self, wait=True):
+        for pool in (self.decode, self.inference, self.encode):
+            pool.shutdown(wait=wait)
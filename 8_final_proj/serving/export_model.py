@@ -0,0 +1,85 @@
+"""
+Export a trained U-Net as a serving model with uint8 input and uint8 output.
+
+Every app repeats the same steps around ``model.predict``: resize to 128x128,
+divide by 255 into a float array, predict, then ``argmax`` the float32
+(N, 128, 128, C) output. The exported model does all of that in the graph:
+
+    raw uint8 (N, H, W, 3)  ->  Resizing -> round -> Rescaling(1/255) -> U-Net -> argmax  ->  uint8 (N, 128, 128)
+
+so the app hands over decoded pixels and gets the class mask back, without
+the float copies in Python and with a 4 * C times smaller output.
+
+    python -m serving.export_model T9/cat_dog_segmentation_unet.keras T9/cat_dog_segmentation_served.keras --no-antialias
+
+Pixels must be in the channel order the model was trained on (RGB for PIL
+apps, BGR for apps that decode with OpenCV); the graph does not reorder them.
+"""
+
+import argparse
+
+import numpy as np
+import tensorflow as tf
+
+keras = tf.keras
+
+
+def build_serving_model(model, image_size=None, antialias=True):
+    """Wrap ``model`` with in-graph preprocessing and an argmax head.
+
+    Args:
+        model (keras.Model): Trained segmentation model, float input in [0, 1], per-class scores out.
+        image_size (tuple[int, int] | None): (height, width) the model expects. Defaults to the model's input shape.
+        antialias (bool): ``True`` matches PIL ``Image.resize`` (team_mdy, TeamMMT, ...),
+                          ``False`` matches ``cv2.resize`` with ``INTER_LINEAR`` (T9).
+
+    Returns:
+        keras.Model: Takes uint8 (N, H, W, 3) of any H, W and returns uint8 (N, height, width) class masks.
+    """
+    if image_size is None:
+        image_size = tuple(model.input_shape[1:3])
+    height, width = image_size
+
+    inputs = keras.Input(shape=(None, None, 3), dtype="uint8", name="image")
+    x = keras.ops.cast(inputs, "float32")
+    x = keras.layers.Resizing(height, width, interpolation="bilinear", antialias=antialias, name="resize")(x)
+    # the Python path resizes uint8 images, so the resized pixels are whole numbers
+    x = keras.ops.clip(keras.ops.round(x), 0.0, 255.0)
+    x = keras.layers.Rescaling(1.0 / 255, name="rescale")(x)
+    scores = model(x)
+    mask = keras.ops.cast(keras.ops.argmax(scores, axis=-1), "uint8")
+
+    return keras.Model(inputs, mask, name=f"{model.name}_served")
+
+
+def is_served_model(model):
+    """True for a model produced by :func:`build_serving_model` (uint8 pixels in, class mask out)."""
+    return model.inputs[0].dtype == "uint8"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help="trained .keras / .h5 model")
+    parser.add_argument("output", help="output .keras file")
+    parser.add_argument("--height", type=int, help="model input height (default: from the model)")
+    parser.add_argument("--width", type=int, help="model input width (default: from the model)")
+    parser.add_argument("--no-antialias", action="store_true", help="resize like cv2.resize instead of PIL")
+    parser.add_argument("--saved-model", help="also export a TF SavedModel to this directory (TF Serving)")
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model, compile=False)
+    image_size = (args.height, args.width) if args.height and args.width else None
+    served = build_serving_model(model, image_size=image_size, antialias=not args.no_antialias)
+    served.save(args.output)
+    print(f"saved {args.output}: uint8 {served.input_shape} -> uint8 {served.output_shape}")
+
+    if args.saved_model:
+        served.export(args.saved_model)
+
+    # sanity check on a random image
+    sample = np.random.randint(0, 256, (1, 300, 400, 3), dtype=np.uint8)
+    print("sample output:", served.predict(sample, verbose=0).shape, served.predict(sample, verbose=0).dtype)
+
+
+if __name__ == "__main__":
+    main()
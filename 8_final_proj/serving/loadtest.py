@@ -0,0 +1,477 @@
+"""
+Load tests for the team APIs: throughput, tail latency, CPU and memory under a controlled load.
+
+    # from 8_final_proj/
+    python -m serving.loadtest team_mdy --env MODEL_PATH=/path/to/model.keras --concurrency 8 --duration 30
+    python -m serving.loadtest team_mdy --mode open --rate 20 --duration 30 --output runs/team_mdy.json
+    python -m serving.loadtest sample_fastapi_text --concurrency 16 --requests 500
+    python -m serving.loadtest t9 --url http://localhost:8000 --baseline runs/t9_main.json
+
+The target app is started as a uvicorn subprocess (default, its CPU and RSS
+are sampled with psutil), imported in-process (``--launch inprocess``: CPU and
+RSS then include the load generator), or not started at all with ``--url``.
+Text targets get a :class:`serving.stub_openai.StubOpenAIServer` through
+``OPENAI_BASE_URL``, so nothing goes to the network.
+
+Load models:
+
+- closed loop (``--mode closed``): ``--concurrency`` clients, each sending its next
+  request as soon as the previous one returns. Measures capacity.
+- open loop (``--mode open``): requests start at ``--rate`` per second (Poisson
+  arrivals) whether or not earlier ones finished. Latency is measured from the
+  scheduled start, so a server that falls behind is not hidden by the client
+  slowing down (coordinated omission).
+
+Images are the photos in ``4_image_processing_techniques/test_imgs``, sent in
+turn. The JSON report carries the git commit, so ``--baseline`` can diff runs
+across commits.
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import glob
+import importlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from serving.stub_openai import StubOpenAIServer
+
+FINAL_PROJ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+REPO_ROOT = os.path.dirname(FINAL_PROJ)
+TEST_IMAGES = os.path.join(REPO_ROOT, "4_image_processing_techniques", "test_imgs")
+
+PROMPTS = ["What is deep learning", "Tell me about cats and dogs", "Why is the sky blue", "Explain batching"]
+
+# app_dir is relative to 8_final_proj/; payload is "file" (multipart upload), "base64" (JSON with a
+# base64 image) or "prompt" (JSON text prompt, served through the stub OpenAI server)
+Target = namedtuple("Target", ["app_dir", "app", "method", "path", "payload", "field", "ready_path"])
+
+TARGETS = {
+    "team_mdy": Target("team_mdy/dog_cat_segmentation", "main:app", "POST", "/segment-file", "file", "file",
+                       "/health/ready"),
+    "t9": Target("T9", "main:app", "POST", "/predict", "file", "file", "/health/ready"),
+    "sample_fastapi_text": Target("../7_Containerization_And_Deployment/sample_fastapi", "main:app", "POST",
+                                  "/text_generation", "prompt", "prompt", "/health/ready"),
+    "sample_fastapi_predict": Target("../7_Containerization_And_Deployment/sample_fastapi", "main:app", "POST",
+                                     "/predict", "base64", "image", "/health/ready"),
+    "temp_text": Target("../7_Containerization_And_Deployment/temp", "main:app", "POST", "/text_generation",
+                        "prompt", "prompt", "/"),
+}
+
+
+def load_images(directory=TEST_IMAGES):
+    """(name, bytes, content type) of the JPEG / PNG files in ``directory``, sorted by name."""
+    images = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in (".jpg", ".jpeg", ".png"):
+            with open(path, "rb") as f:
+                images.append((os.path.basename(path), f.read(), "image/png" if extension == ".png" else "image/jpeg"))
+    if not images:
+        raise FileNotFoundError(f"No .jpg / .png images in {directory}")
+    return images
+
+
+def request_kwargs(target, images, i):
+    """httpx keyword arguments for the ``i``-th request of ``target``."""
+    if target.payload == "prompt":
+        return {"json": {target.field: PROMPTS[i % len(PROMPTS)]}}
+    name, data, content_type = images[i % len(images)]
+    if target.payload == "file":
+        return {"files": {target.field: (name, data, content_type)}}
+    if target.payload == "base64":
+        return {"json": {target.field: base64.b64encode(data).decode(), "class_name": ""}}
+    raise ValueError(f"Unknown payload kind {target.payload!r}")
+
+
+def latency_summary(latencies_s):
+    if not latencies_s:
+        return {}
+    ms = np.asarray(latencies_s) * 1000.0
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"mean": round(float(ms.mean()), 2), "p50": round(float(p50), 2), "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2), "max": round(float(ms.max()), 2)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=FINAL_PROJ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ResourceSampler:
+    """CPU time and resident memory of a process and its children, sampled on a background thread."""
+
+    def __init__(self, pid, interval_s=0.2):
+        import psutil
+
+        self._psutil = psutil
+        self._process = psutil.Process(pid)
+        self.interval_s = interval_s
+        self.rss_samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _processes(self):
+        try:
+            return [self._process] + self._process.children(recursive=True)
+        except self._psutil.NoSuchProcess:
+            return []
+
+    def _cpu_seconds(self):
+        total = 0.0
+        for process in self._processes():
+            try:
+                times = process.cpu_times()
+                total += times.user + times.system
+            except self._psutil.NoSuchProcess:
+                pass
+        return total
+
+    def _rss_bytes(self):
+        total = 0
+        for process in self._processes():
+            try:
+                total += process.memory_info().rss
+            except self._psutil.NoSuchProcess:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.rss_samples.append(self._rss_bytes())
+
+    def start(self):
+        self._start_cpu = self._cpu_seconds()
+        self._start_wall = time.perf_counter()
+        self.rss_samples = [self._rss_bytes()]
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        cpu = self._cpu_seconds() - self._start_cpu
+        wall = time.perf_counter() - self._start_wall
+        self.rss_samples.append(self._rss_bytes())
+        return {
+            # 100% = one core busy for the whole run
+            "cpu_percent": round(100.0 * cpu / wall, 1) if wall else 0.0,
+            "cpu_seconds": round(cpu, 2),
+            "rss_mb": {"start": round(self.rss_samples[0] / 1e6, 1), "peak": round(max(self.rss_samples) / 1e6, 1),
+                       "end": round(self.rss_samples[-1] / 1e6, 1)},
+        }
+
+
+def wait_until_ready(url, timeout_s, alive=lambda: True, interval_s=0.5):
+    """Poll ``url`` until it answers 200; False on timeout or when ``alive()`` turns false.
+
+    Only 200 counts: a 404 (wrong path) or a 503 (still loading) is not ready.
+    """
+    import httpx
+
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline and alive():
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(interval_s)
+    return False
+
+
+class SubprocessApp:
+    """``uvicorn <app>`` started in the app's folder on a free port."""
+
+    def __init__(self, target, env=None, startup_timeout_s=300):
+        self.target = target
+        self.env = env or {}
+        self.startup_timeout_s = startup_timeout_s
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+
+    def __enter__(self):
+        self._log = tempfile.TemporaryFile(mode="w+")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", self.target.app, "--host", "127.0.0.1", "--port", str(self.port),
+             "--log-level", "warning"],
+            cwd=os.path.join(FINAL_PROJ, self.target.app_dir), env={**os.environ, **self.env},
+            stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        if wait_until_ready(self.url + self.target.ready_path, self.startup_timeout_s,
+                            alive=lambda: self.process.poll() is None):
+            return self
+        self._log.seek(0)
+        log = self._log.read()[-3000:]
+        self.__exit__()
+        raise RuntimeError(f"{self.target.app} in {self.target.app_dir} did not become ready:\n{log}")
+
+    def __exit__(self, *exc_info):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+
+class InProcessApp:
+    """The app imported into this process and served by uvicorn on a background thread."""
+
+    def __init__(self, target, env=None, startup_timeout_s=300):
+        self.target = target
+        self.env = env or {}
+        self.startup_timeout_s = startup_timeout_s
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = None
+
+    def __enter__(self):
+        import uvicorn
+
+        os.environ.update(self.env)
+        app_dir = os.path.join(FINAL_PROJ, self.target.app_dir)
+        # the apps resolve model paths and their own modules relative to their folder
+        self._cwd = os.getcwd()
+        os.chdir(app_dir)
+        sys.path.insert(0, app_dir)
+        module_name, attribute = self.target.app.split(":")
+        app = getattr(importlib.import_module(module_name), attribute)
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self.server.run, name="uvicorn", daemon=True)
+        self._thread.start()
+        if not wait_until_ready(self.url + self.target.ready_path, self.startup_timeout_s,
+                                alive=self._thread.is_alive):
+            self.__exit__()
+            raise RuntimeError(f"{self.target.app} in {self.target.app_dir} did not become ready")
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self._thread.join(timeout=15)
+        os.chdir(self._cwd)
+
+
+async def run_load(url, target, images, mode="closed", concurrency=8, rate=10.0, requests=None, duration_s=None,
+                   warmup=5, timeout_s=120.0, seed=0):
+    """Drive ``url`` with a closed- or open-loop load.
+
+    Args:
+        url (str): Base URL of the running app.
+        target (Target): Endpoint and payload to send.
+        images (list): From :func:`load_images`.
+        mode (str): ``"closed"`` (``concurrency`` clients back to back) or ``"open"`` (Poisson arrivals at ``rate``/s).
+        requests (int | None): Stop after this many requests.
+        duration_s (float | None): Stop starting requests after this many seconds (one of the two is needed).
+        warmup (int): Requests sent (one at a time) and discarded before measuring.
+        seed (int): Seed of the open-loop arrival times.
+
+    Returns:
+        dict: requests, errors, status codes, throughput and latency percentiles.
+    """
+    import httpx
+
+    if requests is None and duration_s is None:
+        raise ValueError("Pass requests or duration_s")
+    latencies, statuses, errors = [], Counter(), Counter()
+    counter = iter(range(1 << 62))
+    endpoint = url + target.path
+
+    limits = httpx.Limits(max_connections=None if mode == "open" else concurrency, max_keepalive_connections=64)
+    async with httpx.AsyncClient(timeout=timeout_s, limits=limits) as client:
+        for i in range(warmup):
+            await client.request(target.method, endpoint, **request_kwargs(target, images, i))
+
+        async def send(i, scheduled):
+            try:
+                response = await client.request(target.method, endpoint, **request_kwargs(target, images, i))
+                await response.aread()
+                statuses[response.status_code] += 1
+                if response.status_code < 400:
+                    latencies.append(time.perf_counter() - scheduled)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        deadline = start + duration_s if duration_s else float("inf")
+
+        if mode == "closed":
+            async def client_loop():
+                while time.perf_counter() < deadline:
+                    i = next(counter)
+                    if requests is not None and i >= requests:
+                        return
+                    await send(i, time.perf_counter())
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elif mode == "open":
+            rng = random.Random(seed)
+            tasks, scheduled = [], start
+            for i in counter:
+                if requests is not None and i >= requests:
+                    break
+                scheduled += rng.expovariate(rate)
+                if scheduled >= deadline:
+                    break
+                await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+                tasks.append(asyncio.create_task(send(i, scheduled)))
+            await asyncio.gather(*tasks)
+        else:
+            raise ValueError(f"Unknown mode {mode!r}")
+        elapsed = time.perf_counter() - start
+
+    completed = sum(statuses.values())
+    return {
+        "requests": completed + sum(errors.values()),
+        "ok": len(latencies),
+        "errors": sum(errors.values()) + completed - len(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "transport_errors": dict(errors),
+        "duration_s": round(elapsed, 2),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def run_target(name, target, launch="subprocess", url=None, env=None, stub_options=None, pid=None,
+               images_dir=None, **load_options):
+    """Start ``target`` (unless ``url`` is given), run :func:`run_load` on it and return the report."""
+    env = dict(env or {})
+    images = load_images(images_dir or TEST_IMAGES)
+    with contextlib.ExitStack() as stack:
+        stub = None
+        if target.payload == "prompt":
+            stub = stack.enter_context(StubOpenAIServer(**(stub_options or {})))
+            env.setdefault("OPENAI_BASE_URL", stub.base_url)
+        if url is None:
+            app = stack.enter_context((InProcessApp if launch == "inprocess" else SubprocessApp)(target, env))
+            url = app.url
+            pid = os.getpid() if launch == "inprocess" else app.process.pid
+        else:
+            launch = "url"
+
+        sampler = ResourceSampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+        result = asyncio.run(run_load(url, target, images, **load_options))
+        resources = sampler.stop() if sampler else {}
+
+    return {
+        "target": name,
+        "endpoint": f"{target.method} {target.path}",
+        "launch": launch,
+        "load": {key: load_options.get(key) for key in ("mode", "concurrency", "rate", "requests", "duration_s")},
+        **result,
+        **resources,
+        "stub_openai_requests": stub.requests if stub else None,
+        "images": [image[0] for image in images] if target.payload != "prompt" else None,
+        "git_commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "cpu_count": os.cpu_count(), "platform": platform.platform()},
+    }
+
+
+def compare(report, baseline):
+    """Lines with the change of the headline numbers against an earlier report."""
+    rows = [("rps", ("rps",)), ("p50 ms", ("latency_ms", "p50")), ("p95 ms", ("latency_ms", "p95")),
+            ("p99 ms", ("latency_ms", "p99")), ("cpu %", ("cpu_percent",)), ("peak rss MB", ("rss_mb", "peak"))]
+    lines = [f"{'':<12} {baseline.get('git_commit') or 'baseline':>12} {report.get('git_commit') or 'this run':>12}"
+             f" {'change':>9}"]
+    for label, keys in rows:
+        old, new = baseline, report
+        for key in keys:
+            old = (old or {}).get(key) if isinstance(old, dict) else None
+            new = (new or {}).get(key) if isinstance(new, dict) else None
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(f"{label:<12} {old:>12} {new:>12} {change:>9}")
+    return lines
+
+
+def parse_env(pairs):
+    env = {}
+    for pair in pairs or []:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--env expects KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+
+def add_load_arguments(parser):
+    """Load options shared with the cross-team runner."""
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop: concurrent clients")
+    parser.add_argument("--rate", type=float, default=10.0, help="open loop: requests per second")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds (default 30 without --requests)")
+    parser.add_argument("--warmup", type=int, default=5, help="requests sent and discarded before measuring")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--launch", choices=["subprocess", "inprocess"], default="subprocess")
+    parser.add_argument("--env", action="append", metavar="KEY=VALUE", help="environment of the app (repeatable)")
+    parser.add_argument("--images", help="image folder (default: 4_image_processing_techniques/test_imgs)")
+    parser.add_argument("--stub-first-token-ms", type=float, default=50.0)
+    parser.add_argument("--stub-token-ms", type=float, default=5.0)
+
+
+def load_options(args):
+    return {
+        "mode": args.mode, "concurrency": args.concurrency, "rate": args.rate, "requests": args.requests,
+        "duration_s": args.duration if args.duration or args.requests else 30.0,
+        "warmup": args.warmup, "timeout_s": args.timeout, "images_dir": args.images,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=sorted(TARGETS))
+    add_load_arguments(parser)
+    parser.add_argument("--url", help="test an app that is already running instead of starting one")
+    parser.add_argument("--pid", type=int, help="with --url: process to sample CPU / RSS of")
+    parser.add_argument("--output", help="JSON file for the report")
+    parser.add_argument("--baseline", help="earlier JSON report to compare with")
+    args = parser.parse_args()
+
+    report = run_target(
+        args.target, TARGETS[args.target], launch=args.launch, url=args.url, env=parse_env(args.env),
+        stub_options={"first_token_ms": args.stub_first_token_ms, "token_ms": args.stub_token_ms},
+        pid=args.pid, **load_options(args),
+    )
+    print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            print("\n".join(compare(report, json.load(f))))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
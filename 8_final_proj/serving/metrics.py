@@ -0,0 +1,215 @@
+"""
+Per-stage latency histograms, in-flight requests and model load times in the
+Prometheus text format.
+
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+    with stage("inference"):
+        mask = await stages.inference.run(model.predict, batch)
+    png = await timed_run("encode", stages.encode, encode_png, mask)
+
+``stage`` times its block with ``time.perf_counter`` (monotonic, sub-microsecond)
+and works around ``await`` as well, so a stage includes the time its work waits
+for a pool worker. The standard stages are ``decode``, ``preprocess``,
+``inference``, ``postprocess`` and ``encode``. ``MetricsMiddleware`` counts
+requests in flight and observes the end-to-end latency per route.
+
+Recording one observation costs about a microsecond (a lock and a bisect), so
+the whole layer stays far below 1% of a request that runs a model. No
+``prometheus_client`` needed: the histograms are a few lists behind a lock.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGES = ("decode", "preprocess", "inference", "postprocess", "encode")
+
+# seconds; from sub-millisecond encodes to multi-second tiled or LLM requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts (non-cumulative, + overflow), sum]
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", labels, (("le", _format_value(bound)),), cumulative
+            yield "_sum", labels, (), total
+            yield "_count", labels, (), cumulative
+
+
+class Gauge:
+    """A value that goes up and down, one per combination of label values."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, amount=1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, amount=1, *labelvalues):
+        self.inc(-amount, *labelvalues)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield "", labels, (), value
+
+
+class MetricsRegistry:
+    """The metrics of one process, rendered together for ``/metrics``."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.labelnames, labels, extra)} "
+                             f"{_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "serving_stage_duration_seconds", "Time spent in one stage block of a request, waiting for a pool worker included.",
+    ["stage"],
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "serving_request_duration_seconds", "End-to-end request latency.", ["method", "route", "status"],
+))
+IN_FLIGHT = REGISTRY.register(Gauge("serving_requests_in_flight", "Requests being processed."))
+IN_FLIGHT.set(0)
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    "serving_model_load_seconds", "Time the last load of each model took.", ["model"],
+))
+
+
+@contextmanager
+def stage(name):
+    """Observe the duration of the block as stage ``name`` (also across ``await``)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+async def timed_run(name, pool, fn, *args, **kwargs):
+    """``await pool.run(fn, *args, **kwargs)`` on a ``StagePool``, observed as stage ``name``."""
+    with stage(name):
+        return await pool.run(fn, *args, **kwargs)
+
+
+@contextmanager
+def model_load(name):
+    """Record how long loading model ``name`` takes; nothing is recorded if loading raises."""
+    start = time.perf_counter()
+    yield
+    MODEL_LOAD_SECONDS.set(round(time.perf_counter() - start, 6), name)
+
+
+def render_metrics():
+    return REGISTRY.render()
+
+
+class MetricsMiddleware:
+    """ASGI middleware: requests in flight and latency per route template (``/items/{id}``, not the raw path).
+
+    A plain ASGI middleware rather than ``BaseHTTPMiddleware``, which would add a task and
+    a response copy per request. ``/metrics`` scrapes are not recorded.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            # unmatched paths share one label so scanners cannot grow the series without bound
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], path, str(status))
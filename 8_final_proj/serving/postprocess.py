@@ -0,0 +1,117 @@
+"""
+Vectorized mask postprocessing shared by the team apps.
+
+The apps colorize masks with one boolean pass per class
+(``for class_idx, color in enumerate(color_map): rgb[mask == class_idx] = color``),
+blend with a separate float pass and count classes with ``np.unique`` (a sort).
+These kernels do each step in a single pass over the mask:
+
+- ``colorize``: palette lookup table, ``palette[mask]``,
+- ``overlay``: colorize + alpha blend in one call (``cv2.addWeighted`` when OpenCV is available),
+- ``class_counts`` / ``class_percentages``: counting instead of ``np.unique`` (which sorts the mask).
+
+``python -m serving.benchmark_postprocess`` compares them with the per-app loops.
+"""
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:  # PIL-only apps
+    cv2 = None
+
+
+def make_palette(colors):
+    """Build a 256-entry uint8 lookup table from class colors.
+
+    Args:
+        colors (list | dict | numpy.ndarray): ``[color_of_class_0, color_of_class_1, ...]`` or ``{class_id: color}``.
+                                              Classes without a color stay black, like in the per-class loops.
+
+    Returns:
+        numpy.ndarray: (256, 3) uint8 palette, indexable by any uint8 mask.
+    """
+    items = colors.items() if isinstance(colors, dict) else enumerate(colors)
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    for class_id, color in items:
+        palette[int(class_id)] = color
+    return palette
+
+
+def colorize(mask, palette):
+    """(H, W) class mask -> (H, W, 3) uint8 color mask in one lookup pass."""
+    if mask.dtype != np.uint8:
+        mask = mask.astype(np.uint8)
+    if cv2 is not None:
+        # cv2.LUT is a SIMD table lookup, about 2x faster than the numpy gather on large masks
+        return cv2.LUT(cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR), palette.reshape(256, 1, 3))
+    return np.take(palette, mask, axis=0)
+
+
+def blend(image, color_mask, alpha):
+    """``image * (1 - alpha) + color_mask * alpha`` rounded to uint8, like ``cv2.addWeighted``."""
+    if cv2 is not None:
+        return cv2.addWeighted(image, 1 - alpha, color_mask, alpha, 0)
+    blended = image * np.float32(1 - alpha)
+    blended += color_mask * np.float32(alpha)
+    return np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+
+
+def overlay(image, mask, palette, alpha=0.4):
+    """Colorize ``mask`` and blend it over ``image`` (same height and width).
+
+    Returns:
+        tuple[numpy.ndarray, numpy.ndarray]: (overlay, color_mask), both (H, W, 3) uint8.
+    """
+    color_mask = colorize(mask, palette)
+    return blend(np.asarray(image, dtype=np.uint8), color_mask, alpha), color_mask
+
+
+def resize_mask(mask, size):
+    """Nearest-neighbour resize of a class mask to ``size`` = (width, height).
+
+    Resizing the one-channel class mask and colorizing afterwards is 3x less work than
+    resizing the colored mask.
+    """
+    if mask.dtype != np.uint8:
+        mask = mask.astype(np.uint8)
+    if cv2 is not None:
+        return cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+    height, width = mask.shape
+    rows = (np.arange(size[1]) * height // size[1])[:, None]
+    cols = (np.arange(size[0]) * width // size[0])[None, :]
+    return mask[rows, cols]
+
+
+def class_counts(mask, num_classes=256):
+    """Pixel count per class id (index = class id).
+
+    Args:
+        mask (numpy.ndarray): (H, W) class mask.
+        num_classes (int): Number of class ids to count. With the handful of classes the apps
+                           have, one vectorized compare per class beats any histogram; ids at or
+                           above ``num_classes`` are not counted.
+
+    Returns:
+        numpy.ndarray: (num_classes,) int64 counts.
+    """
+    if mask.dtype != np.uint8:
+        mask = mask.astype(np.uint8)
+    if num_classes <= 8:
+        return np.array([np.count_nonzero(mask == class_id) for class_id in range(num_classes)], dtype=np.int64)
+    if cv2 is not None:
+        hist = cv2.calcHist([mask], [0], None, [256], [0, 256])
+        return hist[:num_classes, 0].astype(np.int64)
+    return np.bincount(mask.ravel(), minlength=256)[:num_classes]
+
+
+def class_percentages(counts, total=None):
+    """``{class_id: percent}`` for the classes present, truncated to int like the apps' ``np.unique`` version.
+
+    ``total`` defaults to the sum of ``counts``; pass ``mask.size`` to get percentages of the whole mask.
+    """
+    total = int(counts.sum()) if total is None else total
+    if total == 0:
+        return {}
+    present = np.flatnonzero(counts)
+    return {int(class_id): int(counts[class_id] / total * 100) for class_id in present}
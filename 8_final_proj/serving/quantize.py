@@ -0,0 +1,97 @@
+"""
+Convert a Keras U-Net to a full-integer (INT8) TFLite model.
+
+    python -m serving.quantize model.keras --dataset ../Team_TKH/dataset/cat_and_dog_dataset
+
+Post-training quantization: weights and activations are int8, calibrated on
+photos from the dataset (``--samples`` of them, from the training split of
+:func:`split_dataset`). Input and output are uint8; with calibration photos
+spanning 0-255 the input scale comes out at 1/255, so raw pixel values map
+exactly to the [0, 1] floats the model was trained on. ``serving.backends.TFLiteModel`` hides the uint8 I/O, and apps
+select it with ``MODEL_BACKEND=tflite``.
+
+Only float models are supported; a model exported with ``serving/export_model.py``
+already has argmax in its graph, so quantize the original ``.keras`` file instead.
+"""
+
+import argparse
+import glob
+import os
+
+import numpy as np
+from PIL import Image
+
+from serving.backends import tflite_path_for
+
+MASK_DIRS = ("SegmentationClass", "SegmentationClassPNG", "SegmentationClassVisualization", "encoded_masks")
+
+
+def dataset_images(dataset_dir):
+    """Sorted photos under ``dataset_dir`` (VOC ``JPEGImages`` or ``cats/`` / ``dogs/`` folders), masks excluded."""
+    paths = []
+    for pattern in ("*.jpg", "*.jpeg", "*.JPG", "*.png"):
+        paths += glob.glob(os.path.join(dataset_dir, "**", pattern), recursive=True)
+    return sorted(path for path in paths if not set(MASK_DIRS) & set(path.split(os.sep)))
+
+
+def split_dataset(paths, eval_every=5):
+    """Deterministic train / evaluation split: every ``eval_every``-th photo is held out (20%)."""
+    train = [path for i, path in enumerate(paths) if i % eval_every]
+    evaluation = [path for i, path in enumerate(paths) if not i % eval_every]
+    return train, evaluation
+
+
+def load_image(path, size):
+    """(H, W, 3) uint8 photo resized to ``size`` (width, height), as the apps preprocess it."""
+    return np.asarray(Image.open(path).convert("RGB").resize(size))
+
+
+def quantize_int8(model, images):
+    """Full-integer TFLite model bytes.
+
+    Args:
+        model (tf.keras.Model): Float segmentation model taking [0, 1] inputs.
+        images (list[numpy.ndarray]): Calibration photos, uint8 at the model input size.
+    """
+    import tensorflow as tf
+
+    def representative_dataset():
+        for image in images:
+            yield [image[None].astype(np.float32) / 255.0]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help=".keras / .h5 model")
+    parser.add_argument("--dataset", required=True, help="dataset folder with the calibration photos")
+    parser.add_argument("--samples", type=int, default=100, help="calibration photos (default: %(default)s)")
+    parser.add_argument("--output", help="output .tflite (default: <model>_int8.tflite)")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    height, width = model.input_shape[1:3]
+    train, _ = split_dataset(dataset_images(args.dataset))
+    if not train:
+        parser.error(f"no photos found under {args.dataset}")
+    step = max(len(train) // args.samples, 1)
+    images = [load_image(path, (width, height)) for path in train[::step][:args.samples]]
+
+    output = args.output or tflite_path_for(args.model)
+    with open(output, "wb") as f:
+        f.write(quantize_int8(model, images))
+    print(f"{args.model} ({os.path.getsize(args.model) / 1e6:.1f} MB) -> {output} "
+          f"({os.path.getsize(output) / 1e6:.1f} MB), calibrated on {len(images)} photos")
+
+
+if __name__ == "__main__":
+    main()
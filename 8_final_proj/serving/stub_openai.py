@@ -0,0 +1,178 @@
+"""
+A local stand-in for an OpenAI-compatible server (LM Studio), for load tests without network or GPU.
+
+    python -m serving.stub_openai --port 1234 --first-token-ms 50 --token-ms 5
+
+Answers ``POST /v1/chat/completions`` (plain and ``stream=True`` Server-Sent Events)
+and ``GET /v1/models`` with a deterministic reply of ``--tokens`` words, after a
+configurable time to first token and per-token delay, so the text endpoints see a
+model-like latency profile. Only the standard library is used.
+
+The apps read the server address from ``OPENAI_BASE_URL`` (default
+``http://localhost:1234/v1``, where LM Studio listens).
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_ID = "stub-chat"
+
+
+def reply_words(prompt, tokens):
+    """The stub reply: the words of the prompt, repeated up to ``tokens`` words."""
+    words = (prompt or "stub").split() or ["stub"]
+    return [words[i % len(words)] for i in range(tokens)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": MODEL_ID, "object": "model", "owned_by": "stub"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Body is not JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        user_messages = [m.get("content") for m in request.get("messages", []) if m.get("role") == "user"]
+        words = reply_words(user_messages[-1] if user_messages else "", server.tokens)
+        model = request.get("model", MODEL_ID)
+        created = int(time.time())
+        time.sleep(server.first_token_s)
+
+        if not request.get("stream"):
+            time.sleep(server.token_s * max(len(words) - 1, 0))
+            self._send_json(200, {
+                "id": f"chatcmpl-stub-{created}", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(delta, finish_reason=None):
+            chunk = {"id": f"chatcmpl-stub-{created}", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(server.token_s)
+            event({"content": word if i == 0 else " " + word})
+        event({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class StubOpenAIServer:
+    """The stub server on a background thread; use it as a context manager.
+
+    Example:
+        with StubOpenAIServer(token_ms=2) as stub:
+            env["OPENAI_BASE_URL"] = stub.base_url
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, first_token_ms=50.0, token_ms=5.0, tokens=32):
+        """
+        Args:
+            host (str): Interface to bind.
+            port (int): Port; 0 picks a free one.
+            first_token_ms (float): Delay before the first token of every reply.
+            token_ms (float): Delay between tokens.
+            tokens (int): Words per reply.
+        """
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.first_token_s = first_token_ms / 1000.0
+        self._server.token_s = token_ms / 1000.0
+        self._server.tokens = tokens
+        self._server.requests = 0
+        self._server.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self):
+        return self._server.requests
+
+    def serve_forever(self):
+        """Serve on the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=32, help="words per reply")
+    args = parser.parse_args()
+
+    stub = StubOpenAIServer(args.host, args.port, args.first_token_ms, args.token_ms, args.tokens)
+    print(f"Stub OpenAI server on {stub.base_url}")
+    stub.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""INT8 TFLite backend: same interface and close to the float model it was converted from."""
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from serving.backends import TFLiteModel, load_model, tflite_path_for
+from serving.quantize import quantize_int8, split_dataset
+
+keras = tf.keras
+
+
+def tiny_segmenter(size=32):
+    keras.utils.set_random_seed(0)
+    inputs = keras.Input((size, size, 3))
+    x = keras.layers.Conv2D(8, 3, padding="same", activation="relu")(inputs)
+    outputs = keras.layers.Conv2D(3, 1, activation="softmax")(x)
+    return keras.Model(inputs, outputs)
+
+
+@pytest.fixture(scope="module")
+def models(tmp_path_factory):
+    model = tiny_segmenter()
+    rng = np.random.default_rng(0)
+    images = list(rng.integers(0, 256, (16, 32, 32, 3), dtype=np.uint8))
+    path = str(tmp_path_factory.mktemp("models") / "model.keras")
+    model.save(path)
+    with open(tflite_path_for(path), "wb") as f:
+        f.write(quantize_int8(model, images))
+    return model, path, np.stack(images).astype(np.float32) / 255.0
+
+
+def test_split_dataset_holds_out_every_fifth():
+    train, evaluation = split_dataset([f"{i}.jpg" for i in range(10)])
+    assert evaluation == ["0.jpg", "5.jpg"]
+    assert len(train) == 8
+
+
+def test_int8_model_matches_keras(models):
+    model, path, batch = models
+    int8_model = TFLiteModel(tflite_path_for(path))
+    assert int8_model.input_shape == model.input_shape
+    assert int8_model.output_shape == model.output_shape
+    assert int8_model.inputs[0].dtype == "float32"
+
+    expected = model.predict_on_batch(batch)
+    # batch size changes resize the interpreter
+    for scores in (int8_model.predict_on_batch(batch), int8_model.predict(batch[:3]), int8_model.predict(batch[:1])):
+        assert scores.dtype == np.float32
+        np.testing.assert_allclose(scores, expected[:len(scores)], atol=0.05)
+
+
+def test_load_model_selects_backend(models, monkeypatch):
+    _, path, _ = models
+    assert not isinstance(load_model(path, compile=False), TFLiteModel)
+    assert isinstance(load_model(tflite_path_for(path)), TFLiteModel)
+
+    monkeypatch.setenv("SEG_BACKEND", "tflite")
+    assert isinstance(load_model(path, name="SEG"), TFLiteModel)
+    monkeypatch.setenv("SEG_BACKEND", "onnx")
+    with pytest.raises(ValueError):
+        load_model(path, name="SEG")
@@ -0,0 +1,80 @@
+"""Coalescing, the wait window, error propagation and shutdown of the micro-batcher."""
+
+import asyncio
+import threading
+
+import numpy as np
+
+from serving.batching import MicroBatcher
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        return batch * 2
+
+    async def main():
+        batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(np.full(3, i)) for i in range(6)))
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(main())
+    assert [row.tolist() for row in results] == [[2 * i] * 3 for i in range(6)]
+    assert calls == [4, 2]
+
+
+def test_lone_request_waits_only_for_the_window():
+    async def main():
+        batcher = MicroBatcher(lambda batch: batch, max_batch_size=8, max_wait_ms=20)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await batcher.submit(np.zeros(1))
+        elapsed = loop.time() - start
+        stats = batcher.stats()
+        await batcher.stop()
+        return elapsed, stats
+
+    elapsed, stats = asyncio.run(main())
+    assert 0.015 <= elapsed < 0.5
+    assert stats["batch_size_histogram"] == {"1": 1}
+
+
+def test_errors_and_short_outputs_reach_every_caller():
+    def broken(batch):
+        raise FileNotFoundError("weights")
+
+    async def main(predict):
+        batcher = MicroBatcher(predict, max_batch_size=2, max_wait_ms=20)
+        results = await asyncio.gather(
+            batcher.submit(np.zeros(1)), batcher.submit(np.ones(1)), return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, FileNotFoundError) for result in asyncio.run(main(broken)))
+    # one row for two samples: neither caller may be left hanging
+    results = asyncio.run(asyncio.wait_for(main(lambda batch: batch[:1]), 5))
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_stop_fails_requests_in_flight():
+    release = threading.Event()
+
+    def slow(batch):
+        release.wait(5)
+        return batch
+
+    async def main():
+        batcher = MicroBatcher(slow, max_batch_size=2, max_wait_ms=1)
+        submitted = [asyncio.create_task(batcher.submit(np.zeros(1))) for _ in range(3)]
+        await asyncio.sleep(0.1)  # the first two are in the forward pass, the third is queued
+        await batcher.stop()
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(*submitted, return_exceptions=True), 5)
+
+    results = asyncio.run(main())
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) and "stopped" in str(result) for result in results)
@@ -0,0 +1,25 @@
+"""Model class discovery and the IoU scoring of the cross-team benchmark (no models loaded)."""
+
+import numpy as np
+
+from serving.benchmark_models import ADAPTERS, IGNORE_LABEL, discover_model_classes, iou_scores
+
+
+def test_every_adapter_matches_a_discovered_class():
+    discovered = set(discover_model_classes())
+    for name, adapter in ADAPTERS.items():
+        assert (adapter.module, adapter.class_name) in discovered, name
+
+
+def test_iou_ignores_noise_and_scores_foreground_without_class_order():
+    truth = np.array([[0, 0, 1, 1],
+                      [0, 0, 2, IGNORE_LABEL]], dtype=np.uint8)
+    swapped = np.array([[0, 0, 2, 2],
+                        [0, 0, 1, 0]], dtype=np.uint8)
+
+    mean_iou, foreground_iou = iou_scores(truth, truth)
+    assert mean_iou == foreground_iou == 1.0
+
+    mean_iou, foreground_iou = iou_scores(truth, swapped)
+    assert mean_iou == 1 / 3
+    assert foreground_iou == 1.0
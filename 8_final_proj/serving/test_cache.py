@@ -0,0 +1,100 @@
+"""Single-flight computation, cancellation and both tiers of the response cache."""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from serving.cache import ResponseCache, make_key
+
+
+def test_key_covers_bytes_version_and_params():
+    key = make_key(b"img", "v1", alpha=0.5)
+    assert key == make_key(b"img", "v1", alpha=0.5)
+    assert len({key, make_key(b"img2", "v1", alpha=0.5), make_key(b"img", "v2", alpha=0.5),
+                make_key(b"img", "v1", alpha=0.6)}) == 4
+
+
+def test_concurrent_requests_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b"png"
+
+    async def main():
+        cache = ResponseCache()
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        results.append(await cache.get_or_compute("k", compute))
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert results == [b"png"] * 6 and len(calls) == 1
+    assert (cache.counters["misses"], cache.counters["coalesced"], cache.counters["hits"]) == (1, 4, 1)
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    async def compute():
+        await asyncio.sleep(0.1)
+        return b"png"
+
+    async def main():
+        cache = ResponseCache()
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()  # the first client disconnects
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return cache, await asyncio.gather(*followers)
+
+    cache, results = asyncio.run(main())
+    assert results == [b"png"] * 3
+    assert cache.stats()["inflight"] == 0 and cache.stats()["entries"] == 1
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad image")
+
+    async def main():
+        cache = ResponseCache()
+        results = await asyncio.gather(
+            *(cache.get_or_compute("k", broken) for _ in range(3)), return_exceptions=True
+        )
+        return cache, results
+
+    cache, results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert cache.counters["errors"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_disk_tier_survives_a_restart_and_evicts_oldest(tmp_path):
+    async def value():
+        return b"x" * 1000
+
+    cache = ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=3200)
+    for i, key in enumerate(["aa1", "bb2", "cc3"]):
+        asyncio.run(cache.get_or_compute(key, value))
+        os.utime(cache._disk_path(key), (i, i))  # distinct LRU clocks
+    assert cache.counters["disk_evictions"] == 0
+    asyncio.run(cache.get_or_compute("dd4", value))
+    assert cache.counters["disk_evictions"] >= 1
+    assert not os.path.exists(cache._disk_path("aa1"))
+    assert cache.disk_bytes == sum(size for _, size, _ in cache._disk_files()) <= 3200
+
+    restarted = ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=3200)
+    assert asyncio.run(restarted.get_or_compute("dd4", value)) == b"x" * 1000
+    assert restarted.counters["disk_hits"] == 1
+
+
+def test_concurrent_disk_writes_keep_the_byte_count(tmp_path):
+    cache = ResponseCache(disk_dir=str(tmp_path), disk_max_bytes=20 * 1000)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: cache._disk_put("%02x%d" % (i % 7, i), b"y" * 1000), range(200)))
+    assert cache.disk_bytes == sum(size for _, size, _ in cache._disk_files())
+    assert cache.disk_bytes <= 20 * 1000 + 1100
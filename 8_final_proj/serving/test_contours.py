@@ -0,0 +1,75 @@
+"""LabelMe polygons of a mask, filled back in order the way labelme2voc does, reproduce the mask."""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+pytest.importorskip("cv2")
+
+from serving.contours import BACKGROUND_LABEL, labelme_document, mask_to_shapes  # noqa: E402
+
+LABELS = {1: "cat", 2: "dog"}
+LABEL_VALUES = {BACKGROUND_LABEL: 0, "cat": 1, "dog": 2}
+
+
+def fill_shapes(shapes, size):
+    """Rasterize polygons in order, like ``labelme.utils.shape_to_mask`` + ``shapes_to_label``."""
+    image = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(image)
+    for shape in shapes:
+        value = LABEL_VALUES[shape["label"]]
+        draw.polygon([tuple(point) for point in shape["points"]], outline=value, fill=value)
+    return np.array(image)
+
+
+def nested_mask():
+    mask = np.zeros((128, 128), dtype=np.uint8)
+    mask[10:100, 10:100] = 1      # cat with a hole
+    mask[30:60, 30:60] = 0
+    mask[40:50, 40:50] = 2        # dog inside the hole
+    mask[35:38, 52:55] = 1        # cat island inside the hole
+    mask[60:70, 60:70] = 2        # dog filling a hole of the cat
+    yy, xx = np.mgrid[0:128, 0:128]
+    mask[(yy - 105) ** 2 + (xx - 105) ** 2 < 300] = 2
+    return mask
+
+
+def diagonal_mask():
+    """Cat regions touching only diagonally, with dog on both sides of the cat outline."""
+    mask = np.zeros((40, 40), dtype=np.uint8)
+    mask[5:35, 5:35] = 2
+    mask[10:30, 10:30] = 1
+    mask[15:20, 15:20] = 2
+    mask[20:25, 20:25] = 2
+    mask[20:25, 15:20] = 0
+    return mask
+
+
+@pytest.mark.parametrize("mask", [nested_mask(), diagonal_mask()])
+def test_round_trip_without_simplification(mask):
+    shapes = mask_to_shapes(mask, LABELS, tolerance=0)
+    np.testing.assert_array_equal(fill_shapes(shapes, mask.shape[::-1]), mask)
+
+
+def test_tolerance_reduces_points():
+    mask = nested_mask()
+    exact = mask_to_shapes(mask, LABELS, tolerance=0)
+    simplified = mask_to_shapes(mask, LABELS, tolerance=2)
+    assert sum(len(s["points"]) for s in simplified) < sum(len(s["points"]) for s in exact)
+    assert (fill_shapes(simplified, (128, 128)) != mask).mean() < 0.02
+
+
+def test_points_scaled_to_image_size():
+    mask = np.zeros((10, 10), dtype=np.uint8)
+    mask[2:8, 2:8] = 1
+    (shape,) = mask_to_shapes(mask, LABELS, tolerance=0, image_size=(100, 50))
+    points = np.array(shape["points"])
+    assert shape["label"] == "cat" and shape["shape_type"] == "polygon"
+    np.testing.assert_allclose(points.min(axis=0), [2.5 * 10 - 0.5, 2.5 * 5 - 0.5])
+    np.testing.assert_allclose(points.max(axis=0), [7.5 * 10 - 0.5, 7.5 * 5 - 0.5])
+
+
+def test_labelme_document():
+    document = labelme_document([], (640, 480), "cat.jpg")
+    assert document["imageWidth"] == 640 and document["imageHeight"] == 480
+    assert document["imagePath"] == "cat.jpg" and document["imageData"] is None
@@ -0,0 +1,62 @@
+"""Stage pools: work runs off the event loop, and the counters behind /stages/stats."""
+
+import asyncio
+import threading
+
+import pytest
+
+from serving.executor import StageExecutor, StagePool
+
+
+class Model:
+    """Stage work is usually a bound method of a loaded model."""
+
+    def __init__(self):
+        self.weights = threading.Lock()  # not picklable, like a real model
+
+    def preprocess(self, value):
+        return threading.current_thread().name, value * 2
+
+
+def test_bound_methods_run_on_the_stage_threads():
+    async def main():
+        pool = StagePool("decode", 2)
+        try:
+            return threading.current_thread().name, await pool.run(Model().preprocess, 21)
+        finally:
+            pool.shutdown()
+
+    loop_thread, (worker_thread, value) = asyncio.run(main())
+    assert value == 42
+    assert worker_thread.startswith("decode-stage") and worker_thread != loop_thread
+
+
+def test_stats_count_busy_queued_and_failed_work():
+    release = threading.Event()
+    pool = StagePool("inference", 1)
+    futures = [pool.submit(release.wait, 5) for _ in range(3)]
+    stats = pool.stats()
+    assert (stats["busy"], stats["queued"], stats["saturation"], stats["peak_pending"]) == (1, 2, 1.0, 3)
+
+    release.set()
+    for future in futures:
+        future.result(5)
+    with pytest.raises(ZeroDivisionError):
+        pool.submit(lambda: 1 / 0).result(5)
+    pool.shutdown()
+
+    stats = pool.stats()
+    assert (stats["busy"], stats["submitted"], stats["completed"], stats["failed"]) == (0, 4, 4, 1)
+    assert stats["mean_latency_ms"] > 0
+
+
+def test_pool_sizes_from_env(monkeypatch):
+    monkeypatch.setenv("DECODE_WORKERS", "3")
+    monkeypatch.delenv("INFERENCE_WORKERS", raising=False)
+    monkeypatch.setenv("ENCODE_WORKERS", "")
+    stages = StageExecutor.from_env()
+    stats = stages.stats()
+    stages.shutdown()
+    assert {name: pool["max_workers"] for name, pool in stats["stages"].items()} == {
+        "decode": 3, "inference": 1, "encode": stats["cpu_count"],
+    }
@@ -0,0 +1,108 @@
+"""Parity of the exported uint8 model with the apps' Python preprocessing + argmax path."""
+
+import importlib.util
+import io
+import os
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+cv2 = pytest.importorskip("cv2")
+from PIL import Image
+
+from serving.export_model import build_serving_model, is_served_model
+
+keras = tf.keras
+FINAL_PROJ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def load_app_module(name, *path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(FINAL_PROJ, *path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tiny_unet():
+    keras.utils.set_random_seed(0)
+    inputs = keras.Input((128, 128, 3))
+    x = keras.layers.Conv2D(8, 3, padding="same", activation="relu")(inputs)
+    x = keras.layers.Conv2D(3, 1, activation="softmax")(x)
+    return keras.Model(inputs, x)
+
+
+def sample_image(height, width):
+    """Smooth gradients and a disc, closer to a photo than random noise."""
+    yy, xx = np.mgrid[0:height, 0:width]
+    img = np.stack([xx * 255 // width, yy * 255 // height, (xx + yy) * 127 // (height + width)], axis=-1)
+    disc = (yy - height / 2) ** 2 + (xx - width / 3) ** 2 < (min(height, width) / 4) ** 2
+    img[disc] = (220, 40, 90)
+    return img.astype(np.uint8)
+
+
+def encode_png(img):
+    buf = io.BytesIO()
+    Image.fromarray(img).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def unet():
+    return tiny_unet()
+
+
+@pytest.mark.parametrize("size", [(128, 128), (375, 500)])
+def test_matches_pil_path(unet, size):
+    model_work = load_app_module("mdy_model_work", "team_mdy", "dog_cat_segmentation", "model_work.py")
+    segmentation = model_work.SemanticSegmentation(model=unet)
+    image_bytes = encode_png(sample_image(*size))
+
+    _, img_batch = segmentation.preprocess_image(image_bytes)
+    expected = segmentation.predict_masks(img_batch)[0]
+
+    served = build_serving_model(unet, antialias=True)
+    pixels = np.array(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+    mask = served.predict(pixels[None], verbose=0)[0]
+
+    assert is_served_model(served)
+    assert mask.dtype == np.uint8 and mask.shape == expected.shape
+    assert np.mean(mask == expected) >= 0.999
+
+    # the app's own uint8 path with the exported model
+    served_app = model_work.SemanticSegmentation(model=served)
+    _, uint8_batch = served_app.preprocess_image(image_bytes)
+    assert uint8_batch.dtype == np.uint8
+    assert np.mean(served_app.predict_masks(uint8_batch)[0] == expected) >= 0.999
+
+
+@pytest.mark.parametrize("size", [(128, 128), (375, 500)])
+def test_matches_cv2_path(unet, size):
+    model_work = load_app_module("t9_model_work", "T9", "model_work.py")
+    image_model = model_work.ImageModel()
+    image_model.model = unet
+    image_bytes = encode_png(sample_image(*size))
+
+    img_normalized, _ = image_model.preprocess(image_bytes)
+    expected = image_model.predict_masks(img_normalized[None])[0]
+
+    served = build_serving_model(unet, antialias=False)
+    pixels = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    mask = served.predict(pixels[None], verbose=0)[0]
+
+    assert mask.dtype == np.uint8 and mask.shape == expected.shape
+    assert np.mean(mask == expected) >= 0.999
+
+    image_model.model = served
+    img_resized, _ = image_model.preprocess(image_bytes)
+    assert np.mean(image_model.predict_masks(img_resized[None])[0] == expected) >= 0.999
+
+
+def test_keras_file_roundtrip(unet, tmp_path):
+    served = build_serving_model(unet)
+    path = str(tmp_path / "served.keras")
+    served.save(path)
+
+    reloaded = keras.models.load_model(path)
+    pixels = sample_image(200, 300)[None]
+    np.testing.assert_array_equal(reloaded.predict(pixels, verbose=0), served.predict(pixels, verbose=0))
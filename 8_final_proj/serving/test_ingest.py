@@ -0,0 +1,52 @@
+"""JPEG header parsing and the reduced decode scale picked for a model input size."""
+
+import io
+
+import pytest
+from PIL import Image
+
+from serving.ingest import decode_image_pil, jpeg_size, reduced_scale
+
+
+def encode(size, format="JPEG", **params):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 60)).save(buf, format=format, **params)
+    return buf.getvalue()
+
+
+def test_jpeg_size_reads_baseline_and_progressive_headers():
+    assert jpeg_size(encode((640, 480))) == (640, 480)
+    assert jpeg_size(encode((300, 1000), progressive=True)) == (300, 1000)
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # orientation: the header size is still the stored one
+    assert jpeg_size(encode((64, 32), exif=exif.tobytes())) == (64, 32)
+
+
+def test_jpeg_size_is_none_for_other_or_broken_data():
+    assert jpeg_size(encode((64, 32), format="PNG")) is None
+    assert jpeg_size(b"") is None
+    assert jpeg_size(encode((64, 32))[:20]) is None  # cut before the frame header
+
+
+@pytest.mark.parametrize("image_size, expected", [
+    ((1024, 1024), 8), ((1023, 4000), 4),
+    ((512, 512), 4), ((511, 511), 2),
+    ((256, 256), 2), ((255, 255), 1),
+    ((128, 128), 1), ((64, 64), 1),
+])
+def test_reduced_scale_at_the_boundaries(image_size, expected):
+    assert reduced_scale(image_size, (128, 128)) == expected
+
+
+def test_reduced_scale_keeps_the_longer_target_side():
+    assert reduced_scale((1024, 1024), (64, 128)) == 8
+    assert reduced_scale((1024, 1024), (129, 64)) == 4
+
+
+def test_decode_image_pil_stays_at_least_the_target_size():
+    data = encode((1030, 770))
+    image = decode_image_pil(data, target_size=(128, 128))
+    assert image.mode == "RGB" and min(image.size) >= 128 and image.width < 1030
+    assert decode_image_pil(data).size == (1030, 770)
+    assert decode_image_pil(encode((1030, 770), format="PNG"), target_size=(128, 128)).size == (1030, 770)
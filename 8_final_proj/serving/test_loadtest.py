@@ -0,0 +1,46 @@
+"""Load generator and stub OpenAI server, driven against each other (no app, no network)."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from serving.loadtest import Target, compare, latency_summary, run_load, wait_until_ready
+from serving.stub_openai import StubOpenAIServer
+
+STUB_TARGET = Target(None, None, "POST", "/chat/completions", "prompt", "prompt", "/models")
+
+
+@pytest.fixture(scope="module")
+def stub():
+    with StubOpenAIServer(first_token_ms=5, token_ms=0, tokens=4) as server:
+        yield server
+
+
+def test_closed_loop_counts_every_request(stub):
+    result = asyncio.run(run_load(stub.base_url, STUB_TARGET, [], concurrency=4, requests=40, warmup=2))
+    assert result["ok"] == result["requests"] == 40
+    assert result["status_codes"] == {"200": 40}
+    assert result["latency_ms"]["p50"] >= 5
+    assert result["latency_ms"]["p50"] <= result["latency_ms"]["p95"] <= result["latency_ms"]["p99"]
+
+
+def test_open_loop_follows_the_arrival_rate(stub):
+    result = asyncio.run(run_load(stub.base_url, STUB_TARGET, [], mode="open", rate=50, duration_s=1.0, warmup=0))
+    assert 25 <= result["requests"] <= 80
+    assert result["errors"] == 0
+
+
+def test_only_200_counts_as_ready(stub):
+    assert wait_until_ready(stub.base_url + "/models", timeout_s=5)
+    # a path the app does not serve (404) never becomes ready
+    assert not wait_until_ready(stub.base_url + "/health/ready", timeout_s=1, interval_s=0.1)
+
+
+def test_compare_reports_relative_change():
+    baseline = {"git_commit": "aaa", "rps": 10.0, "latency_ms": latency_summary([0.1, 0.2])}
+    report = {"git_commit": "bbb", "rps": 12.0, "latency_ms": latency_summary([0.1, 0.2])}
+    lines = compare(report, baseline)
+    assert "aaa" in lines[0] and "bbb" in lines[0]
+    assert lines[1].split()[-1] == "+20.0%"
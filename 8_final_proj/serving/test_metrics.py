@@ -0,0 +1,55 @@
+"""Prometheus text output of the metrics layer and the middleware's route labels."""
+
+import asyncio
+
+import pytest
+
+from serving import metrics
+from serving.metrics import Gauge, Histogram, MetricsMiddleware, MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("stage_seconds", "Stage time.", ["stage"], buckets=(0.01, 0.1)))
+    for value in (0.005, 0.01, 0.05, 3.0):
+        histogram.observe(value, "decode")
+    gauge = registry.register(Gauge("loaded", "Load time.", ["model"]))
+    gauge.set(1.5, 'a "quoted" name')
+
+    assert registry.render().splitlines() == [
+        "# HELP stage_seconds Stage time.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="decode",le="0.01"} 2',
+        'stage_seconds_bucket{stage="decode",le="0.1"} 3',
+        'stage_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'stage_seconds_sum{stage="decode"} 3.065',
+        'stage_seconds_count{stage="decode"} 4',
+        "# HELP loaded Load time.",
+        "# TYPE loaded gauge",
+        'loaded{model="a \\"quoted\\" name"} 1.5',
+    ]
+
+
+def test_middleware_labels_route_templates():
+    fastapi = pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    app = fastapi.FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item}")
+    async def item(item: int):
+        with metrics.stage("inference"):
+            await asyncio.sleep(0)
+        return {"item": item}
+
+    client = TestClient(app)
+    for path in ("/items/1", "/items/2", "/items/x", "/missing"):
+        client.get(path)
+
+    text = metrics.render_metrics()
+    assert 'serving_request_duration_seconds_count{method="GET",route="/items/{item}",status="200"} 2' in text
+    assert 'serving_request_duration_seconds_count{method="GET",route="/items/{item}",status="422"} 1' in text
+    assert 'route="unmatched",status="404"' in text
+    assert 'serving_stage_duration_seconds_count{stage="inference"}' in text
+    assert "serving_requests_in_flight 0" in text
@@ -0,0 +1,129 @@
+"""Startup state, concurrent loading, warm-up batch sizes and the health probes."""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+from serving.readiness import Readiness, add_health_routes, load_concurrently, warm_up, warmup_batch_sizes
+
+
+def test_loaders_run_concurrently_and_failures_surface():
+    readiness = Readiness()
+
+    def slow(value):
+        time.sleep(0.2)
+        return value
+
+    start = time.perf_counter()
+    models = asyncio.run(load_concurrently({"a": lambda: slow(1), "b": lambda: slow(2)}, readiness))
+    assert models == {"a": 1, "b": 2}
+    assert time.perf_counter() - start < 0.35
+    assert set(readiness.models) == {"a", "b"}
+
+    def broken():
+        raise FileNotFoundError("model.keras")
+
+    with pytest.raises(FileNotFoundError):
+        with readiness.phase("loading"):
+            asyncio.run(load_concurrently({"a": lambda: 1, "b": broken}))
+    assert readiness.state == "failed" and "model.keras" in readiness.error
+
+
+def test_warmup_batch_sizes(monkeypatch):
+    monkeypatch.delenv("WARMUP_BATCH_SIZES", raising=False)
+    assert warmup_batch_sizes(16) == [1, 2, 4, 8, 16]
+    assert warmup_batch_sizes(6) == [1, 2, 4, 6]
+    monkeypatch.setenv("WARMUP_BATCH_SIZES", "8,1,8")
+    assert warmup_batch_sizes(16) == [1, 8]
+    monkeypatch.setenv("WARMUP_BATCH_SIZES", "")
+    assert warmup_batch_sizes(16) == []
+
+    shapes = []
+    timings = warm_up(lambda batch: shapes.append(batch.shape), (4, 4, 3), [1, 3])
+    assert shapes == [(1, 4, 4, 3), (3, 4, 4, 3)]
+    assert list(timings) == [1, 3]
+
+
+def _app(startup):
+    fastapi = pytest.importorskip("fastapi")
+    readiness = Readiness()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        readiness.start(startup(readiness))
+        yield
+        await readiness.stop()
+
+    app = fastapi.FastAPI(lifespan=lifespan)
+    add_health_routes(app, readiness)
+
+    @app.get("/predict", dependencies=[fastapi.Depends(readiness.require)])
+    def predict():
+        return {"mask": "ok"}
+
+    return app, readiness
+
+
+def _wait_for_state(client, state):
+    for _ in range(500):
+        response = client.get("/health/ready")
+        if response.json()["status"] == state:
+            return response
+        time.sleep(0.01)
+    raise AssertionError(f"never reached {state}: {response.json()}")
+
+
+def test_lifespan_serves_probes_while_the_model_loads_in_the_background():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    loaded = threading.Event()
+
+    async def startup(readiness):
+        with readiness.phase("loading"):
+            await asyncio.to_thread(loaded.wait, 5)
+        with readiness.phase("warming"):
+            await asyncio.sleep(0.01)
+        readiness.mark_ready()
+
+    app, readiness = _app(startup)
+    with TestClient(app) as client:  # runs the lifespan; its startup returns before the model is loaded
+        assert client.get("/health/live").status_code == 200
+        response = _wait_for_state(client, "loading")
+        assert response.status_code == 503
+        response = client.get("/predict")
+        assert response.status_code == 503 and response.headers["retry-after"] == "1"
+
+        loaded.set()
+        assert _wait_for_state(client, "ready").status_code == 200
+        assert client.get("/predict").json() == {"mask": "ok"}
+        report = client.get("/health").json()
+        assert report["cold_start_s"] >= 0 and {"loading", "warming"} <= set(report["phases"])
+
+
+def test_failed_or_unfinished_startup_keeps_the_routes_closed():
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    async def broken(readiness):
+        with readiness.phase("loading"):
+            raise FileNotFoundError("model.keras")
+
+    app, readiness = _app(broken)
+    with TestClient(app) as client:
+        response = _wait_for_state(client, "failed")
+        assert response.status_code == 503 and "model.keras" in response.json()["error"]
+        assert client.get("/predict").status_code == 503
+
+    async def never_loads(readiness):
+        with readiness.phase("loading"):
+            await asyncio.sleep(60)
+
+    app, readiness = _app(never_loads)
+    with TestClient(app) as client:
+        _wait_for_state(client, "loading")
+    # shutdown cancels the load instead of waiting for it
+    assert readiness.task is None and readiness.state == "failed"
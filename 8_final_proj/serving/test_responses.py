@@ -0,0 +1,82 @@
+"""Accept-header negotiation and the JSON / multipart / MessagePack / PNG encodings."""
+
+import base64
+import email
+import io
+import json
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+from PIL import Image
+
+from serving.responses import (JSON, MSGPACK, MULTIPART, PNG, encode_payload, msgpack_body, negotiate,
+                               negotiated_response, palette_png, parse_artifacts)
+
+
+def test_negotiate_follows_quality_then_order():
+    assert negotiate(None) == JSON
+    assert negotiate("*/*") == JSON
+    assert negotiate("image/png") == PNG
+    assert negotiate("application/x-msgpack") == MSGPACK
+    assert negotiate("application/json;q=0.5, multipart/mixed") == MULTIPART
+    assert negotiate("text/html, image/png;q=0.1") == PNG
+    assert negotiate("image/png;q=0, */*;q=0.1") == JSON
+    assert negotiate("image/png", offered=(JSON, PNG)) == PNG
+
+    with pytest.raises(HTTPException) as error:
+        negotiate("text/html")
+    assert error.value.status_code == 406
+    with pytest.raises(HTTPException) as error:
+        negotiate("image/png", offered=(JSON, MULTIPART))
+    assert error.value.status_code == 406
+
+
+def test_parse_artifacts():
+    assert parse_artifacts(None, ["overlay", "mask"], ["overlay"]) == {"overlay"}
+    assert parse_artifacts("mask, overlay", ["overlay", "mask"], []) == {"overlay", "mask"}
+    with pytest.raises(HTTPException) as error:
+        parse_artifacts("heatmap", ["overlay", "mask"], [])
+    assert error.value.status_code == 422
+
+
+def test_palette_png_keeps_class_ids_at_the_smallest_bit_depth():
+    mask = np.array([[0, 1, 2], [2, 1, 0]], dtype=np.uint8)
+    palette = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=np.uint8)
+    image = Image.open(io.BytesIO(palette_png(mask, palette, num_classes=3)))
+    assert image.mode == "P"
+    assert np.array_equal(np.asarray(image), mask)
+    assert image.getpalette()[:9] == [0, 0, 0, 255, 0, 0, 0, 255, 0]
+    assert len(palette_png(np.zeros((64, 64), np.uint8), palette, 3)) < \
+        len(palette_png(np.zeros((64, 64), np.uint8), palette, 200))
+
+
+def test_payload_encodings_carry_the_same_fields():
+    payload = {"class_name": "cat", "results": [{"mask": b"\x89PNG-bytes", "score": 0.5}]}
+
+    body, content_type = encode_payload(payload, JSON)
+    assert content_type == JSON
+    assert json.loads(body)["results"][0]["mask"] == base64.b64encode(b"\x89PNG-bytes").decode()
+    assert json.loads(negotiated_response(payload, JSON).body) == json.loads(body)
+
+    body, content_type = encode_payload(payload, MULTIPART)
+    message = email.message_from_bytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    metadata, image = message.get_payload()
+    assert json.loads(metadata.get_payload()) == {
+        "class_name": "cat", "results": [{"mask": {"$part": "results.0.mask"}, "score": 0.5}]
+    }
+    assert image.get_content_type() == PNG and image.get_payload(decode=True) == b"\x89PNG-bytes"
+
+    msgpack = pytest.importorskip("msgpack")
+    body, content_type = encode_payload(payload, MSGPACK)
+    assert content_type == MSGPACK and msgpack.unpackb(body, raw=False) == payload
+
+
+def test_msgpack_missing_is_a_406(monkeypatch):
+    monkeypatch.setitem(sys.modules, "msgpack", None)  # import msgpack raises ImportError
+    with pytest.raises(HTTPException) as error:
+        msgpack_body({"a": 1})
+    assert error.value.status_code == 406
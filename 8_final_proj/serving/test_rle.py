@@ -0,0 +1,84 @@
+"""Round trips of the vectorized RLE and parity with the old per-pixel loop and pycocotools."""
+
+import numpy as np
+import pytest
+
+from serving.rle import (
+    counts_to_string,
+    decode_classes,
+    decode_coco,
+    encode_classes,
+    encode_coco,
+    mask_to_rle,
+    rle_to_mask,
+    string_to_counts,
+)
+
+
+def loop_mask_to_rle(mask):
+    """The per-pixel loop team_mdy used before."""
+    pixels = mask.flatten()
+    rle = []
+    count = 0
+    last_val = 0
+    for val in pixels:
+        if val == last_val:
+            count += 1
+        else:
+            rle.append(str(count))
+            count = 1
+            last_val = val
+    rle.append(str(count))
+    return " ".join(rle)
+
+
+def sample_masks():
+    rng = np.random.default_rng(0)
+    yield np.zeros((7, 5), dtype=np.uint8)
+    yield np.ones((7, 5), dtype=np.uint8)
+    yield (rng.random((64, 48)) > 0.5).astype(np.uint8)
+    blob = np.zeros((128, 128), dtype=np.uint8)
+    blob[30:90, 20:70] = 1
+    blob[0, 0] = 1  # first pixel set -> leading zero-length run
+    yield blob
+
+
+@pytest.mark.parametrize("mask", list(sample_masks()))
+def test_row_format_matches_loop_and_round_trips(mask):
+    rle = mask_to_rle(mask)
+    assert rle == loop_mask_to_rle(mask)
+    np.testing.assert_array_equal(rle_to_mask(rle, mask.shape), mask)
+
+
+def test_row_format_multiclass_matches_loop():
+    mask = np.random.default_rng(1).integers(0, 3, (32, 32)).astype(np.uint8)
+    assert mask_to_rle(mask) == loop_mask_to_rle(mask)
+
+
+@pytest.mark.parametrize("mask", list(sample_masks()))
+@pytest.mark.parametrize("compress", [False, True])
+def test_coco_round_trip(mask, compress):
+    rle = encode_coco(mask, compress=compress)
+    assert rle["size"] == list(mask.shape)
+    np.testing.assert_array_equal(decode_coco(rle), mask)
+
+
+def test_counts_string_round_trip():
+    counts = [0, 5, 1, 300000, 2, 2, 70, 1, 1]
+    assert string_to_counts(counts_to_string(counts)) == counts
+
+
+@pytest.mark.parametrize("mask", list(sample_masks()))
+def test_coco_matches_pycocotools(mask):
+    coco_mask = pytest.importorskip("pycocotools.mask")
+    expected = coco_mask.encode(np.asfortranarray(mask))
+    assert encode_coco(mask, compress=True)["counts"] == expected["counts"].decode("ascii")
+    np.testing.assert_array_equal(coco_mask.decode(expected), decode_coco(encode_coco(mask)))
+
+
+@pytest.mark.parametrize("fmt", ["coco", "rows"])
+def test_multiclass_round_trip(fmt):
+    mask = np.random.default_rng(2).integers(0, 3, (40, 30)).astype(np.uint8)
+    encoded = encode_classes(mask, fmt=fmt)
+    assert sorted(encoded) == [0, 1, 2]
+    np.testing.assert_array_equal(decode_classes(encoded, mask.shape, fmt=fmt), mask)
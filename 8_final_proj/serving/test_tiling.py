@@ -0,0 +1,86 @@
+"""Tiled inference against a pointwise "model", whose tiled output must match running it on the whole image."""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from serving import tiling
+from serving.tiling import iter_mask_strips, predict_mask_tiled, tile_origins, write_mask_png
+
+
+def pointwise_scores(batch):
+    """Class 1 where red > green, class 2 where blue > 200, else 0 (as softmax-like scores)."""
+    batch = batch.astype(np.int16)
+    mask = np.where(batch[..., 2] > 200, 2, (batch[..., 0] > batch[..., 1]).astype(np.int64))
+    return np.eye(3, dtype=np.float32)[mask] * 0.8 + 0.1
+
+
+def pointwise_masks(batch):
+    return pointwise_scores(batch).argmax(axis=-1).astype(np.uint8)
+
+
+def sample_image(height, width):
+    rng = np.random.default_rng(height * width)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def test_tile_origins_cover_and_end_flush():
+    assert tile_origins(100, 128, 96) == [0]
+    assert tile_origins(300, 128, 96) == [0, 96, 172]
+    assert tile_origins(224, 128, 96) == [0, 96]
+
+
+@pytest.mark.parametrize("shape", [(300, 450), (128, 128), (70, 500), (513, 129)])
+@pytest.mark.parametrize("batch_size", [1, 5, 64])
+def test_matches_whole_image(shape, batch_size):
+    image = sample_image(*shape)
+    expected = pointwise_masks(image[None])[0]
+    mask = predict_mask_tiled(pointwise_scores, image, tile=128, overlap=32, batch_size=batch_size)
+    np.testing.assert_array_equal(mask, expected)
+
+
+def test_mask_output_models_vote():
+    image = sample_image(260, 300)
+    mask = predict_mask_tiled(pointwise_masks, image, tile=64, overlap=16, num_classes=3)
+    np.testing.assert_array_equal(mask, pointwise_masks(image[None])[0])
+
+
+def test_strips_are_contiguous_and_bounded():
+    image = sample_image(1000, 200)
+    strips = list(iter_mask_strips(pointwise_scores, image, tile=64, overlap=16, batch_size=8))
+    assert [top for top, _ in strips] == list(np.cumsum([0] + [rows.shape[0] for _, rows in strips[:-1]]))
+    assert sum(rows.shape[0] for _, rows in strips) == 1000
+    assert max(rows.shape[0] for _, rows in strips) <= 2 * 64
+
+
+@pytest.mark.parametrize("use_cv2", [True, False])
+def test_larger_tiles_are_resized_to_the_model(monkeypatch, use_cv2):
+    if use_cv2:
+        pytest.importorskip("cv2")
+    else:
+        monkeypatch.setattr(tiling, "cv2", None)
+    yy, xx = np.mgrid[0:400, 0:500]
+    image = np.zeros((400, 500, 3), dtype=np.uint8)
+    image[..., 0] = np.where((yy - 200) ** 2 + (xx - 250) ** 2 < 150 ** 2, 255, 0)
+    calls = []
+
+    def predict(batch):
+        calls.append(batch.shape)
+        return pointwise_scores(batch)
+
+    mask = predict_mask_tiled(predict, image, tile=256, overlap=64, model_size=128, batch_size=4)
+    assert all(shape[1:3] == (128, 128) for shape in calls)
+    assert (mask == pointwise_masks(image[None])[0]).mean() > 0.99
+
+
+def test_write_mask_png_round_trip(tmp_path):
+    image = sample_image(333, 250)
+    path = str(tmp_path / "mask.png")
+    palette = np.array([[0, 0, 0], [255, 0, 0], [0, 255, 0]], dtype=np.uint8)
+    write_mask_png(path, iter_mask_strips(pointwise_scores, image, tile=64, overlap=8), 250, 333, palette)
+    with open(path, "rb") as f:
+        decoded = Image.open(io.BytesIO(f.read()))
+    assert decoded.mode == "P"
+    np.testing.assert_array_equal(np.asarray(decoded), pointwise_masks(image[None])[0])
@@ -0,0 +1,222 @@
+"""
+Tiled sliding-window inference for images larger than the model input.
+
+The services shrink a whole photo to the 128x128 model input and scale the
+mask back up with nearest neighbour, so a 4000-pixel-wide photo gets a mask
+made of 30-pixel steps. Here the image is cut into overlapping tiles, the tiles
+go through the model in batches and the per-tile class scores are blended back
+with feathered weights (linear ramps across the overlap), so tile seams do not
+show in the argmax.
+
+- ``tile`` is the tile size in image pixels. Tiles of another size than the
+  model input are resized to it: ``tile=256`` on a 128 model needs about 4x
+  fewer forward passes than ``tile=128``, at half the detail.
+- ``iter_mask_strips`` only keeps one band of tile rows of scores in memory and
+  yields the finished mask rows; ``predict_mask_tiled`` collects them and
+  ``write_mask_png`` streams them to disk, so the full-size score map never exists.
+
+    python -m serving.tiling model.keras photo.jpg mask.png --tile 256 --overlap 32
+
+The input can also be a ``.npy`` file, which is memory-mapped and read one band at a time.
+"""
+
+import argparse
+import struct
+import time
+import zlib
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:  # PIL-only apps
+    cv2 = None
+
+
+def tile_origins(length, tile, stride):
+    """Start offsets of tiles covering ``[0, length)``; the last tile is flush with the end."""
+    if length <= tile:
+        return [0]
+    origins = list(range(0, length - tile, stride))
+    origins.append(length - tile)
+    return origins
+
+
+def feather_window(tile, overlap):
+    """(tile, tile) blending weights: 1 in the middle, ramping down to ``1 / (overlap + 1)`` at the edges."""
+    distance = np.minimum(np.arange(1, tile + 1), np.arange(tile, 0, -1))
+    ramp = np.minimum(distance, overlap + 1) / (overlap + 1)
+    return np.outer(ramp, ramp).astype(np.float32)
+
+
+def _resize(array, size, downscale=False):
+    """Resize an (H, W, C) uint8 or float32 array to ``size`` x ``size``."""
+    if array.shape[0] == size and array.shape[1] == size:
+        return array
+    if cv2 is not None:
+        resized = cv2.resize(array, (size, size), interpolation=cv2.INTER_AREA if downscale else cv2.INTER_LINEAR)
+        return resized.reshape(size, size, -1)
+
+    from PIL import Image
+
+    if array.dtype == np.uint8:
+        return np.asarray(Image.fromarray(array).resize((size, size), Image.BOX if downscale else Image.BILINEAR))
+    channels = [
+        np.asarray(Image.fromarray(array[..., c], mode="F").resize((size, size), Image.BILINEAR))
+        for c in range(array.shape[-1])
+    ]
+    return np.stack(channels, axis=-1)
+
+
+def _class_scores(output, num_classes):
+    """Model output -> (N, H, W, C) float32 scores; argmax masks (exported uint8 models) become one-hot votes."""
+    output = np.asarray(output)
+    if output.ndim == 3:
+        if num_classes is None:
+            raise ValueError("num_classes is needed to blend a model that outputs class masks")
+        return np.eye(num_classes, dtype=np.float32)[output]
+    return output.astype(np.float32, copy=False)
+
+
+def iter_mask_strips(predict_fn, image, tile=128, overlap=32, model_size=None, batch_size=16, num_classes=None):
+    """Run ``predict_fn`` over overlapping tiles of ``image`` and yield the blended class mask strip by strip.
+
+    Args:
+        predict_fn (callable): (N, m, m, 3) uint8 batch -> (N, m, m, C) class scores, or (N, m, m) class masks.
+        image (numpy.ndarray): (H, W, 3) uint8 image; a memory-mapped array is only read one band at a time.
+        tile (int): Tile size in image pixels.
+        overlap (int): Overlap between neighbouring tiles in image pixels, feathered when blending.
+        model_size (int | None): Model input size; tiles are resized to it when it differs from ``tile``.
+        batch_size (int): Tiles per ``predict_fn`` call. Enough tile rows are processed together to fill it,
+                          which also sets the band height kept in memory.
+        num_classes (int | None): Needed when ``predict_fn`` returns class masks.
+
+    Yields:
+        tuple[int, numpy.ndarray]: (first row, (rows, W) uint8 class mask), top to bottom, covering the image.
+    """
+    if not 0 <= overlap < tile:
+        raise ValueError(f"overlap must be in [0, tile), got {overlap} for tile {tile}")
+    model_size = model_size or tile
+    height, width = image.shape[:2]
+    if height < tile or width < tile:
+        # small images: pad to one tile, the padding is cropped from the strips
+        image = np.pad(np.asarray(image), ((0, max(tile - height, 0)), (0, max(tile - width, 0)), (0, 0)), mode="edge")
+    padded_height, padded_width = image.shape[:2]
+
+    stride = tile - overlap
+    ys = tile_origins(padded_height, tile, stride)
+    xs = tile_origins(padded_width, tile, stride)
+    window = feather_window(tile, overlap)[..., None]
+    rows_per_step = max(1, -(-batch_size // len(xs)))
+
+    band_top = 0
+    carry = None  # scores of rows that later tiles still overlap
+    for step in range(0, len(ys), rows_per_step):
+        step_ys = ys[step:step + rows_per_step]
+        band = image[band_top:step_ys[-1] + tile]
+        scores = None
+        tiles = [(y, x) for y in step_ys for x in xs]
+
+        for start in range(0, len(tiles), batch_size):
+            chunk = tiles[start:start + batch_size]
+            batch = np.stack([
+                _resize(np.ascontiguousarray(band[y - band_top:y - band_top + tile, x:x + tile]), model_size, True)
+                for y, x in chunk
+            ])
+            outputs = _class_scores(predict_fn(batch), num_classes)
+            if scores is None:
+                scores = np.zeros((band.shape[0], padded_width, outputs.shape[-1]), dtype=np.float32)
+                if carry is not None:
+                    scores[:carry.shape[0]] = carry
+            for (y, x), output in zip(chunk, outputs):
+                # the weights are not normalized: a positive per-pixel factor does not change the argmax
+                scores[y - band_top:y - band_top + tile, x:x + tile] += _resize(output, tile) * window
+
+        next_top = ys[step + rows_per_step] if step + rows_per_step < len(ys) else band_top + scores.shape[0]
+        finished = scores[:next_top - band_top]
+        if band_top < height:
+            yield band_top, finished[:height - band_top, :width].argmax(axis=-1).astype(np.uint8)
+        carry = scores[next_top - band_top:]
+        band_top = next_top
+
+
+def predict_mask_tiled(predict_fn, image, **kwargs):
+    """Full (H, W) uint8 class mask from :func:`iter_mask_strips` (same keyword arguments)."""
+    return np.concatenate([rows for _, rows in iter_mask_strips(predict_fn, image, **kwargs)], axis=0)
+
+
+def _png_chunk(f, kind, data):
+    f.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+def write_mask_png(path, strips, width, height, palette=None):
+    """Stream mask strips into an 8-bit PNG without holding the whole mask.
+
+    Args:
+        path (str): Output file.
+        strips (iterable): ``(first_row, rows)`` pairs, e.g. from :func:`iter_mask_strips`.
+        width (int): Image width.
+        height (int): Image height.
+        palette (numpy.ndarray | None): (N, 3) uint8 class colors; a grayscale PNG of class ids without it.
+    """
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 0 if palette is None else 3
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        if palette is not None:
+            _png_chunk(f, b"PLTE", np.asarray(palette, dtype=np.uint8)[:256].tobytes())
+        compressor = zlib.compressobj(6)
+        for _, rows in strips:
+            scanlines = np.zeros((rows.shape[0], width + 1), dtype=np.uint8)  # filter byte 0 per row
+            scanlines[:, 1:] = rows
+            data = compressor.compress(scanlines.tobytes())
+            if data:
+                _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", compressor.flush())
+        _png_chunk(f, b"IEND", b"")
+
+
+def keras_predict_fn(model):
+    """``predict_fn`` for a Keras U-Net: scales uint8 tiles to [0, 1] unless the model takes uint8 itself."""
+    uint8_io = model.inputs[0].dtype == "uint8"
+
+    def predict(batch):
+        # predict_on_batch skips the per-call tf.data setup of model.predict, which dominates small batches
+        return model.predict_on_batch(batch if uint8_io else batch.astype(np.float32) / 255.0)
+
+    return predict
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", help=".keras / .h5 segmentation model")
+    parser.add_argument("image", help="input image, or an (H, W, 3) uint8 .npy file (memory-mapped)")
+    parser.add_argument("output", help="output PNG of class ids")
+    parser.add_argument("--tile", type=int, default=128, help="tile size in image pixels (default: %(default)s)")
+    parser.add_argument("--overlap", type=int, default=32, help="tile overlap in pixels (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=16, help="tiles per forward pass (default: %(default)s)")
+    parser.add_argument("--num-classes", type=int, help="needed for exported models that output class masks")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    if args.image.endswith(".npy"):
+        image = np.load(args.image, mmap_mode="r")
+    else:
+        from PIL import Image
+        image = np.asarray(Image.open(args.image).convert("RGB"))
+
+    height, width = image.shape[:2]
+    start = time.perf_counter()
+    strips = iter_mask_strips(
+        keras_predict_fn(model), image, tile=args.tile, overlap=args.overlap,
+        model_size=model.input_shape[1], batch_size=args.batch_size,
+        num_classes=args.num_classes or (model.output_shape[-1] if len(model.output_shape) == 4 else None),
+    )
+    write_mask_png(args.output, strips, width, height)
+    print(f"{width}x{height} -> {args.output} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
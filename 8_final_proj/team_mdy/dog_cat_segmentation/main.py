@@ -3,17 +3,40 @@ main.py
 FastAPI app for Cat & Dog Semantic Segmentation
 """
 
-from fastapi import FastAPI, Body, File, UploadFile, HTTPException
+from fastapi import FastAPI, Body, Depends, File, UploadFile, HTTPException, Query, Request
 from dataclasses import dataclass, asdict
-from typing import List, Union
+from typing import List, Literal, Optional, Union
 import time
 import io
+import os
+import sys
 import base64
+import json
 from model_work import SemanticSegmentation
 from PIL import Image
 import numpy as np
 import tensorflow as tf
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.batching import MicroBatcher
+from serving.executor import StageExecutor
+from serving.metrics import METRICS_CONTENT_TYPE, MetricsMiddleware, model_load, render_metrics, stage, timed_run
+from serving.postprocess import class_counts, class_percentages as count_percentages, colorize, make_palette
+from serving.readiness import Readiness, add_health_routes, load_concurrently, warm_up, warmup_batch_sizes
+from serving.rle import encode_classes
+from serving.responses import PNG, negotiate, negotiated_response, palette_png, parse_artifacts
+
+# Micro-batching window: concurrent requests are coalesced into one forward pass
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+
+# Images a /segment response can carry; `mask` is the class mask as an 8-bit palette PNG
+ARTIFACTS = ("overlay", "colored_mask", "mask")
+DEFAULT_ARTIFACTS = ("overlay", "colored_mask")
+
+TILE_HELP = "Tile size in pixels for full-resolution tiled inference; larger tiles are faster but coarser"
 
 # -----------------------------
 # Dataclasses for Requests/Responses
@@ -43,77 +66,172 @@ class SegmentationResponse:
 # -----------------------------
 ml_models = {}
 app = FastAPI(title="Cat & Dog Segmentation API", version="1.0")
+# in-flight requests and per-route latency for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# /health/live, /health/ready (200 only once the model is loaded and warm) and /health
+readiness = Readiness()
+add_health_routes(app, readiness)
 
 @app.on_event("startup")
-async def load_models():
-    try:
-        seg_model = SemanticSegmentation()
-        model_path = "model/cat_dog_segmentation_unet.keras" 
+async def start_serving():
+    # Decode / inference / encode pools, sized with DECODE_WORKERS, INFERENCE_WORKERS, ENCODE_WORKERS
+    ml_models["stages"] = StageExecutor.from_env()
+    # Load and warm up in the background so /health/live answers at once; the model routes wait for /health/ready
+    readiness.start(load_models(ml_models["stages"]))
 
-        try:
+async def load_models(stages):
+    # MODEL_PATH can point at a model exported with serving/export_model.py (uint8 in, mask out)
+    model_path = os.getenv("MODEL_PATH", "model/cat_dog_segmentation_unet.keras")
+
+    def load_seg_model():
+        seg_model = SemanticSegmentation()
+        with model_load("seg_model"):
             seg_model.load_model(model_path)
-            print(f"Model loaded successfully from: {model_path}")
-        except FileNotFoundError:
-            print(f"Model not found at: {model_path}")
-            seg_model = None  # fallback to None if missing
+        return seg_model
 
-        ml_models["seg_model"] = seg_model
+    try:
+        with readiness.phase("loading"):
+            ml_models["seg_model"] = (await load_concurrently({"seg_model": load_seg_model}, readiness))["seg_model"]
+        print(f"Model loaded successfully from: {model_path}")
+    except FileNotFoundError:
+        print(f"Model not found at: {model_path}")
+        ml_models["seg_model"] = None  # fallback to None if missing
     except Exception as e:
         print(f"Error loading model: {e}")
         ml_models["seg_model"] = None
 
+    seg_model = ml_models["seg_model"]
+    if seg_model is None:
+        return
+
+    # The first forward pass at each batch size builds a graph; pay for it here, not in the first requests.
+    # WARMUP_BATCH_SIZES overrides the sizes (default 1, 2, 4, ... BATCH_MAX_SIZE), empty turns it off
+    with readiness.phase("warming"):
+        readiness.record_warmup("seg_model", await stages.inference.run(
+            warm_up, seg_model.predict_masks, (seg_model.image_height, seg_model.image_width, 3),
+            warmup_batch_sizes(BATCH_MAX_SIZE), np.uint8 if seg_model.uint8_io else np.float32,
+        ))
+
+    batcher = MicroBatcher(
+        seg_model.predict_masks,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS,
+        executor=stages.inference,
+    )
+    await batcher.start()
+    ml_models["batcher"] = batcher
+    print(f"Ready after {readiness.mark_ready():.1f} s")
+
+@app.on_event("shutdown")
+async def stop_serving():
+    await readiness.stop()
+    batcher = ml_models.pop("batcher", None)
+    if batcher is not None:
+        await batcher.stop()
+    stages = ml_models.pop("stages", None)
+    if stages is not None:
+        stages.shutdown(wait=False)
+
 # -----------------------------
 # Utilities
 # -----------------------------
-def mask_to_rle(mask: np.ndarray) -> str:
-    """Simple Run-Length Encoding"""
-    pixels = mask.flatten()
-    rle = []
-    count = 0
-    last_val = 0
-    for val in pixels:
-        if val == last_val:
-            count += 1
-        else:
-            rle.append(str(count))
-            count = 1
-            last_val = val
-    rle.append(str(count))
-    return " ".join(rle)
+async def run_segmentation(model: SemanticSegmentation, image_bytes: bytes, tile: Optional[int] = None,
+                           overlap: int = 32):
+    """Preprocess one image, run it through the shared micro-batcher and postprocess the mask.
+    Every stage runs in its own pool so the event loop stays free.
+    With `tile`, the mask is predicted at full resolution from overlapping tiles instead."""
+    stages: StageExecutor = ml_models["stages"]
+    if tile is not None:
+        # the tiles of one image are batched inside the call, so this skips the micro-batcher
+        img_pil, mask = await timed_run("inference", stages.inference, model.predict_tiled, image_bytes, tile,
+                                        overlap, BATCH_MAX_SIZE)
+        return await timed_run("postprocess", stages.encode, model.postprocess, img_pil, mask)
+    try:
+        img_pil, img_batch = await timed_run("preprocess", stages.decode, model.preprocess_image, image_bytes)
+    except OSError as e:  # a valid header with truncated or corrupt pixel data
+        raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
+    with stage("inference"):
+        mask = await ml_models["batcher"].submit(img_batch[0])
+    return await timed_run("postprocess", stages.encode, model.postprocess, img_pil, mask)
+
+def encode_result_images(model: SemanticSegmentation, overlay: Image.Image, rgb_mask: np.ndarray,
+                         mask: np.ndarray, artifacts: set) -> dict:
+    """Encode the requested artifacts as raw PNG bytes; the response layer base64s them for JSON only"""
+    encoded = {}
+    if "overlay" in artifacts:
+        encoded["overlay_image"] = array_to_png(np.array(overlay))
+    if "colored_mask" in artifacts:
+        encoded["colored_mask_image"] = array_to_png(rgb_mask)
+    if "mask" in artifacts:
+        encoded["mask_image"] = palette_png(mask, model.palette, len(model.class_labels))
+    return encoded
+
+def mask_png_response(model: SemanticSegmentation, mask: np.ndarray, class_percentages: dict,
+                      execution_time_ms: int):
+    """`Accept: image/png`: the class mask as one palette PNG, the class summary in headers"""
+    return Response(
+        content=palette_png(mask, model.palette, len(model.class_labels)),
+        media_type=PNG,
+        headers={
+            "X-Class-Percentages": json.dumps(class_percentages),
+            "X-Execution-Time-Ms": str(execution_time_ms),
+            "X-Model-Version": "1.0",
+        },
+    )
+
+def overlay_to_png_buffer(overlay: Image.Image) -> io.BytesIO:
+    """Encode the overlay as a PNG stream"""
+    buf = io.BytesIO()
+    overlay.save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+def array_to_png(array: np.ndarray) -> bytes:
+    """Encode an image array as PNG bytes"""
+    buf = io.BytesIO()
+    Image.fromarray(array).save(buf, format="PNG")
+    return buf.getvalue()
 
 def overlay_to_base64(overlay_array: np.ndarray) -> str:
     """Convert overlay array to base64 PNG"""
-    img = Image.fromarray(overlay_array)
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
+    return base64.b64encode(array_to_png(overlay_array)).decode("utf-8")
 
-def validate_image(image_bytes: bytes) -> np.ndarray:
-    """Validate and convert image bytes to numpy array"""
+def validate_image(image_bytes: bytes) -> None:
+    """Check that the bytes are an image PIL can read, from the header only (the pixels are decoded once, in preprocess)"""
     try:
-        img = Image.open(io.BytesIO(image_bytes))
-        # Convert to RGB if necessary
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        return np.array(img)
+        Image.open(io.BytesIO(image_bytes)).verify()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
 
+# Colors for each class (RGB format)
+MASK_PALETTE = make_palette({
+    0: [0, 0, 0],      # Background - Black
+    1: [255, 0, 0],    # Dog - Red
+    2: [0, 255, 0]     # Cat - Green
+})
+
+
 def create_colored_mask(mask: np.ndarray) -> np.ndarray:
     """Create a colored mask image with different colors for each class"""
-    # Define colors for each class (RGB format)
-    colors = {
-        0: [0, 0, 0],      # Background - Black
-        1: [255, 0, 0],    # Dog - Red
-        2: [0, 255, 0]     # Cat - Green
-    }
-    
-    colored_mask = np.zeros((mask.shape[0], mask.shape[1], 3), dtype=np.uint8)
-    
-    for class_id, color in colors.items():
-        colored_mask[mask == class_id] = color
-    
-    return colored_mask
+    return colorize(mask, MASK_PALETTE)
+
+
+def summarize_classes(model: SemanticSegmentation, mask: np.ndarray) -> tuple[dict, list]:
+    """Class percentages and the labels of the classes present, without sorting the mask"""
+    counts = class_counts(mask, num_classes=len(model.class_labels))
+    class_percentages = count_percentages(counts, total=mask.size)
+
+    detected_classes = []
+    for cls in class_percentages:
+        if cls in model.class_labels:
+            label_name, color = model.class_labels[cls]
+            detected_classes.append({
+                "class_id": cls,
+                "label": label_name,
+                "color": color
+            })
+    return class_percentages, detected_classes
 
 def get_class_labels() -> dict:
     """Get class label mapping"""
@@ -154,6 +272,10 @@ def get_info():
             "/segment-file": "POST - Segment images using file upload",
             "/segment-mask-stream": "POST - Get colored mask as direct image stream",
             "/segment-overlay-stream": "POST - Get overlay as direct image stream",
+            "/batching/stats": "GET - Micro-batching queue depth, batch sizes and queueing delay",
+            "/stages/stats": "GET - Decode/inference/encode pool saturation",
+            "/metrics": "GET - Prometheus metrics (stage and request latency histograms, in-flight requests)",
+            "/health/ready": "GET - 200 once the model is loaded and warmed up, 503 before (also /health/live, /health)",
             "/docs": "GET - Interactive API documentation (Swagger UI)"
         },
         "class_labels": {
@@ -168,12 +290,53 @@ def get_info():
         }
     }
 
+@app.get("/batching/stats", dependencies=[Depends(readiness.require)])
+def batching_stats():
+    """Expose queue depth, batch-size histogram and per-request queueing delay"""
+    batcher = ml_models.get("batcher")
+    if batcher is None:
+        raise HTTPException(status_code=500, detail="Model not loaded.")
+    return batcher.stats()
+
+@app.get("/stages/stats")
+def stages_stats():
+    """Expose decode/inference/encode pool sizes and saturation"""
+    return ml_models["stages"].stats()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape: per-stage and per-route latency histograms, in-flight requests, model load time"""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 # -----------------------------
 # /segment endpoint (JSON body, batch support)
 # -----------------------------
-@app.post("/segment")
-async def segment_images(data: Union[ImageRequest, List[ImageRequest]] = Body(...)):
-    start_time = time.time()
+@app.post("/segment", dependencies=[Depends(readiness.require)])
+async def segment_images(request: Request,
+                         data: Union[ImageRequest, List[ImageRequest]] = Body(...),
+                         mask_format: Literal["png", "rle", "png+rle"] = Query(default="png"),
+                         rle_format: Literal["coco", "rows"] = Query(default="coco"),
+                         artifacts: str = Query(default=None, description="Comma-separated: overlay, colored_mask, mask"),
+                         tile: Optional[int] = Query(default=None, ge=64, le=1024, description=TILE_HELP),
+                         overlap: int = Query(default=32, ge=0)):
+    """Segment one or more images.
+
+    `mask_format=rle` returns a per-class RLE of the mask (`mask_rle`) instead of the PNGs,
+    `png+rle` returns both. `rle_format=coco` is column-major COCO RLE with compressed counts,
+    `rows` the row-major run-length string. `artifacts` picks the PNGs (default overlay,colored_mask).
+    `tile=128|256|...` segments the full-resolution image with overlapping tiles (`overlap` pixels)
+    instead of the whole image shrunk to 128x128; the results are then at the upload's size.
+
+    The `Accept` header selects the encoding: `application/json` (PNGs as base64, default),
+    `multipart/mixed` or `application/msgpack` (raw PNG bytes), or `image/png` for just the
+    class mask of a single image as a palette PNG.
+    """
+    start_time = time.perf_counter()
+
+    media_type = negotiate(request.headers.get("accept"))
+    requested = parse_artifacts(artifacts, ARTIFACTS, DEFAULT_ARTIFACTS)
+    if tile is not None and overlap >= tile:
+        raise HTTPException(status_code=422, detail="overlap must be smaller than tile")
 
     if ml_models["seg_model"] is None:
         raise HTTPException(status_code=500, detail="Model not loaded.")
@@ -182,58 +345,73 @@ async def segment_images(data: Union[ImageRequest, List[ImageRequest]] = Body(..
     results = []
 
     images = data if isinstance(data, list) else [data]
+    if media_type == PNG and len(images) != 1:
+        raise HTTPException(status_code=406, detail="image/png responses hold a single image, use multipart/mixed")
 
     for img_req in images:
         try:
             # Validate image
-            img_array = validate_image(img_req.image)
+            validate_image(img_req.image)
 
             # Predict
-            img_pil, rgb_mask, overlay, mask = model.predict(img_req.image)
+            img_pil, rgb_mask, overlay, mask = await run_segmentation(model, img_req.image, tile, overlap)
 
             # Class percentages
-            unique, counts = np.unique(mask, return_counts=True)
-            total_pixels = mask.size
-            class_percentages = {int(u): int(c / total_pixels * 100) for u, c in zip(unique, counts)}
-
-            # Class labels
-            detected_classes = []
-            for cls in unique:
-                if cls in model.class_labels:
-                    label_name, color = model.class_labels[cls]
-                    detected_classes.append({
-                        "class_id": int(cls),
-                        "label": label_name,
-                        "color": color
-                    })
-
-            # Overlay and colored mask as base64
-            overlay_base64 = overlay_to_base64(np.array(overlay))
-            colored_mask_base64 = overlay_to_base64(rgb_mask)
-
-            results.append({
-                "overlay_image": overlay_base64,
-                "colored_mask_image": colored_mask_base64,
+            class_percentages, detected_classes = summarize_classes(model, mask)
+
+            if media_type == PNG:
+                execution_time_ms = int((time.perf_counter() - start_time) * 1000)
+                return await timed_run("encode", ml_models["stages"].encode,
+                    mask_png_response, model, mask, class_percentages, execution_time_ms
+                )
+
+            result = {
                 "class_percentages": class_percentages,
                 "detected_classes": detected_classes
-            })
+            }
+
+            if mask_format != "rle":
+                # Requested PNGs as raw bytes
+                result.update(await timed_run("encode", ml_models["stages"].encode,
+                    encode_result_images, model, overlay, rgb_mask, mask, requested
+                ))
+
+            if mask_format != "png":
+                result["mask_size"] = [int(mask.shape[0]), int(mask.shape[1])]
+                result["mask_rle"] = await timed_run("encode", ml_models["stages"].encode,
+                    encode_classes, mask, list(class_percentages), rle_format
+                )
+
+            results.append(result)
+        except HTTPException:
+            raise  # 4xx from validation or negotiation keep their status
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-    execution_time_ms = int((time.time() - start_time) * 1000)
-    return {
+    execution_time_ms = int((time.perf_counter() - start_time) * 1000)
+    payload = {
         "results": results,
         "execution_time_ms": execution_time_ms,
         "model_version": "1.0"
     }
+    return await timed_run("encode", ml_models["stages"].encode, negotiated_response, payload, media_type)
 
 
 # -----------------------------
 # /segment-file endpoint (single file upload)
 # -----------------------------
-@app.post("/segment-file")
-async def segment_file(file: UploadFile = File(...)):
-    start_time = time.time()
+@app.post("/segment-file", dependencies=[Depends(readiness.require)])
+async def segment_file(request: Request, file: UploadFile = File(...),
+                       artifacts: str = Query(default=None, description="Comma-separated: overlay, colored_mask, mask"),
+                       tile: Optional[int] = Query(default=None, ge=64, le=1024, description=TILE_HELP),
+                       overlap: int = Query(default=32, ge=0)):
+    """Segment an uploaded image; `Accept`, `artifacts` and `tile` work as for /segment"""
+    start_time = time.perf_counter()
+
+    media_type = negotiate(request.headers.get("accept"))
+    requested = parse_artifacts(artifacts, ARTIFACTS, DEFAULT_ARTIFACTS)
+    if tile is not None and overlap >= tile:
+        raise HTTPException(status_code=422, detail="overlap must be smaller than tile")
 
     if ml_models["seg_model"] is None:
         raise HTTPException(status_code=500, detail="Model not loaded.")
@@ -242,48 +420,45 @@ async def segment_file(file: UploadFile = File(...)):
 
     try:
         image_bytes = await file.read()
-        img_array = validate_image(image_bytes)
+        validate_image(image_bytes)
 
-        img_pil, rgb_mask, overlay, mask = model.predict(image_bytes)
+        img_pil, rgb_mask, overlay, mask = await run_segmentation(model, image_bytes, tile, overlap)
 
-        unique, counts = np.unique(mask, return_counts=True)
-        total_pixels = mask.size
-        class_percentages = {int(u): int(c / total_pixels * 100) for u, c in zip(unique, counts)}
+        class_percentages, detected_classes = summarize_classes(model, mask)
 
-        detected_classes = []
-        for cls in unique:
-            if cls in model.class_labels:
-                label_name, color = model.class_labels[cls]
-                detected_classes.append({
-                    "class_id": int(cls),
-                    "label": label_name,
-                    "color": color
-                })
+        if media_type == PNG:
+            execution_time_ms = int((time.perf_counter() - start_time) * 1000)
+            return await timed_run("encode", ml_models["stages"].encode,
+                mask_png_response, model, mask, class_percentages, execution_time_ms
+            )
 
-        overlay_base64 = overlay_to_base64(np.array(overlay))
-        colored_mask_base64 = overlay_to_base64(rgb_mask)
+        images = await timed_run("encode", ml_models["stages"].encode,
+            encode_result_images, model, overlay, rgb_mask, mask, requested
+        )
 
-        execution_time_ms = int((time.time() - start_time) * 1000)
+        execution_time_ms = int((time.perf_counter() - start_time) * 1000)
 
-        return {
+        payload = {
             "results": [{
-                "overlay_image": overlay_base64,
-                "colored_mask_image": colored_mask_base64,
+                **images,
                 "class_percentages": class_percentages,
                 "detected_classes": detected_classes
             }],
             "execution_time_ms": execution_time_ms,
             "model_version": "1.0"
         }
+        return await timed_run("encode", ml_models["stages"].encode, negotiated_response, payload, media_type)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
-@app.post("/segment-overlay-upload")
+@app.post("/segment-overlay-upload", dependencies=[Depends(readiness.require)])
 async def segment_overlay_stream(file: UploadFile = File(...)):
     """Segment an image and return the overlay as a direct image stream with labels in headers"""
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     # Check if model is loaded
     if ml_models["seg_model"] is None:
@@ -296,39 +471,30 @@ async def segment_overlay_stream(file: UploadFile = File(...)):
         image_bytes = await file.read()
 
         # Validate image
-        img_array = validate_image(image_bytes)
+        validate_image(image_bytes)
 
         # Perform segmentation (new API)
-        img_pil, rgb_mask, overlay, mask = model.predict(image_bytes)
+        img_pil, rgb_mask, overlay, mask = await run_segmentation(model, image_bytes)
 
         # Prepare label info (which classes exist in mask)
-        unique_classes = np.unique(mask)
-        class_labels = []
-        for cls in unique_classes:
-            if cls in model.class_labels:  # ensure label exists
-                label_name, color = model.class_labels[cls]
-                class_labels.append({
-                    "class_id": int(cls),
-                    "label": label_name,
-                    "color": color
-                })
+        _, class_labels = summarize_classes(model, mask)
 
         # Convert overlay to PNG bytes
-        buf = io.BytesIO()
-        overlay.save(buf, format="PNG")
-        buf.seek(0)
+        buf = await timed_run("encode", ml_models["stages"].encode, overlay_to_png_buffer, overlay)
 
         # Return overlay + metadata
         return StreamingResponse(
             buf,
             media_type="image/png",
             headers={
-                "X-Execution-Time": str(int((time.time() - start_time) * 1000)),
+                "X-Execution-Time": str(int((time.perf_counter() - start_time) * 1000)),
                 "X-Model-Version": "1.0",
                 "X-Classes-Detected": str(class_labels)
             }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
@@ -3,10 +3,19 @@ Overlay Model Working Module with Multi-Class Support
 """
 
 import io
+import os
+import sys
 import numpy as np
 import tensorflow as tf
 from PIL import Image, ImageDraw
 
+# Shared serving helpers live in 8_final_proj/serving
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from serving.backends import load_model
+from serving.ingest import decode_image_pil
+from serving.postprocess import blend, colorize, make_palette
+from serving.tiling import predict_mask_tiled
+
 
 class SemanticSegmentation:
     """Semantic Segmentation for Cat and Dog (multi-class overlay)"""
@@ -22,6 +31,7 @@ class SemanticSegmentation:
             1: ("Dog", (255, 0, 0)),        # Red
             2: ("Cat", (0, 255, 0)),        # Green
         }
+        self.palette = make_palette({class_idx: color for class_idx, (_, color) in self.class_labels.items()})
 
     @property
     def model(self):
@@ -32,35 +42,65 @@ class SemanticSegmentation:
         self.__model = model
 
     def load_model(self, model_path):
-        self.__model = tf.keras.models.load_model(model_path)
+        """Keras model, or its INT8 TFLite conversion with MODEL_BACKEND=tflite (see serving/backends.py)"""
+        self.__model = load_model(model_path)
         return self.__model
 
+    @property
+    def uint8_io(self):
+        """True for a model exported with serving/export_model.py (rescaling and argmax are in the graph)"""
+        return self.__model is not None and self.__model.inputs[0].dtype == "uint8"
+
     def preprocess_image(self, image_bytes):
-        """Load and resize image"""
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        """Load and resize image (JPEGs are decoded at a reduced scale close to the model input)"""
+        image = decode_image_pil(image_bytes, target_size=(self.image_width, self.image_height))
         image = image.resize((self.image_width, self.image_height))
+        if self.uint8_io:
+            return image, np.expand_dims(np.asarray(image), axis=0)
         image_array = np.array(image) / 255.0
         return image, np.expand_dims(image_array, axis=0)
 
     def mask_to_rgb(self, mask):
         """Convert class indices to RGB mask"""
-        rgb_mask = np.zeros((*mask.shape, 3), dtype=np.uint8)
-        for class_idx, (_, color) in self.class_labels.items():
-            rgb_mask[mask == class_idx] = color
-        return rgb_mask
-
-    def predict(self, image_bytes):
-        """Predict segmentation mask"""
-        img_pil, img_batch = self.preprocess_image(image_bytes)
-        predictions = self.__model.predict(img_batch)
-        mask = tf.argmax(predictions, axis=-1)[0].numpy()
+        return colorize(mask, self.palette)
+
+    def predict_masks(self, img_batch):
+        """Run the U-Net on an (N, H, W, 3) batch and return (N, H, W) class masks"""
+        predictions = self.__model.predict(img_batch, verbose=0)
+        if self.uint8_io:
+            return predictions
+        return tf.argmax(predictions, axis=-1).numpy()
+
+    def predict_scores(self, img_batch):
+        """Class scores for an (N, H, W, 3) uint8 batch (class masks for exported uint8 models)"""
+        if self.uint8_io:
+            return self.__model.predict_on_batch(img_batch)
+        return self.__model.predict_on_batch(img_batch.astype(np.float32) / 255.0)
+
+    def predict_tiled(self, image_bytes, tile, overlap, batch_size=16):
+        """Full-resolution mask from overlapping tiles of the upload, blended with feathered overlap"""
+        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        mask = predict_mask_tiled(
+            self.predict_scores, np.asarray(image), tile=tile, overlap=overlap, model_size=self.image_height,
+            batch_size=batch_size, num_classes=len(self.class_labels),
+        )
+        return image, mask
+
+    def postprocess(self, img_pil, mask):
+        """Colorize a class mask and overlay it on the resized input image"""
         rgb_mask = self.mask_to_rgb(mask)
 
         # Overlay mask on original image
-        overlay = Image.blend(img_pil, Image.fromarray(rgb_mask), alpha=0.4)
+        overlay = Image.fromarray(blend(np.asarray(img_pil), rgb_mask, 0.4))
 
         return img_pil, rgb_mask, overlay, mask
 
+    def predict(self, image_bytes):
+        """Predict segmentation mask"""
+        img_pil, img_batch = self.preprocess_image(image_bytes)
+        mask = self.predict_masks(img_batch)[0]
+        return self.postprocess(img_pil, mask)
+
     def generate_legend(self):
         """Create a legend image showing class → color mapping"""
         legend_height = 30 * len(self.class_labels)